@@ -1,16 +1,16 @@
 import os
-import base64
-import json
 import pytz
 from datetime import datetime, timedelta
 from enum import Enum
-from typing import Optional, Dict, List, Union
+from typing import TYPE_CHECKING, Optional, Dict, List, Union
 
-from google.oauth2.service_account import Credentials
-from googleapiclient.discovery import build
-from googleapiclient.errors import HttpError
 from pydantic import BaseModel, Field
 
+from google_clients import CALENDAR_SCOPES, get_calendar_service, get_credentials
+
+if TYPE_CHECKING:
+    from google.oauth2.service_account import Credentials
+
 class GenericCalendarProvider(str, Enum):
     GOOGLE_CALENDAR = "google_calendar"
 
@@ -21,27 +21,13 @@ class CalendarEvent(BaseModel):
     description: Optional[str] = Field(None, description="イベントの詳細な説明")
     duration_minutes: int = Field(60, description="イベントの長さ（分）。end_dateが指定されていない場合に使用")
 
-def _get_gcp_credentials() -> Credentials:
-    """環境変数からサービスアカウントの資格情報を作成"""
-    b64_str = os.getenv("GOOGLE_SERVICE_ACCOUNT_B64")
-    if not b64_str:
-        raise RuntimeError("GOOGLE_SERVICE_ACCOUNT_B64 environment variable not set")
-
-    try:
-        data = base64.b64decode(b64_str)
-        info = json.loads(data.decode("utf-8"))
-    except (ValueError, json.JSONDecodeError) as e:
-        raise RuntimeError(f"Failed to decode GOOGLE_SERVICE_ACCOUNT_B64: {e}")
-    
-    creds = Credentials.from_service_account_info(
-        info, scopes=["https://www.googleapis.com/auth/calendar"]
-    )
-    return creds
+def _get_gcp_credentials() -> "Credentials":
+    """サービスアカウントの資格情報（google_clients でキャッシュ済み）"""
+    return get_credentials(CALENDAR_SCOPES)
 
 def _get_calendar_service():
-    """Google Calendar APIサービスを構築して返す"""
-    creds = _get_gcp_credentials()
-    return build("calendar", "v3", credentials=creds)
+    """Google Calendar APIサービスを返す（スレッドごとに使い回し）"""
+    return get_calendar_service()
 
 def _parse_datetime(date_str: str) -> datetime:
     """日時文字列を解析してdatetimeオブジェクトを返す"""
@@ -94,7 +80,9 @@ def create_calendar_event(
             "message": f"Unsupported calendar provider: {provider}",
             "success": False
         }
-    
+    # google SDK は使う時点で読み込む（起動時間を延ばさない）
+    from googleapiclient.errors import HttpError
+
     try:
         service = _get_calendar_service()
         
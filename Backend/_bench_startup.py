@@ -0,0 +1,61 @@
+"""起動時間の計測（コールドスタート対策の確認用）。
+
+新しいプロセスで `import main` と最初の /health 応答までの時間を計り、
+その時点で読み込まれている重い Google SDK を表示する。Backend ディレクトリで実行する:
+
+    LOCAL_DEV=1 python _bench_startup.py [回数]
+"""
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+HEAVY_MODULES = (
+    "google.cloud.speech",
+    "google.generativeai",
+    "googleapiclient.discovery",
+    "google.oauth2.service_account",
+    "google.cloud.storage",
+    "grpc",
+)
+
+_CHILD = r"""
+import json, sys, time, warnings
+warnings.filterwarnings("ignore")
+t0 = time.perf_counter()
+import main
+t1 = time.perf_counter()
+from fastapi.testclient import TestClient
+with TestClient(main.app) as client:
+    status = client.get("/health").status_code
+t2 = time.perf_counter()
+print(json.dumps({
+    "import_ms": (t1 - t0) * 1000,
+    "first_health_ms": (t2 - t0) * 1000,
+    "status": status,
+    "loaded": [m for m in %r if m in sys.modules],
+}))
+""" % (HEAVY_MODULES,)
+
+
+def run_once() -> dict:
+    # ウォームアップはバックグラウンドで走るので、計測には含めない
+    env = dict(os.environ, STARTUP_WARMUP="0")
+    out = subprocess.run(
+        [sys.executable, "-c", _CHILD], capture_output=True, text=True, env=env, check=True
+    ).stdout
+    return json.loads(out.strip().splitlines()[-1])
+
+
+def main(runs: int = 5) -> None:
+    results = [run_once() for _ in range(runs)]
+    for key in ("import_ms", "first_health_ms"):
+        values = [r[key] for r in results]
+        print(f"{key:>16}: median {statistics.median(values):7.1f} ms  (min {min(values):.1f}, max {max(values):.1f})")
+    print(f"{'/health':>16}: {results[-1]['status']}")
+    print(f"{'heavy modules':>16}: {', '.join(results[-1]['loaded']) or '(none)'}")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 5)
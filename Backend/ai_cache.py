@@ -0,0 +1,163 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional, Tuple
+
+# Gemini 応答キャッシュの設定
+AI_CACHE_MAX_ENTRIES = int(os.getenv("AI_CACHE_MAX_ENTRIES", "512"))
+AI_CACHE_TTL_SECONDS = float(os.getenv("AI_CACHE_TTL_SECONDS", str(24 * 60 * 60)))
+# 指定するとディスク（SQLite）にも保存し、再起動後も使い回す。未設定ならメモリのみ
+AI_CACHE_PATH = os.getenv("AI_CACHE_PATH") or None
+# ディスクに残す件数の上限（超えたら最近使われていないものから消す）
+AI_CACHE_DISK_MAX_ENTRIES = int(os.getenv("AI_CACHE_DISK_MAX_ENTRIES", "10000"))
+
+
+class ResponseCache:
+    """プロンプト内容のハッシュをキーにした LRU キャッシュ（TTL 付き）。
+
+    メモリ上の LRU を1段目、任意の SQLite ファイルを2段目として持つ。
+    2段目でヒットした値はメモリに戻す。2段目も disk_max_entries 件までの LRU で、
+    書き込みのたびに期限切れの行と上限を超えた行を消す。
+    """
+
+    def __init__(
+        self,
+        max_entries: int = AI_CACHE_MAX_ENTRIES,
+        ttl_seconds: float = AI_CACHE_TTL_SECONDS,
+        disk_path: Optional[str] = AI_CACHE_PATH,
+        disk_max_entries: int = AI_CACHE_DISK_MAX_ENTRIES,
+    ):
+        self.max_entries = max(1, max_entries)
+        self.ttl_seconds = ttl_seconds
+        self.disk_max_entries = max(1, disk_max_entries)
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[str, Tuple[float, str]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.disk_hits = 0
+        self._db: Optional[sqlite3.Connection] = None
+        if disk_path:
+            try:
+                self._db = sqlite3.connect(disk_path, check_same_thread=False)
+                self._db.execute(
+                    "CREATE TABLE IF NOT EXISTS ai_cache ("
+                    " key TEXT PRIMARY KEY, value TEXT NOT NULL, created REAL NOT NULL, used REAL NOT NULL DEFAULT 0)"
+                )
+                columns = {row[1] for row in self._db.execute("PRAGMA table_info(ai_cache)")}
+                if "used" not in columns:
+                    # 最終利用時刻の列が無い古いファイル
+                    self._db.execute("ALTER TABLE ai_cache ADD COLUMN used REAL NOT NULL DEFAULT 0")
+                    self._db.execute("UPDATE ai_cache SET used = created")
+                self._db.execute("CREATE INDEX IF NOT EXISTS ai_cache_created ON ai_cache (created)")
+                self._db.execute("CREATE INDEX IF NOT EXISTS ai_cache_used ON ai_cache (used)")
+                self._prune_disk(time.time())
+                self._db.commit()
+            except Exception as e:
+                print(f"[ai-cache] disk cache disabled ({disk_path}): {e}")
+                self._db = None
+
+    @staticmethod
+    def make_key(kind: str, model: str, prompt: str, target_lang: str = "") -> str:
+        h = hashlib.sha256()
+        for part in (kind, model, target_lang or "", prompt):
+            h.update(part.encode("utf-8"))
+            h.update(b"\0")
+        return h.hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                created, value = entry
+                if now - created <= self.ttl_seconds:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._entries[key]
+            if self._db is not None:
+                try:
+                    row = self._db.execute("SELECT value, created FROM ai_cache WHERE key = ?", (key,)).fetchone()
+                except Exception as e:
+                    print(f"[ai-cache] disk read failed: {e}")
+                    row = None
+                if row is not None and now - row[1] <= self.ttl_seconds:
+                    try:
+                        self._db.execute("UPDATE ai_cache SET used = ? WHERE key = ?", (now, key))
+                        self._db.commit()
+                    except Exception as e:
+                        print(f"[ai-cache] disk write failed: {e}")
+                    self._put_memory(key, row[1], row[0])
+                    self.hits += 1
+                    self.disk_hits += 1
+                    return row[0]
+            self.misses += 1
+            return None
+
+    def set(self, key: str, value: str) -> None:
+        now = time.time()
+        with self._lock:
+            self._put_memory(key, now, value)
+            if self._db is not None:
+                try:
+                    self._db.execute(
+                        "INSERT OR REPLACE INTO ai_cache (key, value, created, used) VALUES (?, ?, ?, ?)",
+                        (key, value, now, now),
+                    )
+                    self._prune_disk(now)
+                    self._db.commit()
+                except Exception as e:
+                    print(f"[ai-cache] disk write failed: {e}")
+
+    def _prune_disk(self, now: float) -> None:
+        """期限切れの行と、最近使われた順で disk_max_entries 件を超えた行を消す（_lock 下で呼ぶ）。"""
+        self._db.execute("DELETE FROM ai_cache WHERE created < ?", (now - self.ttl_seconds,))
+        self._db.execute(
+            "DELETE FROM ai_cache WHERE key IN (SELECT key FROM ai_cache ORDER BY used DESC LIMIT -1 OFFSET ?)",
+            (self.disk_max_entries,),
+        )
+
+    def _put_memory(self, key: str, created: float, value: str) -> None:
+        self._entries[key] = (created, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            if self._db is not None:
+                self._db.execute("DELETE FROM ai_cache")
+                self._db.commit()
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl_seconds,
+                "disk": self._db is not None,
+                "disk_max_entries": self.disk_max_entries,
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_rate": (self.hits / lookups) if lookups else None,
+            }
+
+
+_cache_instance: Optional[ResponseCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_ai_cache() -> ResponseCache:
+    """プロセス共通のキャッシュを返す。"""
+    global _cache_instance
+    if _cache_instance is None:
+        with _cache_lock:
+            if _cache_instance is None:
+                _cache_instance = ResponseCache()
+    return _cache_instance
@@ -1,20 +1,64 @@
 import os
-import google.generativeai as genai
 from schemas import SoapNotes
+from ai_cache import ResponseCache, get_ai_cache
 import json
 import re
+import threading
+from typing import Dict, Iterator, List, Optional, Tuple
 
-# 環境変数からAPIキーを設定（GEMINI_API_KEY もフォールバック）
-GOOGLE_API_KEY = (
-    os.getenv("GOOGLE_GEMINI_API_KEY") or os.getenv("GEMINI_API_KEY")
-)
+GEMINI_MODEL_NAME = 'gemini-2.5-flash-lite'
+
+SOAP_FIELDS = ("s", "o", "a", "p")
+
+
+class SoapFieldScanner:
+    """ストリーミング中の Gemini 応答（JSON 文字列の断片）から、値が閉じた s/o/a/p を取り出す。
+
+    feed() に届いた断片をそのまま渡すと、その時点で新たに確定した (キー, 値) を返す。
+    値の途中で途切れている項目は、続きの断片が届くまで保留する。
+    """
+
+    _KEY_RE = re.compile(r'"(%s)"\s*:\s*"' % "|".join(SOAP_FIELDS))
+
+    def __init__(self):
+        self.text = ""
+        self.fields: Dict[str, str] = {}
+        self._pos = 0
+
+    def feed(self, chunk: str) -> List[Tuple[str, str]]:
+        self.text += chunk
+        completed: List[Tuple[str, str]] = []
+        while True:
+            m = self._KEY_RE.search(self.text, self._pos)
+            if not m:
+                break
+            end = self._string_end(m.end())
+            if end is None:
+                break
+            self._pos = end + 1
+            try:
+                value = json.loads(self.text[m.end() - 1:end + 1])
+            except ValueError:
+                continue
+            key = m.group(1)
+            if key not in self.fields:
+                self.fields[key] = value
+                completed.append((key, value))
+        return completed
+
+    def _string_end(self, start: int) -> Optional[int]:
+        """start から始まる JSON 文字列の閉じ引用符の位置（未着なら None）。"""
+        i = start
+        while i < len(self.text):
+            c = self.text[i]
+            if c == "\\":
+                i += 2
+                continue
+            if c == '"':
+                return i
+            i += 1
+        return None
 
-# モジュール読み込み時点では例外を投げず、初期化時に厳格チェック
-if GOOGLE_API_KEY:
-    try:
-        genai.configure(api_key=GOOGLE_API_KEY)
-    except Exception:
-        pass
 
 class GoogleAIService:
     """
@@ -30,15 +74,35 @@ class GoogleAIService:
             raise ValueError(
                 "Gemini API key not set. Please set GOOGLE_GEMINI_API_KEY or GEMINI_API_KEY."
             )
-        genai.configure(api_key=api_key)
+        self._api_key = api_key
         # JSONモードを有効にするための設定
         self.generation_config = {
             "response_mime_type": "application/json",
         }
-        self.model = genai.GenerativeModel(
-            'gemini-2.5-flash-lite',
-            generation_config=self.generation_config
-        )
+        self.model_name = GEMINI_MODEL_NAME
+        self._model = None
+        self._model_lock = threading.Lock()
+        # 同一入力（フロントの再試行・同じ文の再翻訳など）は Gemini を呼ばずに返す
+        self.cache = get_ai_cache()
+
+    @property
+    def model(self):
+        """Gemini モデル。google.generativeai の import（重い）と初期化は初回利用時に行う。"""
+        if self._model is None:
+            with self._model_lock:
+                if self._model is None:
+                    import google.generativeai as genai
+
+                    genai.configure(api_key=self._api_key)
+                    self._model = genai.GenerativeModel(
+                        self.model_name,
+                        generation_config=self.generation_config
+                    )
+        return self._model
+
+    def warm_up(self) -> None:
+        """SDK の読み込みとモデルの初期化を先に済ませる（起動後にバックグラウンドで呼ぶ）。"""
+        self.model
 
     def _safe_get_response_text(self, response) -> str:
         """Geminiレスポンスからテキストを安全に取り出す。
@@ -69,27 +133,8 @@ class GoogleAIService:
 
         return ""
 
-    def generate_soap_from_text(self, transcribed_text: str) -> SoapNotes:
-        """
-        テキストからSOAPノートを生成します。
-        
-        Args:
-            transcribed_text: 文字起こしされた診療情報テキスト。
-        
-        Returns:
-            Pydanticモデル `SoapNotes` のインスタンス。
-        """
-        # ★★★ デバッグログ追加 ★★★
-        print(f"=== SOAP生成開始 ===")
-        print(f"入力テキスト: '{transcribed_text}'")
-        print(f"入力テキスト長: {len(transcribed_text)} 文字")
-        
-        # 入力テキストが空の場合の処理
-        if not transcribed_text or not transcribed_text.strip():
-            print("❌ 入力テキストが空です")
-            return SoapNotes(s="入力テキストが空です", o="", a="", p="")
-        
-        prompt = f"""
+    def _build_soap_prompt(self, transcribed_text: str) -> str:
+        return f"""
             あなたは優秀な大動物の獣医師です。
             以下の患者に関する情報をもとに、SOAP形式の診療ノートを作成してください。
 
@@ -110,11 +155,42 @@ class GoogleAIService:
                 "p": "ここに治療計画を記入"
             }}
             """
+
+    def generate_soap_from_text(self, transcribed_text: str) -> SoapNotes:
+        """
+        テキストからSOAPノートを生成します。
+        
+        Args:
+            transcribed_text: 文字起こしされた診療情報テキスト。
+        
+        Returns:
+            Pydanticモデル `SoapNotes` のインスタンス。
+        """
+        # ★★★ デバッグログ追加 ★★★
+        print(f"=== SOAP生成開始 ===")
+        print(f"入力テキスト: '{transcribed_text}'")
+        print(f"入力テキスト長: {len(transcribed_text)} 文字")
+        
+        # 入力テキストが空の場合の処理
+        if not transcribed_text or not transcribed_text.strip():
+            print("❌ 入力テキストが空です")
+            return SoapNotes(s="入力テキストが空です", o="", a="", p="")
+        
+        prompt = self._build_soap_prompt(transcribed_text)
         
         print(f"=== 送信するプロンプト ===")
         print(prompt)
         print("========================")
-        
+
+        cache_key = ResponseCache.make_key("soap", self.model_name, prompt)
+        cached = self.cache.get(cache_key)
+        if cached is not None:
+            try:
+                print("✅ キャッシュヒット（Gemini 呼び出しを省略）")
+                return SoapNotes(**json.loads(cached))
+            except Exception as e:
+                print(f"[ai-cache] cached SOAP ignored: {e}")
+
         try:
             print("🔄 Gemini API呼び出し中...")
             response = self.model.generate_content(prompt)
@@ -139,6 +215,7 @@ class GoogleAIService:
             # Pydanticモデルにデータをロードして検証
             soap_notes = SoapNotes(**soap_dict)
             print(f"✅ SoapNotes作成成功: {soap_notes}")
+            self.cache.set(cache_key, json.dumps(soap_notes.model_dump(), ensure_ascii=False))
             
             return soap_notes
                         
@@ -165,9 +242,61 @@ class GoogleAIService:
                 p="しばらくしてから再度お試しください"
             )
 
+    def stream_soap_from_text(self, transcribed_text: str) -> Iterator[Tuple[str, str]]:
+        """Gemini のストリーミング応答から、確定した SOAP 項目を (キー, 値) で順に返す。
+
+        4項目すべてを返し終えたら完了。キャッシュにあれば即座に全項目を返す。
+        応答が JSON として完結しなかった場合は ValueError を送出する。
+        """
+        if not transcribed_text or not transcribed_text.strip():
+            yield from SoapNotes(s="入力テキストが空です", o="", a="", p="").model_dump().items()
+            return
+
+        prompt = self._build_soap_prompt(transcribed_text)
+        # 非ストリーミング版と同じキーなので、どちらで生成した結果も共有される
+        cache_key = ResponseCache.make_key("soap", self.model_name, prompt)
+        cached = self.cache.get(cache_key)
+        if cached is not None:
+            try:
+                yield from SoapNotes(**json.loads(cached)).model_dump().items()
+                return
+            except Exception as e:
+                print(f"[ai-cache] cached SOAP ignored: {e}")
+
+        scanner = SoapFieldScanner()
+        response = self.model.generate_content(prompt, stream=True)
+        for chunk in response:
+            try:
+                text = chunk.text
+            except Exception as e:
+                # safety block などで断片にテキストが無い場合
+                print(f"[gemini] stream chunk without text: {e}")
+                continue
+            if text:
+                yield from scanner.feed(text)
+
+        feedback = getattr(response, "prompt_feedback", None)
+        block_reason = getattr(feedback, "block_reason", None)
+        if block_reason and str(block_reason) != "BLOCK_NONE":
+            raise ValueError(f"Geminiが応答をブロックしました: {block_reason}")
+        try:
+            soap_notes = SoapNotes(**json.loads(scanner.text))
+        except (json.JSONDecodeError, TypeError, ValueError) as e:
+            print(f"❌ ストリーミング応答のJSONパースエラー: {e}")
+            print(f"Geminiからの生の応答: '{scanner.text}'")
+            raise ValueError(f"JSONパースエラー: {e}")
+        self.cache.set(cache_key, json.dumps(soap_notes.model_dump(), ensure_ascii=False))
+        # スキャナが拾えなかった項目（値が文字列以外など）は最終結果から補う
+        for key, value in soap_notes.model_dump().items():
+            if key not in scanner.fields:
+                yield key, value
+
 # --- Simple translation support ---
-    def translate_text(self, text: str, target_lang: str = "en") -> str:
-        """Translate text to target_lang using Gemini. Returns original on error."""
+    def translate_text(self, text: str, target_lang: str = "en", raise_on_error: bool = False) -> str:
+        """Translate text to target_lang using Gemini.
+
+        Returns the original text on error unless raise_on_error is set.
+        """
         if not text:
             return text
         try:
@@ -176,13 +305,50 @@ class GoogleAIService:
                 f"into {target_lang}. Return only the translated text without any extra commentary or quotes.\n\n"
                 f"TEXT:\n{text}"
             )
+            cache_key = ResponseCache.make_key("translate", self.model_name, prompt, target_lang)
+            cached = self.cache.get(cache_key)
+            if cached is not None:
+                return cached
             resp = self.model.generate_content(prompt)
             out = self._safe_get_response_text(resp)
+            if not out and raise_on_error:
+                raise ValueError("Geminiから空の応答が返されました")
+            if out:
+                self.cache.set(cache_key, out)
             return out or text
         except Exception as e:
             print(f"[translate] failed: {e}")
+            if raise_on_error:
+                raise
             return text
 
+    def translate_soap(self, soap: SoapNotes, target_lang: str = "en") -> Dict[str, str]:
+        """SOAP の各項目を1回の Gemini 呼び出し（JSON モード）でまとめて翻訳する。
+
+        空でない項目のうち、翻訳できたものだけを {"s": ..., ...} で返す。
+        応答が JSON として読めない場合は例外を送出する。
+        """
+        fields = {k: v for k, v in soap.model_dump().items() if v}
+        if not fields:
+            return {}
+        prompt = (
+            "You are a professional veterinary translator. Translate every value of the following "
+            f"JSON object into {target_lang}. Keep the same keys and return only a JSON object.\n\n"
+            f"{json.dumps(fields, ensure_ascii=False)}"
+        )
+        cache_key = ResponseCache.make_key("translate_soap", self.model_name, prompt, target_lang)
+        cached = self.cache.get(cache_key)
+        if cached is not None:
+            return json.loads(cached)
+        resp = self.model.generate_content(prompt)
+        data = json.loads(self._safe_get_response_text(resp))
+        if not isinstance(data, dict):
+            raise ValueError("翻訳結果が JSON オブジェクトではありません")
+        result = {k: data[k] for k in fields if isinstance(data.get(k), str) and data[k].strip()}
+        if len(result) == len(fields):
+            self.cache.set(cache_key, json.dumps(result, ensure_ascii=False))
+        return result
+
 # サービスインスタンスを返す関数を定義
 _ai_service_instance = None
 def get_ai_service() -> GoogleAIService:
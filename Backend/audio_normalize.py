@@ -0,0 +1,277 @@
+import io
+import os
+import struct
+import subprocess
+import tempfile
+import wave
+from pathlib import Path
+from typing import List, NamedTuple, Optional, Tuple
+
+# 書き起こし前の音声正規化（モノラル化・リサンプリング・再エンコード）。0 で無効
+AUDIO_NORMALIZE = os.getenv("AUDIO_NORMALIZE", "1") == "1"
+# Speech API 推奨の 16kHz。元のサンプルレートがこれより低い場合はアップサンプリングしない
+AUDIO_TARGET_SAMPLE_RATE = int(os.getenv("AUDIO_TARGET_SAMPLE_RATE", "16000"))
+# 出力形式: flac（可逆・既定）または opus（Ogg/Opus。さらに小さいが非可逆）
+AUDIO_TARGET_CODEC = os.getenv("AUDIO_TARGET_CODEC", "flac").lower()
+AUDIO_OPUS_BITRATE = os.getenv("AUDIO_OPUS_BITRATE", "32k")
+
+# 無音区間の除去と発話区間ごとの分割（音量ベースの VAD）。0 で無効
+AUDIO_VAD = os.getenv("AUDIO_VAD", "1") == "1"
+# 音声全体の平均音量(dBFS)からこれだけ下回る区間を無音とみなす
+AUDIO_SILENCE_OFFSET_DB = float(os.getenv("AUDIO_SILENCE_OFFSET_DB", "16"))
+# これ以上続く無音で区切る / 発話の前後に残す余白（ミリ秒）
+AUDIO_MIN_SILENCE_MS = int(os.getenv("AUDIO_MIN_SILENCE_MS", "700"))
+AUDIO_SPEECH_PAD_MS = int(os.getenv("AUDIO_SPEECH_PAD_MS", "200"))
+# 1区間の最大長。同期認識（約60秒）に収まるようにする
+AUDIO_SEGMENT_MAX_SECONDS = float(os.getenv("AUDIO_SEGMENT_MAX_SECONDS", "50"))
+# 分割時にデコードする長さの上限（秒）。これより後ろは書き起こさない（SpeechSplit.truncated で知らせる）
+AUDIO_MAX_SECONDS = float(os.getenv("AUDIO_MAX_SECONDS", "1800"))
+
+# Speech API がそのまま受け付ける形式（.m4a/AAC は非対応なので必ず変換する）
+NATIVE_FORMATS = {".wav", ".flac", ".mp3", ".ogg", ".webm"}
+# Opus はデコード後 48kHz として扱われる（ブラウザの MediaRecorder も 48kHz）
+OPUS_FORMATS = {".ogg", ".webm"}
+_OPUS_RATES = (8000, 12000, 16000, 24000, 48000)
+# ffmpeg に渡す入力形式（未指定のものは ffmpeg に判定させる）
+_PYDUB_FORMATS = {".wav": "wav", ".m4a": "mp4"}
+
+
+class NormalizedAudio(NamedTuple):
+    data: bytes
+    # 変換後の形式に合わせた拡張子（エンコーディングの判定に使う）
+    filename: str
+    # None の場合はファイルヘッダから判定させる
+    sample_rate_hertz: Optional[int]
+    channels: Optional[int]
+
+
+class SpeechSegment(NamedTuple):
+    audio: NormalizedAudio
+    # 元の録音での開始・終了位置（秒）
+    start_seconds: float
+    end_seconds: float
+
+
+class SpeechSplit(NamedTuple):
+    segments: List[SpeechSegment]
+    # AUDIO_MAX_SECONDS を超えた後ろの部分を捨てた
+    truncated: bool = False
+
+
+def _probe_header(data: bytes, ext: str) -> Tuple[Optional[int], Optional[int]]:
+    """デコードせずにヘッダから (サンプルレート, チャンネル数) を読む。分からなければ None。"""
+    try:
+        if ext == ".wav":
+            with wave.open(io.BytesIO(data)) as w:
+                return w.getframerate(), w.getnchannels()
+        if ext == ".flac" and data[:4] == b"fLaC":
+            # STREAMINFO: 先頭メタデータブロックの 10 バイト目から 20bit レート / 3bit (チャンネル数-1)
+            bits = struct.unpack(">Q", data[18:26])[0]
+            return bits >> 44, ((bits >> 41) & 0x7) + 1
+    except Exception:
+        pass
+    if ext in OPUS_FORMATS:
+        return 48000, None
+    return None, None
+
+
+def _decode(data: bytes, filename: str):
+    try:
+        from pydub import AudioSegment
+        return AudioSegment.from_file(io.BytesIO(data), format=_PYDUB_FORMATS.get(Path(filename).suffix.lower()))
+    except Exception as e:
+        print(f"[audio] decode failed for {filename}; sending as-is: {e}")
+        return None
+
+
+def _decode_mono(data: bytes, filename: str, rate: int, max_seconds: Optional[float] = None):
+    """ffmpeg で直接 rate Hz・モノラル・16bit にデコードする（先頭 max_seconds 秒まで。既定 AUDIO_MAX_SECONDS）。
+
+    元のチャンネル数・サンプルレートのまま全体を展開しないので、長い録音でもメモリは
+    rate x 2 バイト/秒 x max_seconds に収まる。
+    """
+    if max_seconds is None:
+        max_seconds = AUDIO_MAX_SECONDS
+    ext = Path(filename).suffix.lower()
+    try:
+        from pydub import AudioSegment
+
+        # .m4a は moov が末尾にあるとパイプからは読めないので一時ファイル経由で渡す
+        with tempfile.NamedTemporaryFile(suffix=ext) as src:
+            src.write(data)
+            src.flush()
+            fmt = _PYDUB_FORMATS.get(ext)
+            command = [AudioSegment.converter, "-nostdin", "-hide_banner", "-loglevel", "error"]
+            command += (["-f", fmt] if fmt else []) + ["-i", src.name]
+            command += ["-vn", "-ac", "1", "-ar", str(rate), "-t", str(max_seconds)]
+            command += ["-acodec", "pcm_s16le", "-f", "s16le", "pipe:1"]
+            proc = subprocess.run(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        if proc.returncode != 0 or not proc.stdout:
+            raise RuntimeError(proc.stderr.decode("utf-8", "replace").strip()[-300:] or "no audio")
+        return AudioSegment(data=proc.stdout, sample_width=2, frame_rate=rate, channels=1)
+    except Exception as e:
+        print(f"[audio] decode failed for {filename}; sending as-is: {e}")
+        return None
+
+
+def _target_rate(src_rate: int) -> int:
+    """AUDIO_TARGET_SAMPLE_RATE を上限とした出力サンプルレート（アップサンプリングはしない）。"""
+    rate = min(src_rate, AUDIO_TARGET_SAMPLE_RATE)
+    if AUDIO_TARGET_CODEC == "opus":
+        # Opus は 8/12/16/24/48kHz のみ
+        rate = next((r for r in _OPUS_RATES if r >= rate), 48000)
+    return rate
+
+
+def _mono(segment):
+    """モノラル化し、AUDIO_TARGET_SAMPLE_RATE を上限にリサンプリングする。"""
+    return segment.set_channels(1).set_frame_rate(_target_rate(segment.frame_rate)).set_sample_width(2)
+
+
+def _encode(segment, filename: str) -> NormalizedAudio:
+    """モノラル化済みの AudioSegment を FLAC/Opus にエンコードする。"""
+    buf = io.BytesIO()
+    if AUDIO_TARGET_CODEC == "opus":
+        segment.export(buf, format="ogg", codec="libopus", bitrate=AUDIO_OPUS_BITRATE)
+        out_ext = ".ogg"
+    else:
+        segment.export(buf, format="flac")
+        out_ext = ".flac"
+    return NormalizedAudio(buf.getvalue(), Path(filename).stem + out_ext, segment.frame_rate, 1)
+
+
+def _passthrough(data: bytes, filename: str) -> NormalizedAudio:
+    rate, channels = _probe_header(data, Path(filename).suffix.lower())
+    return NormalizedAudio(data, filename, rate, channels)
+
+
+def normalize_audio(data: bytes, filename: str) -> NormalizedAudio:
+    """音声をモノラル・AUDIO_TARGET_SAMPLE_RATE 以下に揃えて FLAC/Opus に再エンコードする。
+
+    pydub（ffmpeg）でデコードできない場合や、元のファイルの方が小さく Speech API が
+    そのまま扱える場合は、ヘッダから読んだサンプルレートを添えて元のデータを返す。
+    CPU を使うので executors の "audio" プールから呼ぶこと。
+    """
+    if not AUDIO_NORMALIZE or not data:
+        return _passthrough(data, filename)
+    segment = _decode(data, filename)
+    if segment is None:
+        return _passthrough(data, filename)
+    return _normalize_decoded(data, filename, segment)
+
+
+def _normalize_decoded(data: bytes, filename: str, segment) -> NormalizedAudio:
+    ext = Path(filename).suffix.lower()
+    original = _passthrough(data, filename)
+    src_rate, src_channels = segment.frame_rate, segment.channels
+    if ext in NATIVE_FORMATS:
+        original = NormalizedAudio(data, filename, src_rate, src_channels)
+    try:
+        encoded = _encode(_mono(segment), filename)
+    except Exception as e:
+        print(f"[audio] encode failed for {filename}; sending as-is: {e}")
+        return original
+
+    # 既にモノラルで Speech API が読める形式なら、小さい方を送る（Opus の WebM など）
+    if ext in NATIVE_FORMATS and src_channels == 1 and len(data) <= len(encoded.data):
+        print(f"[audio] {filename}: kept original ({len(data)} bytes, {src_rate} Hz mono)")
+        return original
+    print(
+        f"[audio] {filename}: {len(data)} -> {len(encoded.data)} bytes "
+        f"({src_rate} Hz x{src_channels} -> {encoded.sample_rate_hertz} Hz mono {Path(encoded.filename).suffix[1:]})"
+    )
+    return encoded
+
+
+def _speech_ranges(segment) -> List[Tuple[int, int]]:
+    """発話区間 [(開始ms, 終了ms)] を返す。前後に余白を付け、重なった区間はつなげる。"""
+    from pydub.silence import detect_nonsilent
+
+    if segment.dBFS == float("-inf"):
+        return []
+    ranges = detect_nonsilent(
+        segment,
+        min_silence_len=AUDIO_MIN_SILENCE_MS,
+        silence_thresh=segment.dBFS - AUDIO_SILENCE_OFFSET_DB,
+        seek_step=10,
+    )
+    merged: List[Tuple[int, int]] = []
+    for start, end in ranges:
+        start = max(0, start - AUDIO_SPEECH_PAD_MS)
+        end = min(len(segment), end + AUDIO_SPEECH_PAD_MS)
+        if merged and start <= merged[-1][1]:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def split_speech(data: bytes, filename: str) -> SpeechSplit:
+    """無音を取り除き、発話を AUDIO_SEGMENT_MAX_SECONDS 以下の区間にまとめて正規化する。
+
+    隣り合う発話は上限に収まる限り1区間に連結する（区間内の長い無音は除かれる）。
+    音声は ffmpeg で最初から出力のサンプルレート・モノラルにデコードし、
+    AUDIO_MAX_SECONDS を超える部分は捨てる（truncated=True）。
+    デコードできない・VAD が無効などの場合は normalize_audio の結果を1区間で返す。
+    発話が見つからなければ区間は空になる。
+    """
+    if not (AUDIO_VAD and AUDIO_NORMALIZE and data):
+        return SpeechSplit([SpeechSegment(normalize_audio(data, filename), 0.0, 0.0)])
+    src_rate, _ = _probe_header(data, Path(filename).suffix.lower())
+    # 上限ちょうどの録音を切り詰めたと誤判定しないよう、1秒余分にデコードして確かめる
+    mono = _decode_mono(data, filename, _target_rate(src_rate or AUDIO_TARGET_SAMPLE_RATE), AUDIO_MAX_SECONDS + 1)
+    if mono is None:
+        return SpeechSplit([SpeechSegment(_passthrough(data, filename), 0.0, 0.0)])
+    truncated = len(mono) > AUDIO_MAX_SECONDS * 1000
+    if truncated:
+        print(f"[audio] {filename}: longer than {AUDIO_MAX_SECONDS:.0f}s; the rest is not transcribed")
+        mono = mono[:int(AUDIO_MAX_SECONDS * 1000)]
+    duration = len(mono) / 1000
+    try:
+        ranges = _speech_ranges(mono)
+    except Exception as e:
+        print(f"[audio] VAD failed for {filename}; using whole recording: {e}")
+        try:
+            return SpeechSplit([SpeechSegment(_encode(mono, filename), 0.0, duration)], truncated)
+        except Exception as e:
+            print(f"[audio] encode failed for {filename}; sending as-is: {e}")
+            return SpeechSplit([SpeechSegment(_passthrough(data, filename), 0.0, duration)])
+    if not ranges:
+        print(f"[audio] {filename}: no speech detected ({duration:.1f}s)")
+        return SpeechSplit([], truncated)
+
+    max_ms = int(AUDIO_SEGMENT_MAX_SECONDS * 1000)
+    # 上限を超える連続発話はそのまま切る
+    pieces: List[Tuple[int, int]] = []
+    for start, end in ranges:
+        while end - start > max_ms:
+            pieces.append((start, start + max_ms))
+            start += max_ms
+        pieces.append((start, end))
+    groups: List[List[Tuple[int, int]]] = []
+    length = 0
+    for piece in pieces:
+        size = piece[1] - piece[0]
+        if groups and length + size <= max_ms:
+            groups[-1].append(piece)
+            length += size
+        else:
+            groups.append([piece])
+            length = size
+
+    stem = Path(filename).stem
+    result: List[SpeechSegment] = []
+    try:
+        for i, group in enumerate(groups):
+            audio = sum((mono[start:end] for start, end in group[1:]), mono[group[0][0]:group[0][1]])
+            encoded = _encode(audio, f"{stem}-{i:03d}")
+            result.append(SpeechSegment(encoded, group[0][0] / 1000, group[-1][1] / 1000))
+    except Exception as e:
+        print(f"[audio] encode failed for {filename}; sending as-is: {e}")
+        return SpeechSplit([SpeechSegment(_passthrough(data, filename), 0.0, duration)])
+    kept = sum(end - start for start, end in pieces)
+    print(
+        f"[audio] {filename}: {duration:.1f}s -> {kept / 1000:.1f}s of speech "
+        f"in {len(result)} segment(s), {len(data)} -> {sum(len(r.audio.data) for r in result)} bytes"
+    )
+    return SpeechSplit(result, truncated)
@@ -1,72 +1,402 @@
+import hashlib
 import os
-from typing import Optional
+import threading
+import time
+import uuid
+from typing import TYPE_CHECKING, Callable, Iterable, Iterator, List, NamedTuple, Optional, Tuple
 from pathlib import Path
 
-from google.cloud import speech
-
+from ai_cache import ResponseCache
+from audio_normalize import NormalizedAudio, OPUS_FORMATS, SpeechSegment, SpeechSplit, split_speech
 from config import ensure_gcp_credentials
+from executors import get_executor
+from google_clients import get_storage_client
+
+if TYPE_CHECKING:
+    # google.cloud.speech（grpc を含む）は import が重いので、実際に使う時点で読み込む
+    from google.cloud import speech
+
+# 同期認識（recognize）の上限は約60秒。これを超える音声は long_running_recognize を使う
+# long_running_recognize にインラインで渡せる音声の上限（これを超える場合は GCS 経由）
+SPEECH_INLINE_MAX_BYTES = 10 * 1024 * 1024
+# long_running_recognize の完了確認間隔と待ち時間の上限（秒）
+SPEECH_LRO_POLL_SECONDS = float(os.getenv("SPEECH_LRO_POLL_SECONDS", "2"))
+SPEECH_LRO_TIMEOUT_SECONDS = float(os.getenv("SPEECH_LRO_TIMEOUT_SECONDS", "1800"))
+GCS_BUCKET_NAME = os.getenv("GCS_BUCKET_NAME")
+# 書き起こし結果のキャッシュ（音声内容の SHA-256 + 言語がキー）。再送された同じ音声は Speech を呼ばない
+STT_CACHE_MAX_ENTRIES = int(os.getenv("STT_CACHE_MAX_ENTRIES", "256"))
+STT_CACHE_TTL_SECONDS = float(os.getenv("STT_CACHE_TTL_SECONDS", str(30 * 24 * 60 * 60)))
+# 指定するとディスク（SQLite）にも保存し、再起動後も使い回す。未設定ならメモリのみ
+STT_CACHE_PATH = os.getenv("STT_CACHE_PATH") or None
+STT_CACHE_DISK_MAX_ENTRIES = int(os.getenv("STT_CACHE_DISK_MAX_ENTRIES", "10000"))
+
+
+class Recognition(NamedTuple):
+    # (テキスト, 区間の終了秒) のリスト
+    segments: List[Tuple[str, float]]
+    # 一部の区間の認識に失敗した場合は False（結果が欠けているのでキャッシュしない）
+    complete: bool
+    # AUDIO_MAX_SECONDS を超えた後ろの部分を書き起こしていない
+    truncated: bool = False
+
+    @property
+    def text(self) -> str:
+        return " ".join(text for text, _ in self.segments if text).strip()
 
 
 class GoogleAudioService:
     """Google Cloud Speech-to-Text API を使った音声転写サービス。
 
-    - 同期認識 API を使用
+    - 約60秒までは同期認識 API、それより長い音声は long_running_recognize を使用
     - 言語コードは引数 > 環境変数 SPEECH_LANGUAGE_CODE > 既定 ja-JP の順で決定
+    - 認識前に音声をモノラル・16kHz の FLAC 等へ正規化する（audio_normalize）
+    - 無音を除いて発話区間ごとに分割し、区間を並列に認識して順番どおりにつなげる
+    - 同じ内容の音声の書き起こし結果はキャッシュし、Speech を呼ばずに返す
     """
 
     def __init__(self):
         ensure_gcp_credentials()
-        self.client = speech.SpeechClient()
+        self._client = None
+        self._client_lock = threading.Lock()
+        self.cache = ResponseCache(
+            max_entries=STT_CACHE_MAX_ENTRIES,
+            ttl_seconds=STT_CACHE_TTL_SECONDS,
+            disk_path=STT_CACHE_PATH,
+            disk_max_entries=STT_CACHE_DISK_MAX_ENTRIES,
+        )
+
+    @property
+    def client(self):
+        """SpeechClient。SDK の import と gRPC チャネルの作成は初回利用時に行う。"""
+        if self._client is None:
+            with self._client_lock:
+                if self._client is None:
+                    from google.cloud import speech
+
+                    self._client = speech.SpeechClient()
+        return self._client
+
+    def warm_up(self) -> None:
+        """SDK の読み込みとクライアント作成を先に済ませる（起動後にバックグラウンドで呼ぶ）。"""
+        self.client
 
     def transcribe_audio(self, audio_file_path: str, language_code: Optional[str] = None) -> Optional[str]:
         try:
             with open(audio_file_path, "rb") as f:
                 audio_content = f.read()
-            return self._transcribe_audio_content(audio_content, audio_file_path, language_code=language_code)
+            recognition = self._transcribe_audio_content(audio_content, audio_file_path, language_code=language_code)
+            return None if recognition is None else recognition.text
         except Exception as e:
             print(f"[stt] file transcribe error: {e}")
             return None
 
     def transcribe_audio_data(self, audio_data: bytes, filename: str, language_code: Optional[str] = None) -> Optional[str]:
+        recognition = self.recognize_audio_data(audio_data, filename, language_code=language_code)
+        return None if recognition is None else recognition.text
+
+    def recognize_audio_data(self, audio_data: bytes, filename: str, language_code: Optional[str] = None) -> Optional[Recognition]:
+        """transcribe_audio_data と同じだが、切り詰めの有無なども含めて返す。失敗時は None。"""
         try:
             return self._transcribe_audio_content(audio_data, filename, language_code=language_code)
         except Exception as e:
             print(f"[stt] buffer transcribe error: {e}")
             return None
 
-    def _transcribe_audio_content(self, audio_content: bytes, filename: str, language_code: Optional[str] = None) -> Optional[str]:
-        try:
-            file_extension = Path(filename).suffix.lower()
-            encoding = self._get_audio_encoding(file_extension)
-
-            # 言語コード（引数 > 環境変数 > 既定 ja-JP）
-            lang = (language_code or os.getenv("SPEECH_LANGUAGE_CODE") or "ja-JP").strip()
-
-            audio = speech.RecognitionAudio(content=audio_content)
-            config = speech.RecognitionConfig(
-                encoding=encoding,
-                sample_rate_hertz=16000,
-                language_code=lang,
-                model="medical",
-                use_enhanced=True,
-                enable_automatic_punctuation=True,
-            )
+    @staticmethod
+    def _cache_key(audio_data: bytes, language_code: Optional[str]) -> str:
+        lang = (language_code or os.getenv("SPEECH_LANGUAGE_CODE") or "ja-JP").strip()
+        return ResponseCache.make_key("stt", "medical", hashlib.sha256(audio_data).hexdigest(), lang)
+
+    def _cached_transcript(self, audio_data: bytes, language_code: Optional[str]) -> Tuple[str, Optional[str]]:
+        """(キャッシュキー, キャッシュ済みの書き起こし or None)"""
+        key = self._cache_key(audio_data, language_code)
+        cached = self.cache.get(key)
+        if cached is not None:
+            print(f"[stt] cache hit ({len(audio_data)} bytes); Speech call skipped")
+        return key, cached
+
+    def _build_config(
+        self,
+        filename: str,
+        language_code: Optional[str] = None,
+        sample_rate_hertz: Optional[int] = None,
+    ) -> "speech.RecognitionConfig":
+        from google.cloud import speech
+
+        file_extension = Path(filename).suffix.lower()
+        encoding = self._get_audio_encoding(file_extension)
+
+        # 言語コード（引数 > 環境変数 > 既定 ja-JP）
+        lang = (language_code or os.getenv("SPEECH_LANGUAGE_CODE") or "ja-JP").strip()
+
+        return speech.RecognitionConfig(
+            encoding=encoding,
+            # 0 は未指定扱い（WAV/FLAC はヘッダから判定される）
+            sample_rate_hertz=sample_rate_hertz or self._default_sample_rate(file_extension) or 0,
+            language_code=lang,
+            model="medical",
+            use_enhanced=True,
+            enable_automatic_punctuation=True,
+        )
+
+    @staticmethod
+    def _default_sample_rate(file_extension: str) -> Optional[int]:
+        if file_extension in OPUS_FORMATS:
+            # ブラウザの MediaRecorder(Opus) は 48kHz
+            return 48000
+        if file_extension in (".wav", ".flac"):
+            return None
+        return 16000
+
+    def _config_for(self, normalized: NormalizedAudio, language_code: Optional[str]) -> "speech.RecognitionConfig":
+        config = self._build_config(normalized.filename, language_code, normalized.sample_rate_hertz)
+        if normalized.channels and normalized.channels > 1:
+            # 変換できずステレオのまま送る場合
+            config.audio_channel_count = normalized.channels
+        return config
+
+    def _split(self, audio_data: bytes, filename: str) -> SpeechSplit:
+        """無音除去・分割・変換を "audio" プールで実行する（ffmpeg の同時実行数を Speech 呼び出しと別に制限）。"""
+        return get_executor("audio").submit(split_speech, audio_data, filename).result()
+
+    def _recognize_sync(self, normalized: NormalizedAudio, language_code: Optional[str] = None) -> str:
+        from google.cloud import speech
+
+        config = self._config_for(normalized, language_code)
+        response = self.client.recognize(config=config, audio=speech.RecognitionAudio(content=normalized.data))
+        return " ".join(res.alternatives[0].transcript for res in response.results if res.alternatives).strip()
 
-            response = self.client.recognize(config=config, audio=audio)
-            transcript = " ".join([res.alternatives[0].transcript for res in response.results]).strip()
-            print(f"[stt] done ({lang}): {transcript[:100]}...")
-            return transcript
+    def _recognize_segments(
+        self,
+        segments: List[SpeechSegment],
+        language_code: Optional[str] = None,
+        on_progress: Optional[Callable[[int], None]] = None,
+        on_segment: Optional[Callable[[str, float], None]] = None,
+    ) -> Recognition:
+        """発話区間を "speech_segment" プールで並列に同期認識し、元の順番で返す。
+
+        一部の区間が失敗してもその区間を空として続行し、complete=False で返す（全区間失敗なら例外）。
+        on_segment には認識できた区間を先頭から順に (テキスト, 終了秒) で通知する。
+        """
+        pool = get_executor("speech_segment")
+        futures = [pool.submit(self._recognize_sync, seg.audio, language_code) for seg in segments]
+        results: List[Tuple[str, float]] = []
+        errors = 0
+        for i, (seg, future) in enumerate(zip(segments, futures)):
+            try:
+                text = future.result()
+            except Exception as e:
+                print(f"[stt] segment {i} ({seg.start_seconds:.1f}-{seg.end_seconds:.1f}s) failed: {e}")
+                errors += 1
+                if errors == len(segments):
+                    raise
+                continue
+            if text:
+                results.append((text, seg.end_seconds))
+                if on_segment is not None:
+                    on_segment(text, seg.end_seconds)
+            if on_progress is not None:
+                on_progress(int((i + 1) * 100 / len(segments)))
+        return Recognition(results, errors == 0)
+
+    @staticmethod
+    def _is_too_long_error(error: Exception) -> bool:
+        msg = str(error).lower()
+        return "too long" in msg or "longrunningrecognize" in msg
+
+    def _transcribe_audio_content(self, audio_content: bytes, filename: str, language_code: Optional[str] = None) -> Optional[Recognition]:
+        cache_key, cached = self._cached_transcript(audio_content, language_code)
+        if cached is not None:
+            return Recognition([(cached, 0.0)], True)
+        recognition = self._recognize_content(audio_content, filename, language_code)
+        if recognition is None:
+            return None
+        # 失敗（None）と、一部の区間が欠けた・切り詰めた結果はキャッシュしない（再送で認識し直せるように）
+        if recognition.complete and not recognition.truncated:
+            self.cache.set(cache_key, recognition.text)
+        return recognition
+
+    def _recognize_content(self, audio_content: bytes, filename: str, language_code: Optional[str] = None) -> Optional[Recognition]:
+        segments, truncated = self._split(audio_content, filename)
+        if not segments:
+            return Recognition([], True, truncated)
+        if len(segments) > 1:
+            try:
+                recognition = self._recognize_segments(segments, language_code)._replace(truncated=truncated)
+                print(f"[stt] done ({len(segments)} segments): {recognition.text[:100]}...")
+                return recognition
+            except Exception as e:
+                print(f"[stt] segmented recognize error: {e}")
+                return None
+        normalized = segments[0].audio
+        try:
+            transcript = self._recognize_sync(normalized, language_code)
+            print(f"[stt] done: {transcript[:100]}...")
+            return Recognition([(transcript, segments[0].end_seconds)], True, truncated)
         except Exception as e:
+            if self._is_too_long_error(e):
+                # 60秒を超える音声は long_running_recognize でやり直す（変換済みの音声を使い回す）
+                print("[stt] audio longer than sync limit; switching to long_running_recognize")
+                try:
+                    return Recognition(self._recognize_long(normalized, language_code), True, truncated)
+                except Exception as long_error:
+                    print(f"[stt] long-running transcribe error: {long_error}")
+                    return None
             print(f"[stt] recognize error: {e}")
             return None
 
-    def _get_audio_encoding(self, file_extension: str) -> speech.RecognitionConfig.AudioEncoding:
+    def transcribe_long_audio_data(self, audio_data: bytes, filename: str, language_code: Optional[str] = None) -> Optional[str]:
+        cache_key, cached = self._cached_transcript(audio_data, language_code)
+        if cached is not None:
+            return cached
+        try:
+            recognition = self._recognize_long_audio(audio_data, filename, language_code)
+            if recognition.complete and not recognition.truncated:
+                self.cache.set(cache_key, recognition.text)
+            return recognition.text
+        except Exception as e:
+            print(f"[stt] long-running transcribe error: {e}")
+            return None
+
+    def long_running_recognize(
+        self,
+        audio_data: bytes,
+        filename: str,
+        language_code: Optional[str] = None,
+        on_progress: Optional[Callable[[int], None]] = None,
+        on_segment: Optional[Callable[[str, float], None]] = None,
+    ) -> Recognition:
+        """長時間音声を書き起こす（完了までブロック）。
+
+        無音で区切れる音声は発話区間ごとの同期認識を並列に行い、区切れない場合は
+        long_running_recognize を使う。
+
+        Returns:
+            Recognition（segments は (テキスト, 区間の終了秒) のリスト）。on_progress には進捗(%)を、
+            on_segment には認識できた区間を先頭から順に通知する（完了を待たずに途中結果を見せるため）。
+        """
+        return self._recognize_long_audio(audio_data, filename, language_code, on_progress, on_segment)
+
+    def _recognize_long_audio(
+        self,
+        audio_data: bytes,
+        filename: str,
+        language_code: Optional[str] = None,
+        on_progress: Optional[Callable[[int], None]] = None,
+        on_segment: Optional[Callable[[str, float], None]] = None,
+    ) -> Recognition:
+        segments, truncated = self._split(audio_data, filename)
+        if not segments:
+            if on_progress is not None:
+                on_progress(100)
+            return Recognition([], True, truncated)
+        if len(segments) > 1:
+            # 発話区間はそれぞれ同期認識の上限に収まるので、並列に認識する
+            recognition = self._recognize_segments(segments, language_code, on_progress, on_segment)
+            recognition = recognition._replace(truncated=truncated)
+            print(
+                f"[stt] segmented long transcription done: "
+                f"{len(recognition.segments)}/{len(segments)} segment(s) with text"
+            )
+            return recognition
+        segment = segments[0]
+        results = self._recognize_long(segment.audio, language_code, on_progress, offset_seconds=segment.start_seconds)
+        if on_segment is not None:
+            # long_running_recognize の結果は完了時にまとめて届く
+            for text, end in results:
+                on_segment(text, end)
+        return Recognition(results, True, truncated)
+
+    def _recognize_long(
+        self,
+        normalized: NormalizedAudio,
+        language_code: Optional[str] = None,
+        on_progress: Optional[Callable[[int], None]] = None,
+        offset_seconds: float = 0.0,
+    ) -> List[Tuple[str, float]]:
+        from google.cloud import speech
+
+        config = self._config_for(normalized, language_code)
+        gcs_blob = None
+        if len(normalized.data) <= SPEECH_INLINE_MAX_BYTES:
+            audio = speech.RecognitionAudio(content=normalized.data)
+        else:
+            gcs_blob = self._upload_for_recognition(normalized.data, normalized.filename)
+            audio = speech.RecognitionAudio(uri=f"gs://{gcs_blob.bucket.name}/{gcs_blob.name}")
+        try:
+            operation = self.client.long_running_recognize(config=config, audio=audio)
+            deadline = time.monotonic() + SPEECH_LRO_TIMEOUT_SECONDS
+            while not operation.done():
+                if time.monotonic() > deadline:
+                    raise TimeoutError("long_running_recognize timed out")
+                if on_progress is not None:
+                    try:
+                        on_progress(int(operation.metadata.progress_percent or 0))
+                    except Exception:
+                        pass
+                time.sleep(SPEECH_LRO_POLL_SECONDS)
+            response = operation.result()
+        finally:
+            if gcs_blob is not None:
+                try:
+                    gcs_blob.delete()
+                except Exception as e:
+                    print(f"[stt] failed to delete temporary GCS object: {e}")
+        segments: List[Tuple[str, float]] = []
+        for res in response.results:
+            if not res.alternatives:
+                continue
+            end = res.result_end_time.total_seconds() if res.result_end_time else 0.0
+            segments.append((res.alternatives[0].transcript.strip(), offset_seconds + end))
+        if on_progress is not None:
+            on_progress(100)
+        print(f"[stt] long-running done ({config.language_code}): {len(segments)} segment(s)")
+        return segments
+
+    def streaming_recognize(
+        self,
+        audio_chunks: Iterable[bytes],
+        filename: str,
+        language_code: Optional[str] = None,
+        sample_rate_hertz: Optional[int] = None,
+    ) -> Iterator[Tuple[str, bool, float]]:
+        """録音中の音声チャンクを streaming_recognize に流し、結果を逐次返す（ブロッキング）。
+
+        audio_chunks はコンテナ先頭（WebM ヘッダ）から順に渡すこと。
+        Yields:
+            (テキスト, is_final, stability)
+        """
+        from google.cloud import speech
+
+        config = self._build_config(filename, language_code, sample_rate_hertz)
+        streaming_config = speech.StreamingRecognitionConfig(config=config, interim_results=True)
+        requests = (speech.StreamingRecognizeRequest(audio_content=chunk) for chunk in audio_chunks if chunk)
+        responses = self.client.streaming_recognize(config=streaming_config, requests=requests)
+        for response in responses:
+            for result in response.results:
+                if not result.alternatives:
+                    continue
+                yield result.alternatives[0].transcript, bool(result.is_final), float(result.stability or 0.0)
+
+    def _upload_for_recognition(self, audio_data: bytes, filename: str):
+        """インライン上限を超える音声を一時的に GCS に置く。"""
+        client = get_storage_client()
+        if client is None or not GCS_BUCKET_NAME:
+            raise RuntimeError("音声が10MBを超えています。長時間音声の書き起こしには GCS_BUCKET_NAME の設定が必要です")
+        blob = client.bucket(GCS_BUCKET_NAME).blob(f"speech-tmp/{uuid.uuid4().hex}{Path(filename).suffix.lower()}")
+        blob.upload_from_string(audio_data)
+        return blob
+
+    def _get_audio_encoding(self, file_extension: str) -> "speech.RecognitionConfig.AudioEncoding":
+        from google.cloud import speech
+
         mapping = {
             ".wav": speech.RecognitionConfig.AudioEncoding.LINEAR16,
             ".flac": speech.RecognitionConfig.AudioEncoding.FLAC,
             ".mp3": speech.RecognitionConfig.AudioEncoding.MP3,
             ".ogg": speech.RecognitionConfig.AudioEncoding.OGG_OPUS,
             ".webm": speech.RecognitionConfig.AudioEncoding.WEBM_OPUS,
+            # .m4a(AAC) は Speech API 非対応。通常は正規化で FLAC に変換済み
             ".m4a": speech.RecognitionConfig.AudioEncoding.ENCODING_UNSPECIFIED,
         }
         return mapping.get(file_extension, speech.RecognitionConfig.AudioEncoding.LINEAR16)
@@ -79,7 +409,7 @@ class GoogleAudioService:
     def get_supported_formats(self) -> dict:
         return {
             "supported_formats": [".wav", ".flac", ".mp3", ".ogg", ".webm", ".m4a"],
-            "max_duration": "~60s (sync)",
+            "max_duration": "~60s (sync) / longer via long_running_recognize",
             "language_examples": ["ja-JP", "en-US"],
             "model": "medical",
         }
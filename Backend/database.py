@@ -1,231 +1,734 @@
-﻿from typing import Dict, List, Optional, Tuple
-from schemas import Animal, Record, SoapNotes
+﻿from typing import Dict, Iterable, List, Optional, Set, Tuple
+from schemas import Animal, AnimalSummary, Record, SoapNotes
+from search_index import SearchIndex
+from sheets_writer import SheetsReplicator, SheetsWriteQueue
+from sqlite_store import SQLiteStore
+from snapshot import load_snapshot, save_snapshot, snapshot_stamp
+import bisect
+import hashlib
+import itertools
 import threading
+import time
 import os
-import base64
-from google.oauth2.service_account import Credentials
-from googleapiclient.discovery import build
+import uuid
 from fastapi import HTTPException
-import json
+from google_clients import get_sheets_service
 
 _lock = threading.Lock()
 DEV_MODE = (os.getenv("LOCAL_DEV", "0") == "1")
-# Sheets 譖ｸ縺崎ｾｼ縺ｿ螟ｱ謨玲凾縺ｮ謇ｱ縺・ｼ域里螳・ 蜴ｳ譬ｼ縺ｧ縺ｪ縺・= 繝｡繝｢繝ｪ菫晏ｭ倥ｒ邯ｭ謖・ｼ・STRICT_SHEETS_WRITE = (os.getenv("STRICT_SHEETS_WRITE", "0") == "1")
+# Sheets 書き込み失敗時の扱い（既定: 厳格でない = メモリ保存を維持）
+# STRICT_SHEETS_WRITE=1 の場合は書き込み完了を待ち、失敗したらメモリからも取り消して 500 を返す
+STRICT_SHEETS_WRITE = (os.getenv("STRICT_SHEETS_WRITE", "0") == "1")
+# STRICT 時に Sheets 書き込み完了を待つ上限（秒）
+SHEETS_STRICT_TIMEOUT = float(os.getenv("SHEETS_STRICT_TIMEOUT", "60"))
 # Allow overriding sheet tab names via env
 ANIMALS_TAB = os.getenv("SHEETS_TAB_ANIMALS", "animals")
 RECORDS_TAB = os.getenv("SHEETS_TAB_RECORDS", "records")
+# Sheets の変更を定期的に取り込む間隔（秒）。0 で無効（/api/debug/reload-sheets で随時実行）
+SHEETS_REFRESH_INTERVAL = float(os.getenv("SHEETS_REFRESH_INTERVAL", "0"))
+# 主ストア: sheets（既定。Sheets が唯一の永続先）または sqlite（SQLite が主、Sheets は非同期の複製先）
+DB_BACKEND = os.getenv("DB_BACKEND", "sheets").lower()
+SQLITE_DB_PATH = os.getenv("SQLITE_DB_PATH", "vetchart.sqlite3")
 
 
-def _get_gcp_credentials():
-    """Obtain Google credentials.
-    Priority:
-    1) GOOGLE_SERVICE_ACCOUNT_B64 (base64-encoded JSON)
-    2) GOOGLE_APPLICATION_CREDENTIALS or local 'service_account.json' file
+def _get_sheets_service():
+    if DEV_MODE:
+        raise RuntimeError("LOCAL_DEV=1: Sheets service disabled")
+    return get_sheets_service()
+
+
+_SHEETS_WRITER = SheetsWriteQueue(service_factory=_get_sheets_service)
+# 主ストア利用時の更新・削除の複製。行が見つからない（404）ものは再試行しない
+_SHEETS_REPLICATOR = SheetsReplicator(permanent=lambda e: getattr(e, "status_code", None) == 404)
+
+
+def _animal_row(animal: Animal) -> list:
+    """animals タブの1行（A:G）"""
+    thumb = ""
+    if getattr(animal, "thumbnailUrl", None):
+        try:
+            thumb = str(animal.thumbnailUrl).split("/")[-1]
+        except Exception:
+            thumb = str(animal.thumbnailUrl)
+    return [
+        animal.microchip_number,
+        getattr(animal, "farm_id", None),
+        animal.name,
+        getattr(animal, "age", None),
+        getattr(animal, "sex", None),
+        getattr(animal, "breed", None),
+        thumb,
+    ]
+
+
+def _record_row(record: Record) -> list:
+    """records タブの1行（A:M）"""
+    return [
+        record.animalId,
+        record.id,
+        record.visit_date,
+        record.soap.s,
+        record.soap.o,
+        record.soap.a,
+        record.soap.p,
+        ",".join(record.medication_history or []),
+        record.next_visit_date,
+        getattr(record, 'next_visit_time', None),
+        ",".join(record.images or []),
+        record.audioUrl,
+        getattr(record, 'doctor', None),
+    ]
+
+
+# records タブの列から作られる Record の項目（これ以外の項目は差分取り込みで上書きしない）
+_SHEET_RECORD_FIELDS = (
+    "animalId", "id", "visit_date", "soap", "medication_history",
+    "next_visit_date", "next_visit_time", "images", "audioUrl", "doctor",
+)
+_SHEET_ANIMAL_FIELDS = ("microchip_number", "farm_id", "name", "age", "sex", "breed", "thumbnailUrl")
+
+
+def _row_hash(row: list) -> str:
+    """Sheets の1行の内容ハッシュ。API は末尾の空セルを返さないので除いてから計算する。"""
+    cells = ["" if v is None else str(v) for v in row]
+    while cells and cells[-1] == "":
+        cells.pop()
+    return hashlib.blake2b("\x1f".join(cells).encode("utf-8"), digest_size=16).hexdigest()
+
+
+def _animal_from_row(row: list) -> Optional[Animal]:
+    """animals タブの1行（A:G）から Animal を作る。id・名前が無い行は None。"""
+    animal_id = row[0] if len(row) > 0 else None
+    if not animal_id:
+        return None
+    farm_id = row[1] if len(row) > 1 else None
+    name = row[2] if len(row) > 2 else None
+    if not name:
+        return None
+    age = None
+    if len(row) > 3:
+        try:
+            age = int(row[3]) if str(row[3]).isdigit() else None
+        except Exception:
+            age = None
+    sex = row[4] if len(row) > 4 else None
+    breed = row[5] if len(row) > 5 else None
+    thumbnailUrl = row[6] if len(row) > 6 else None
+    return Animal(
+        id=animal_id,
+        microchip_number=animal_id,
+        farm_id=farm_id,
+        name=name,
+        age=age,
+        sex=sex,
+        breed=breed,
+        thumbnailUrl=thumbnailUrl,
+        records=[],
+    )
+
+
+def _record_from_row(row: list) -> Optional[Record]:
+    """records タブの1行（A:M）から Record を作る。空行（削除済み）は None。"""
+    if not row or not row[0]:
+        return None
+    soap = SoapNotes(
+        s=row[3] if len(row) > 3 else "",
+        o=row[4] if len(row) > 4 else "",
+        a=row[5] if len(row) > 5 else "",
+        p=row[6] if len(row) > 6 else "",
+    )
+    record = Record(
+        animalId=row[0],
+        id=row[1],
+        visit_date=row[2],
+        soap=soap,
+        medication_history=row[7].split(",") if len(row) > 7 and row[7] else [],
+        next_visit_date=row[8] if len(row) > 8 else None,
+        next_visit_time=row[9] if len(row) > 9 else None,
+        images=row[10].split(",") if len(row) > 10 and row[10] else [],
+        audioUrl=row[11] if len(row) > 11 else None,
+    )
+    try:
+        if len(row) > 12 and row[12]:
+            setattr(record, 'doctor', row[12])
+    except Exception:
+        pass
+    return record
+
+
+def _visit_day(next_visit_date) -> Optional[str]:
+    """next_visit_date（'YYYY-MM-DD' or 'YYYY-MM-DDTHH:MM'）から日付部分を取り出す。"""
+    if not next_visit_date:
+        return None
+    if isinstance(next_visit_date, str):
+        day = next_visit_date.split("T", 1)[0]
+        if day:
+            return day
+    try:
+        return str(next_visit_date)[:10] or None
+    except Exception:
+        return None
+
+
+def _index_add(index: Dict, key, member: str) -> None:
+    index.setdefault(key, set()).add(member)
+
+
+def _index_discard(index: Dict, key, member: str) -> None:
+    members = index.get(key)
+    if members is None:
+        return
+    members.discard(member)
+    if not members:
+        del index[key]
+
+
+def _appointment_item(animal: Animal, record: Record) -> Optional[dict]:
+    """診療記録の next_visit_date から予定 dict を作る（予定がなければ None）。"""
+    nxt = getattr(record, "next_visit_date", None)
+    day = _visit_day(nxt)
+    if not day:
+        return None
+    t = getattr(record, "next_visit_time", None)
+    if not t and isinstance(nxt, str) and "T" in nxt:
+        t = nxt.split("T", 1)[1][:5]
+    return {
+        "id": f"{animal.id}-{getattr(record, 'id', '')}",
+        "microchip_number": animal.id,
+        "animal_name": getattr(animal, "name", ""),
+        "farm_id": getattr(animal, "farm_id", None),
+        "date": day,
+        "time": t or "",
+        "description": None,
+        "summary": getattr(getattr(record, 'soap', None), 'a', None),
+        "status": "scheduled",
+        "doctor": getattr(record, 'doctor', None),
+    }
+
+
+class _DBIndexes:
+    """InMemoryDB の二次インデックス。
+
+    値が未設定（None / 空文字）の動物は None キーに入る。list_animals の
+    フィルタは「未設定の項目は一致扱い」なので、検索時に None キーも合わせて引く。
     """
-    b64_str = os.getenv("GOOGLE_SERVICE_ACCOUNT_B64")
-    if b64_str:
-        data = base64.b64decode(b64_str)
-        info = json.loads(data.decode("utf-8"))
-        creds = Credentials.from_service_account_info(
-            info,
-            scopes=["https://www.googleapis.com/auth/spreadsheets"],
-        )
-        return creds
-
-    # Fallback to file path
-    cred_path = os.getenv("GOOGLE_APPLICATION_CREDENTIALS") or "service_account.json"
-    if os.path.exists(cred_path):
-        creds = Credentials.from_service_account_file(
-            cred_path,
-            scopes=["https://www.googleapis.com/auth/spreadsheets"],
-        )
-        return creds
 
-    raise RuntimeError("No Google service account credentials found. Set GOOGLE_SERVICE_ACCOUNT_B64 or provide service_account.json")
+    def __init__(self):
+        # record_id -> (animal_id, animal.records 内の位置)
+        self.records: Dict[str, Tuple[str, int]] = {}
+        self.by_microchip: Dict[str, Set[str]] = {}
+        self.by_farm: Dict[Optional[str], Set[str]] = {}
+        self.by_breed: Dict[Optional[str], Set[str]] = {}
+        self.by_sex: Dict[Optional[str], Set[str]] = {}
+        # 予定インデックス: next_visit_date の日付部分 -> {record_id: 予定 dict}
+        self.appointments: Dict[str, Dict[str, dict]] = {}
+        self.appointment_days: List[str] = []  # appointments のキーを昇順で保持
+        self.appointment_day_of: Dict[str, str] = {}  # record_id -> 日付
+        # record_id -> records タブ上の行番号（1始まり）。更新・削除で列全体を読まないため
+        self.sheet_rows: Dict[str, int] = {}
+        # 全文検索（名前・農場ID・マイクロチップ・SOAP本文）
+        self.text = SearchIndex()
+        # animals dict の挿入順を保つための連番
+        self.animal_order: Dict[str, int] = {}
+        self._seq = itertools.count()
 
+    def add_animal(self, animal: Animal) -> None:
+        if animal.id not in self.animal_order:
+            self.animal_order[animal.id] = next(self._seq)
+        _index_add(self.by_microchip, animal.microchip_number, animal.id)
+        _index_add(self.by_farm, getattr(animal, "farm_id", None) or None, animal.id)
+        _index_add(self.by_breed, getattr(animal, "breed", None) or None, animal.id)
+        _index_add(self.by_sex, getattr(animal, "sex", None) or None, animal.id)
+        self.text.add(animal.id, "animal", [
+            ("name", animal.name),
+            ("microchip", animal.microchip_number),
+            ("farm", getattr(animal, "farm_id", None)),
+        ])
+        for pos, rec in enumerate(getattr(animal, "records", None) or []):
+            self.add_record(animal, rec, pos)
 
-def _get_sheets_service():
-    if DEV_MODE:
-        raise RuntimeError("LOCAL_DEV=1: Sheets service disabled")
-    creds = _get_gcp_credentials()
-    return build("sheets", "v4", credentials=creds)
+    def remove_animal(self, animal: Animal) -> None:
+        for rec in getattr(animal, "records", None) or []:
+            self.remove_record(rec)
+        _index_discard(self.by_microchip, animal.microchip_number, animal.id)
+        _index_discard(self.by_farm, getattr(animal, "farm_id", None) or None, animal.id)
+        _index_discard(self.by_breed, getattr(animal, "breed", None) or None, animal.id)
+        _index_discard(self.by_sex, getattr(animal, "sex", None) or None, animal.id)
+        self.text.remove_animal(animal.id)
+
+    def add_record(self, animal: Animal, record: Record, position: int) -> None:
+        self.records[record.id] = (animal.id, position)
+        soap = getattr(record, "soap", None)
+        if soap is not None:
+            self.text.add(animal.id, f"record:{record.id}", [
+                ("soap", soap.s), ("soap", soap.o), ("soap", soap.a), ("soap", soap.p),
+            ])
+        item = _appointment_item(animal, record)
+        if item is None:
+            return
+        day = item["date"]
+        if day not in self.appointments:
+            self.appointments[day] = {}
+            bisect.insort(self.appointment_days, day)
+        self.appointments[day][record.id] = item
+        self.appointment_day_of[record.id] = day
+
+    def remove_record(self, record: Record) -> None:
+        loc = self.records.pop(record.id, None)
+        if loc is not None:
+            self.text.remove(loc[0], f"record:{record.id}")
+        day = self.appointment_day_of.pop(record.id, None)
+        if day is None:
+            return
+        items = self.appointments.get(day)
+        if items is None:
+            return
+        items.pop(record.id, None)
+        if not items:
+            del self.appointments[day]
+            i = bisect.bisect_left(self.appointment_days, day)
+            if i < len(self.appointment_days) and self.appointment_days[i] == day:
+                self.appointment_days.pop(i)
+
+    def reposition(self, animal_id: str, records: List[Record], start: int = 0) -> None:
+        for pos in range(start, len(records)):
+            self.records[records[pos].id] = (animal_id, pos)
+
+    def animal_ids(
+        self,
+        microchip_number: Optional[str] = None,
+        farm_id: Optional[str] = None,
+        breed: Optional[str] = None,
+        sex: Optional[str] = None,
+    ) -> Optional[Set[str]]:
+        """フィルタ条件に一致する animal id 集合。条件なしなら None。"""
+        candidates: List[Set[str]] = []
+        if microchip_number:
+            candidates.append(set(self.by_microchip.get(microchip_number, ())))
+        if farm_id:
+            # farm_id は部分一致なので、動物数ではなく農場数だけキーを走査する
+            ids = set(self.by_farm.get(None, ()))
+            for key, members in list(self.by_farm.items()):
+                if key is not None and farm_id in key:
+                    ids |= members
+            candidates.append(ids)
+        if breed:
+            candidates.append(set(self.by_breed.get(breed, ())) | self.by_breed.get(None, set()))
+        if sex:
+            candidates.append(set(self.by_sex.get(sex, ())) | self.by_sex.get(None, set()))
+        if not candidates:
+            return None
+        candidates.sort(key=len)
+        result = candidates[0]
+        for other in candidates[1:]:
+            result &= other
+        return result
 
 
 class InMemoryDB:
-    def __init__(self):
+    """動物・診療記録をメモリに保持し、インデックスで検索に答える。
+
+    store（SQLiteStore）を渡すとそれを主ストアとして同期的に書き込み、Sheets へは
+    バックグラウンドで一方向に複製する（Sheets の失敗はリクエストを失敗させない）。
+    store が無い場合は従来どおり Sheets が唯一の永続先で、起動を速くするために
+    スナップショット（snapshot.py）を保存し、次回はそれと Sheets の追記分だけから復元する。
+    """
+
+    def __init__(self, store: Optional[SQLiteStore] = None):
         self.animals: Dict[str, Animal] = {}
+        self._idx = _DBIndexes()
+        self.store = store
+        # 各タブで読み込み済みの最終行番号（ヘッダが 1 行目）。差分読み込みはこの次の行から
+        self._sheet_marks: Dict[str, int] = {"animals": 1, "records": 1}
+        # 最後にスナップショットを保存してから変更があったか
+        self._dirty = False
+        # スナップショットから起動し、Sheets の追記分をまだ取り込んでいない
+        self.needs_catch_up = False
+        # 前回読んだ Sheets の内容（id -> 行ハッシュ）。refresh_from_sheets の差分検出に使う
+        self._sheet_hashes: Dict[str, Dict[str, str]] = {"animals": {}, "records": {}}
+        # 最後に Sheets を全件読んだ（load_from_sheets / refresh_from_sheets）時刻。スナップショットの有効期限の基準
+        self._sheets_loaded_at = 0.0
 
     # Animals
     def add_animal(self, animal: Animal):
-        with _lock:
-            self.animals[animal.id] = animal
-            if DEV_MODE:
-                return
-                # 繧ｹ繧ｭ繝・・: 繝ｭ繝ｼ繧ｫ繝ｫ縺ｧ縺ｯSheets縺ｫ譖ｸ縺崎ｾｼ縺ｾ縺ｪ縺・                return
+        outbox_id = self._outbox_id()
+        if self.store is not None:
             try:
-                service = _get_sheets_service()
-                spreadsheet_id = os.getenv("SPREADSHEET_ID")
-                thumb = ""
-                if getattr(animal, "thumbnailUrl", None):
-                    try:
-                        thumb = str(animal.thumbnailUrl).split("/")[-1]
-                    except Exception:
-                        thumb = str(animal.thumbnailUrl)
-                row = [
-                    animal.microchip_number,
-                    getattr(animal, "farm_id", None),
-                    animal.name,
-                    getattr(animal, "age", None),
-                    getattr(animal, "sex", None),
-                    getattr(animal, "breed", None),
-                    thumb,
-                ]
-                service.spreadsheets().values().append(
-                    spreadsheetId=spreadsheet_id,
-                    range=f"{ANIMALS_TAB}!A1",
-                    valueInputOption="USER_ENTERED",
-                    insertDataOption="INSERT_ROWS",
-                    body={"values": [row]},
-                ).execute()
+                self.store.save_animal(animal, outbox_id=outbox_id)
             except Exception as e:
-                # Sheets 譖ｸ縺崎ｾｼ縺ｿ縺ｫ螟ｱ謨励＠縺ｦ繧ゅ∵里螳壹〒縺ｯ繝｡繝｢繝ｪ菫晏ｭ倥ｒ邯ｭ謖・                print(f"Failed to write animal to Sheets: {e}")
-                if STRICT_SHEETS_WRITE:
-                    try:
-                        del self.animals[animal.id]
-                    except Exception:
-                        pass
-                    raise HTTPException(status_code=500, detail="Failed to save animal data to database (Sheets write error).")
+                print(f"Failed to write animal to local store: {e}")
+                raise HTTPException(status_code=500, detail="Failed to save animal data to database.")
+        with _lock:
+            previous = self.animals.get(animal.id)
+            if previous is not None:
+                self._idx.remove_animal(previous)
+            self.animals[animal.id] = animal
+            self._idx.add_animal(animal)
+            self._dirty = True
+        if DEV_MODE:
+            # スキップ: ローカルでは Sheets に書き込まない
+            return
+        # Sheets への追記は書き込みキューに任せ、_lock は保持しない
+        strict = STRICT_SHEETS_WRITE and self.store is None
+        pending = _SHEETS_WRITER.enqueue(ANIMALS_TAB, _animal_row(animal), urgent=strict)
+        if outbox_id is not None:
+            pending.add_done_callback(lambda f: self._outbox_done(outbox_id, f))
+        if not strict:
+            return
+        try:
+            pending.result(timeout=SHEETS_STRICT_TIMEOUT)
+        except Exception as e:
+            print(f"Failed to write animal to Sheets: {e}")
+            with _lock:
+                if self.animals.get(animal.id) is animal:
+                    del self.animals[animal.id]
+                    self._idx.remove_animal(animal)
+                    self._idx.animal_order.pop(animal.id, None)
+            raise HTTPException(status_code=500, detail="Failed to save animal data to database (Sheets write error).")
 
     def search_animals(self, query: str):
-        q = (query or "").lower()
-        results = [
-            a for a in self.animals.values()
-            if q in a.name.lower() or (getattr(a, "farm_id", None) and q in a.farm_id.lower())
-        ]
-        for animal in results:
-            animal.records = self.get_records_for_animal(animal.id)
+        """名前・農場ID・マイクロチップ・SOAP本文を全文検索し、関連度順で返す。"""
+        if not (query or "").strip():
+            results = list(self.animals.values())
+        else:
+            results = []
+            for animal_id, _score in self._idx.text.search(query):
+                animal = self.animals.get(animal_id)
+                if animal is not None:
+                    results.append(animal)
         return results
 
+    def summarize_animal(self, animal: Animal) -> AnimalSummary:
+        """一覧表示用の射影。SOAP本文などの診療記録本体は含めない。"""
+        records = self.get_records_for_animal(animal.id)
+        visits = [r.visit_date for r in records if getattr(r, "visit_date", None)]
+        return AnimalSummary(
+            id=animal.id,
+            name=animal.name,
+            microchip_number=animal.microchip_number,
+            farm_id=getattr(animal, "farm_id", None),
+            breed=getattr(animal, "breed", None),
+            thumbnailUrl=getattr(animal, "thumbnailUrl", None),
+            record_count=len(records),
+            last_visit=max(visits) if visits else None,
+        )
+
+    def filter_animals(
+        self,
+        microchip_number: Optional[str] = None,
+        farm_id: Optional[str] = None,
+        breed: Optional[str] = None,
+        sex: Optional[str] = None,
+        within: Optional[Iterable[Animal]] = None,
+    ) -> List[Animal]:
+        """インデックスで絞り込んだ動物一覧を返す。
+
+        farm_id は部分一致、breed / sex は完全一致。値が未設定の動物は一致扱い。
+        within を渡した場合はその並び順のまま絞り込む（検索結果との AND 用）。
+        """
+        ids = self._idx.animal_ids(microchip_number=microchip_number, farm_id=farm_id, breed=breed, sex=sex)
+        if within is not None:
+            if ids is None:
+                return list(within)
+            return [a for a in within if a.id in ids]
+        if ids is None:
+            return list(self.animals.values())
+        order = self._idx.animal_order
+        result = []
+        for animal_id in sorted(ids, key=lambda i: order.get(i, 0)):
+            animal = self.animals.get(animal_id)
+            if animal is not None:
+                result.append(animal)
+        return result
+
     def get_animal(self, animal_id: str) -> Optional[Animal]:
         return self.animals.get(animal_id)
 
+    # Appointments
+    def list_appointments(
+        self,
+        date: Optional[str] = None,
+        date_from: Optional[str] = None,
+        date_to: Optional[str] = None,
+        doctor: Optional[str] = None,
+    ) -> List[dict]:
+        """予定一覧を日付順で返す。
+
+        date 指定時はその日のみ、date_from / date_to 指定時はその範囲（両端含む）。
+        いずれも 'YYYY-MM-DD' 文字列で比較する。
+        """
+        idx = self._idx
+        if date:
+            days = [date] if date in idx.appointments else []
+        else:
+            lo = bisect.bisect_left(idx.appointment_days, date_from) if date_from else 0
+            hi = bisect.bisect_right(idx.appointment_days, date_to) if date_to else len(idx.appointment_days)
+            days = idx.appointment_days[lo:hi]
+        items: List[dict] = []
+        for day in days:
+            for item in list(idx.appointments.get(day, {}).values()):
+                if doctor and item.get("doctor") != doctor:
+                    continue
+                items.append(dict(item))
+        return items
+
     # Records
     def add_record(self, record: Record):
         animal = self.get_animal(record.animalId)
         if not animal:
             raise HTTPException(status_code=404, detail=f"Animal with ID {record.animalId} not found.")
+        outbox_id = self._outbox_id()
+        if self.store is not None:
+            try:
+                self.store.save_record(record, outbox_id=outbox_id)
+            except Exception as e:
+                print(f"Failed to write record to local store: {e}")
+                raise HTTPException(status_code=500, detail="Failed to save record data to database.")
         with _lock:
+            # 待っている間に再読み込みで動物が置き換えられていれば、新しい方に追加する
+            animal = self.animals.get(record.animalId, animal)
             if not hasattr(animal, "records"):
                 animal.records = []
             animal.records.append(record)
-            if DEV_MODE:
-                return
-            try:
-                service = _get_sheets_service()
-                spreadsheet_id = os.getenv("SPREADSHEET_ID")
-                row = [
-                    record.animalId,
-                    record.id,
-                    record.visit_date,
-                    record.soap.s,
-                    record.soap.o,
-                    record.soap.a,
-                    record.soap.p,
-                    ",".join(record.medication_history or []),
-                    record.next_visit_date,
-                    getattr(record, 'next_visit_time', None),
-                    ",".join(record.images or []),
-                    record.audioUrl,
-                    getattr(record, 'doctor', None),
-                ]
-                service.spreadsheets().values().append(
-                    spreadsheetId=spreadsheet_id,
-                    range=f"{RECORDS_TAB}!A1",
-                    valueInputOption="USER_ENTERED",
-                    insertDataOption="INSERT_ROWS",
-                    body={"values": [row]},
-                ).execute()
-            except Exception as e:
-                # Sheets 譖ｸ縺崎ｾｼ縺ｿ縺ｫ螟ｱ謨励＠縺ｦ繧ゅ∵里螳壹〒縺ｯ繝｡繝｢繝ｪ菫晏ｭ倥ｒ邯ｭ謖・                print(f"Failed to write record to Sheets: {e}")
-                if STRICT_SHEETS_WRITE:
-                    try:
-                        animal.records.pop()
-                    except Exception:
-                        pass
-                    raise HTTPException(status_code=500, detail="Failed to save record data to database (Sheets write error).")
+            self._idx.add_record(animal, record, len(animal.records) - 1)
+            self._dirty = True
+        if DEV_MODE:
+            return
+        strict = STRICT_SHEETS_WRITE and self.store is None
+        pending = _SHEETS_WRITER.enqueue(RECORDS_TAB, _record_row(record), urgent=strict)
+        pending.add_done_callback(lambda f: self._remember_sheet_row(record.id, f))
+        if outbox_id is not None:
+            pending.add_done_callback(lambda f: self._outbox_done(outbox_id, f))
+        if not strict:
+            return
+        try:
+            pending.result(timeout=SHEETS_STRICT_TIMEOUT)
+        except Exception as e:
+            print(f"Failed to write record to Sheets: {e}")
+            with _lock:
+                # 待っている間に他の記録が追加されている可能性があるので、位置ではなく実体で取り除く
+                animal = self.animals.get(record.animalId, animal)
+                for i, rec in enumerate(animal.records):
+                    if rec is record:
+                        animal.records.pop(i)
+                        self._idx.remove_record(record)
+                        self._idx.reposition(animal.id, animal.records, i)
+                        break
+            raise HTTPException(status_code=500, detail="Failed to save record data to database (Sheets write error).")
+
+    def flush_pending_writes(self, timeout: Optional[float] = None) -> bool:
+        """書き込みキューに残っている Sheets 追記を書き出す（シャットダウン時など）。"""
+        if DEV_MODE:
+            return True
+        deadline = None if timeout is None else time.monotonic() + timeout
+        flushed = _SHEETS_WRITER.flush(timeout)
+        remaining = None if deadline is None else max(0.0, deadline - time.monotonic())
+        return _SHEETS_REPLICATOR.flush(remaining) and flushed
 
     def find_record(self, record_id: str) -> Tuple[Optional[str], Optional[Record], int]:
-        for animal_id, animal in self.animals.items():
-            if hasattr(animal, "records") and animal.records:
-                for idx, rec in enumerate(animal.records):
-                    if getattr(rec, "id", None) == record_id:
-                        return animal_id, rec, idx
+        loc = self._idx.records.get(record_id)
+        if loc is None:
+            return None, None, -1
+        animal_id, idx = loc
+        animal = self.animals.get(animal_id)
+        records = getattr(animal, "records", None) or []
+        if 0 <= idx < len(records) and getattr(records[idx], "id", None) == record_id:
+            return animal_id, records[idx], idx
+        # 位置がずれていた場合はその動物の記録だけ走査して修復する
+        for i, rec in enumerate(records):
+            if getattr(rec, "id", None) == record_id:
+                self._idx.reposition(animal_id, records)
+                return animal_id, rec, i
         return None, None, -1
 
+    def _remember_sheet_row(self, record_id: str, pending) -> None:
+        if pending.cancelled() or pending.exception() is not None:
+            return
+        row = pending.result()
+        if row:
+            self._idx.sheet_rows[record_id] = row
+
+    def _rebuild_sheet_rows(self, service, spreadsheet_id) -> Dict[str, int]:
+        """records タブの B 列（record id）を読み直して行番号マップを作り直す。"""
+        column = service.spreadsheets().values().get(
+            spreadsheetId=spreadsheet_id, range=f"{RECORDS_TAB}!B:B"
+        ).execute().get("values", [])
+        rows = {row[0]: i + 1 for i, row in enumerate(column) if row and row[0]}
+        self._idx.sheet_rows = rows
+        return rows
+
+    def _find_sheet_row(self, service, spreadsheet_id, record_id: str) -> int:
+        """record の行番号を返す。マップの値は該当セル1つだけ読んで検証し、
+        ずれていれば（手作業で行が挿入・並べ替えされた等）列を読み直す。"""
+        row = self._idx.sheet_rows.get(record_id)
+        if row is None and _SHEETS_WRITER.pending_count():
+            # まだ書き込みキューにある記録なら、書き出して行番号を確定させる
+            _SHEETS_WRITER.flush(SHEETS_STRICT_TIMEOUT)
+            row = self._idx.sheet_rows.get(record_id)
+        if row is not None:
+            cell = service.spreadsheets().values().get(
+                spreadsheetId=spreadsheet_id, range=f"{RECORDS_TAB}!B{row}"
+            ).execute().get("values", [])
+            if cell and cell[0] and cell[0][0] == record_id:
+                return row
+            print(f"[sheets] row map mismatch for record {record_id} at row {row}; rebuilding")
+        return self._rebuild_sheet_rows(service, spreadsheet_id).get(record_id, -1)
+
     def update_record_by_id(self, record_id: str, new_record: Record) -> Record:
         animal_id, old, idx = self.find_record(record_id)
         if not old:
             raise HTTPException(status_code=404, detail="Record not found")
+        if self.store is not None:
+            outbox_id = self._outbox_id()
+            try:
+                if not self.store.update_record(record_id, new_record, outbox_id=outbox_id):
+                    raise HTTPException(status_code=404, detail="Record not found")
+            except HTTPException:
+                raise
+            except Exception as e:
+                print(f"Failed to update record in local store: {e}")
+                raise HTTPException(status_code=500, detail="Failed to update record data in database.")
+            self._replace_record(animal_id, old, idx, new_record)
+            self._replicate(outbox_id, self._sheets_update_record, record_id, new_record)
+            return new_record
+        if DEV_MODE:
+            # ローカルでは Sheets に書き込まずメモリだけ更新する
+            self._replace_record(animal_id, old, idx, new_record)
+            return new_record
         try:
-            service = _get_sheets_service()
-            spreadsheet_id = os.getenv("SPREADSHEET_ID")
-            sheet_data = service.spreadsheets().values().get(
-                spreadsheetId=spreadsheet_id, range="records!B:B"
-            ).execute().get("values", [])
-            row_to_update = -1
-            for i, row in enumerate(sheet_data):
-                if row and row[0] == record_id:
-                    row_to_update = i + 1
-                    break
-            if row_to_update == -1:
-                raise HTTPException(status_code=404, detail="Record not found in Google Sheets.")
-            updated = [
-                new_record.animalId, new_record.id, new_record.visit_date,
-                new_record.soap.s, new_record.soap.o, new_record.soap.a, new_record.soap.p,
-                ",".join(new_record.medication_history or []),
-                new_record.next_visit_date,
-                getattr(new_record, 'next_visit_time', None),
-                ",".join(new_record.images or []),
-                new_record.audioUrl,
-                getattr(new_record, 'doctor', None),
-            ]
-            service.spreadsheets().values().update(
-                spreadsheetId=spreadsheet_id,
-                range=f"records!A{row_to_update}",
-                valueInputOption="USER_ENTERED",
-                body={"values": [updated]},
-            ).execute()
-            # in-memory update
-            self.animals[animal_id].records[idx] = new_record
+            self._sheets_update_record(record_id, new_record)
+            self._replace_record(animal_id, old, idx, new_record)
             return new_record
+        except HTTPException:
+            raise
         except Exception as e:
             print(f"Failed to update record in Sheets: {e}")
             raise HTTPException(status_code=500, detail="Failed to update record data in database.")
 
+    def _sheets_update_record(self, record_id: str, new_record: Record) -> int:
+        service = _get_sheets_service()
+        spreadsheet_id = os.getenv("SPREADSHEET_ID")
+        row_to_update = self._find_sheet_row(service, spreadsheet_id, record_id)
+        if row_to_update == -1:
+            raise HTTPException(status_code=404, detail="Record not found in Google Sheets.")
+        service.spreadsheets().values().update(
+            spreadsheetId=spreadsheet_id,
+            range=f"{RECORDS_TAB}!A{row_to_update}",
+            valueInputOption="USER_ENTERED",
+            body={"values": [_record_row(new_record)]},
+        ).execute()
+        if new_record.id != record_id:
+            self._idx.sheet_rows.pop(record_id, None)
+            self._idx.sheet_rows[new_record.id] = row_to_update
+        return row_to_update
+
+    def _replicate(self, outbox_id: Optional[str], func, *args) -> None:
+        """主ストアに書いた変更を Sheets に複製する（専用スレッドで投入順に実行し、失敗時は再試行）。"""
+        if DEV_MODE:
+            return
+        _SHEETS_REPLICATOR.submit(self._outboxed(outbox_id, func), *args)
+
+    def _outboxed(self, outbox_id: Optional[str], func):
+        """func を実行し、複製できたら outbox から消す関数を返す（失敗は SheetsReplicator が再試行する）。"""
+        def replicate(*args) -> None:
+            try:
+                func(*args)
+            except HTTPException as e:
+                if e.status_code != 404:
+                    raise
+                # Sheets に該当行が無い（手作業で消された等）。再実行しても同じなので outbox からも消す
+                print(f"[sheets] replication of {func.__name__}{args[:1]} skipped: {e.detail}")
+            if outbox_id is not None:
+                self._clear_outbox(outbox_id)
+        replicate.__name__ = func.__name__
+        return replicate
+
+    def _outbox_id(self) -> Optional[str]:
+        """主ストアへの書き込みと一緒に outbox に残す id（Sheets に複製しない場合は None）。"""
+        return None if self.store is None or DEV_MODE else uuid.uuid4().hex
+
+    def _outbox_done(self, outbox_id: str, pending) -> None:
+        if pending.cancelled() or pending.exception() is not None:
+            # outbox に残し、次回起動時に再実行する
+            return
+        self._clear_outbox(outbox_id)
+
+    def _clear_outbox(self, outbox_id: str) -> None:
+        try:
+            self.store.outbox_done(outbox_id)
+        except Exception as e:
+            print(f"[sheets] failed to clear outbox entry {outbox_id}: {e}")
+
+    def _sheets_append(self, tab: str, row: list, record_id: Optional[str] = None) -> None:
+        pending = _SHEETS_WRITER.enqueue(tab, row, urgent=True)
+        if record_id is not None:
+            pending.add_done_callback(lambda f: self._remember_sheet_row(record_id, f))
+        pending.result(timeout=SHEETS_STRICT_TIMEOUT)
+
+    def replay_outbox(self) -> int:
+        """前回の起動で Sheets に複製し終わらなかった書き込みを、書き込んだ順に複製し直す。
+
+        追記の完了から outbox の削除までの間に落ちた場合は、同じ行がもう一度追記されうる（少なくとも1回）。
+        """
+        if self.store is None or DEV_MODE:
+            return 0
+        entries = self.store.pending_outbox()
+        for outbox_id, op, key, data in entries:
+            if op == "save_animal":
+                func, args = self._sheets_append, (ANIMALS_TAB, _animal_row(Animal.model_validate_json(data)))
+            elif op == "save_record":
+                func, args = self._sheets_append, (RECORDS_TAB, _record_row(Record.model_validate_json(data)), key)
+            elif op == "update_record":
+                func, args = self._sheets_update_record, (key, Record.model_validate_json(data))
+            elif op == "delete_record":
+                func, args = self._sheets_clear_record, (key,)
+            else:
+                print(f"[sheets] unknown outbox entry {op} for {key}; dropped")
+                self._clear_outbox(outbox_id)
+                continue
+            _SHEETS_REPLICATOR.submit(self._outboxed(outbox_id, func), *args)
+        if entries:
+            print(f"[sheets] replaying {len(entries)} write(s) not yet replicated to Sheets")
+        return len(entries)
+
+    def _replace_record(self, animal_id: str, old: Record, idx: int, new_record: Record) -> None:
+        # in-memory update
+        with _lock:
+            records = self.animals[animal_id].records
+            if not (0 <= idx < len(records) and records[idx] is old):
+                # Sheets 更新中に同じ動物の記録が追加・削除された場合は位置を探し直す
+                idx = next((i for i, rec in enumerate(records) if rec is old), -1)
+                if idx < 0:
+                    return
+            records[idx] = new_record
+            self._idx.remove_record(old)
+            self._idx.add_record(self.animals[animal_id], new_record, idx)
+            self._dirty = True
+
     def delete_record_by_id(self, record_id: str) -> bool:
         animal_id, old, idx = self.find_record(record_id)
         if not old:
             raise HTTPException(status_code=404, detail="Record not found")
+        if self.store is not None:
+            outbox_id = self._outbox_id()
+            try:
+                self.store.delete_record(record_id, outbox_id=outbox_id)
+            except Exception as e:
+                print(f"Failed to delete record in local store: {e}")
+                raise HTTPException(status_code=500, detail="Failed to delete record data in database.")
+            self._remove_record(animal_id, old, idx)
+            self._replicate(outbox_id, self._sheets_clear_record, record_id)
+            return True
+        if DEV_MODE:
+            # ローカルでは Sheets に書き込まずメモリだけ更新する
+            self._remove_record(animal_id, old, idx)
+            return True
         try:
-            service = _get_sheets_service()
-            spreadsheet_id = os.getenv("SPREADSHEET_ID")
-            sheet_data = service.spreadsheets().values().get(
-                spreadsheetId=spreadsheet_id, range="records!B:B"
-            ).execute().get("values", [])
-            row_to_clear = -1
-            for i, row in enumerate(sheet_data):
-                if row and row[0] == record_id:
-                    row_to_clear = i + 1
-                    break
-            if row_to_clear == -1:
-                raise HTTPException(status_code=404, detail="Record not found in Google Sheets.")
-            service.spreadsheets().values().clear(
-                spreadsheetId=spreadsheet_id,
-                range=f"{RECORDS_TAB}!A{row_to_clear}:M{row_to_clear}"
-            ).execute()
-            # in-memory removal
-            self.animals[animal_id].records.pop(idx)
+            self._sheets_clear_record(record_id)
+            self._remove_record(animal_id, old, idx)
             return True
+        except HTTPException:
+            raise
         except Exception as e:
             print(f"Failed to delete record in Sheets: {e}")
             raise HTTPException(status_code=500, detail="Failed to delete record data in database.")
@@ -236,12 +739,348 @@ class InMemoryDB:
             return animal.records
         return []
 
+    def _sheets_clear_record(self, record_id: str) -> None:
+        service = _get_sheets_service()
+        spreadsheet_id = os.getenv("SPREADSHEET_ID")
+        row_to_clear = self._find_sheet_row(service, spreadsheet_id, record_id)
+        if row_to_clear == -1:
+            raise HTTPException(status_code=404, detail="Record not found in Google Sheets.")
+        # clear は行を詰めないので、他の記録の行番号は変わらない
+        service.spreadsheets().values().clear(
+            spreadsheetId=spreadsheet_id,
+            range=f"{RECORDS_TAB}!A{row_to_clear}:M{row_to_clear}"
+        ).execute()
+        self._idx.sheet_rows.pop(record_id, None)
+
+    def _remove_record(self, animal_id: str, old: Record, idx: int) -> None:
+        # in-memory removal
+        with _lock:
+            records = self.animals[animal_id].records
+            if not (0 <= idx < len(records) and records[idx] is old):
+                idx = next((i for i, rec in enumerate(records) if rec is old), -1)
+                if idx < 0:
+                    return
+            records.pop(idx)
+            self._idx.remove_record(old)
+            self._idx.reposition(animal_id, records, idx)
+            self._dirty = True
+
+    def load(self) -> None:
+        """起動時の読み込み。主ストアがあればそこから読み、空なら Sheets から一度だけ取り込む。
+
+        Sheets のみの場合は、使えるスナップショットがあればそれだけを読んで即座に戻る
+        （needs_catch_up が立つので、起動後に catch_up_from_sheets で追記分を取り込むこと）。
+        """
+        if self.store is None:
+            if DEV_MODE or not self._load_snapshot():
+                self.load_from_sheets()
+                self.save_snapshot()
+            return
+        animals = self.store.load_animals()
+        if not animals and not DEV_MODE and os.getenv("SPREADSHEET_ID"):
+            print("[db] local store is empty; importing from Google Sheets")
+            self.load_from_sheets()
+            self.store.import_animals(self.animals.values())
+            return
+        self._install(animals)
+        print(f"[db] loaded {len(animals)} animals from {self.store.path}")
+        self.replay_outbox()
+
+    def reload(self) -> dict:
+        """主ストア（なければ Sheets）から読み直す。処理中の書き込みは失わない。
+
+        Sheets のみの場合は refresh_from_sheets で変更分だけを反映する。
+        """
+        if self.store is None:
+            if DEV_MODE:
+                return {"animals": 0, "records": 0, "removed": 0}
+            return self.refresh_from_sheets()
+        # 読み込み中の書き込みが捨てる側の dict に入らないよう、入れ替えまで書き込みを止める
+        with _lock:
+            animals = self.store.load_animals()
+            self._install(animals)
+        return {"animals": len(animals), "records": sum(len(a.records) for a in animals.values()), "removed": 0}
+
+    def _install(self, animals: Dict[str, Animal], sheet_rows: Optional[Dict[str, int]] = None) -> None:
+        temp_idx = _DBIndexes()
+        for animal in animals.values():
+            temp_idx.add_animal(animal)
+        temp_idx.sheet_rows = sheet_rows or {}
+        self.animals, self._idx = animals, temp_idx
+
+    def _fetch_sheet_rows(self) -> Tuple[Dict[str, Tuple[str, list]], Dict[str, Tuple[int, str, list]]]:
+        """両タブを読み、animals: id -> (ハッシュ, 行)、records: id -> (行番号, ハッシュ, 行) を返す。
+
+        同じ id の行が複数あれば後の行を採る（load_from_sheets と同じ）。
+        """
+        service = _get_sheets_service()
+        spreadsheet_id = os.getenv("SPREADSHEET_ID")
+        animals_data = service.spreadsheets().values().get(
+            spreadsheetId=spreadsheet_id, range=f"{ANIMALS_TAB}!A2:G"
+        ).execute().get("values", [])
+        records_data = service.spreadsheets().values().get(
+            spreadsheetId=spreadsheet_id, range=f"{RECORDS_TAB}!A2:M"
+        ).execute().get("values", [])
+        animals = {row[0]: (_row_hash(row), row) for row in animals_data if row and row[0]}
+        records = {
+            row[1]: (row_number, _row_hash(row), row)
+            for row_number, row in enumerate(records_data, start=2)
+            if len(row) > 1 and row[0] and row[1]
+        }
+        return animals, records
+
+    def refresh_from_sheets(self) -> dict:
+        """Sheets を読み直し、前回から変わった行だけをメモリに反映する（稼働中の再読み込み用）。
+
+        - 変更の検出は行ハッシュの比較。メモリ上の内容と同じ行（自分で書いた行など）は何もしない
+        - 変更する動物・記録リストは複製してから組み立て、参照の差し替えで反映する（読み取り側は待たない）
+        - 反映は _lock の下で行うので、並行する書き込みとは直列化され失われない
+        - まだ Sheets に書き出されていない記録は前回の内容にも無いので、削除扱いにならない
+        戻り値は反映した件数。
+        """
+        started = time.time()
+        fetched_animals, fetched_records = self._fetch_sheet_rows()
+        previous = self._sheet_hashes
+        changed_animals = {
+            animal_id: (h, _animal_from_row(row))
+            for animal_id, (h, row) in fetched_animals.items()
+            if previous["animals"].get(animal_id) != h
+        }
+        changed_records = {}
+        for record_id, (row_number, h, row) in fetched_records.items():
+            if previous["records"].get(record_id) == h:
+                continue
+            try:
+                changed_records[record_id] = (h, _record_from_row(row))
+            except Exception:
+                continue
+        removed_animals = [a for a in previous["animals"] if a not in fetched_animals]
+        removed_records = [r for r in previous["records"] if r not in fetched_records]
+
+        counts = {"animals": 0, "records": 0, "removed": 0}
+        with _lock:
+            for animal_id in removed_animals:
+                animal = self.animals.pop(animal_id, None)
+                if animal is not None:
+                    self._idx.remove_animal(animal)
+                    self._idx.animal_order.pop(animal_id, None)
+                    counts["removed"] += 1
+            for animal_id, (h, parsed) in changed_animals.items():
+                if parsed is None:
+                    continue
+                current = self.animals.get(animal_id)
+                if current is not None:
+                    if _row_hash(_animal_row(current)) == h:
+                        continue
+                    self._idx.remove_animal(current)
+                    parsed = current.model_copy(update={f: getattr(parsed, f) for f in _SHEET_ANIMAL_FIELDS})
+                self.animals[animal_id] = parsed
+                self._idx.add_animal(parsed)
+                counts["animals"] += 1
+
+            # animal_id -> 組み立て中の記録リスト（複製）
+            lists: Dict[str, List[Record]] = {}
+            added: List[Record] = []
+
+            def records_of(animal_id: str) -> List[Record]:
+                if animal_id not in lists:
+                    lists[animal_id] = list(getattr(self.animals[animal_id], "records", None) or [])
+                return lists[animal_id]
+
+            def discard(animal_id: str, record: Record) -> None:
+                records = records_of(animal_id)
+                for i, rec in enumerate(records):
+                    if rec is record:
+                        records.pop(i)
+                        break
+                self._idx.remove_record(record)
+
+            for record_id in removed_records:
+                animal_id, record, _ = self.find_record(record_id)
+                if record is not None:
+                    discard(animal_id, record)
+                    counts["removed"] += 1
+                self._idx.sheet_rows.pop(record_id, None)
+            for record_id, (h, parsed) in changed_records.items():
+                if parsed is None or parsed.animalId not in self.animals:
+                    continue
+                animal_id, current, _ = self.find_record(record_id)
+                if current is not None:
+                    if _row_hash(_record_row(current)) == h:
+                        continue
+                    # 投薬の構造化情報など Sheets に無い項目は残す
+                    parsed = current.model_copy(update={f: getattr(parsed, f) for f in _SHEET_RECORD_FIELDS})
+                    if animal_id == parsed.animalId:
+                        records = records_of(animal_id)
+                        pos = next((i for i, rec in enumerate(records) if rec is current), None)
+                        self._idx.remove_record(current)
+                        if pos is not None:
+                            records[pos] = parsed
+                            added.append(parsed)
+                            counts["records"] += 1
+                            continue
+                    else:
+                        discard(animal_id, current)
+                records_of(parsed.animalId).append(parsed)
+                added.append(parsed)
+                counts["records"] += 1
+
+            for animal_id, records in lists.items():
+                animal = self.animals[animal_id]
+                animal.records = records
+                self._idx.reposition(animal_id, records)
+            for record in added:
+                animal = self.animals[record.animalId]
+                self._idx.add_record(animal, record, self._idx.records.get(record.id, (None, 0))[1])
+            for record_id, (row_number, _, _) in fetched_records.items():
+                self._idx.sheet_rows[record_id] = row_number
+            self._sheet_hashes = {
+                "animals": {a: h for a, (h, _) in fetched_animals.items()},
+                "records": {r: h for r, (_, h, _) in fetched_records.items()},
+            }
+            self._sheets_loaded_at = started
+            if any(counts.values()):
+                self._dirty = True
+        print(
+            f"[sheets] refresh: {counts['animals']} animal(s), {counts['records']} record(s) updated, "
+            f"{counts['removed']} removed"
+        )
+        return counts
+
+    def _snapshot_stamp(self) -> dict:
+        return snapshot_stamp(os.getenv("SPREADSHEET_ID"), ANIMALS_TAB, RECORDS_TAB)
+
+    def _load_snapshot(self) -> bool:
+        state = load_snapshot(self._snapshot_stamp())
+        if state is None:
+            return False
+        self._install(state["animals"], state["sheet_rows"])
+        self._sheet_marks = dict(state["marks"])
+        self._sheet_hashes = {"animals": {}, "records": {}, **state["sheet_hashes"]}
+        self._sheets_loaded_at = state["loaded_at"]
+        self._dirty = False
+        self.needs_catch_up = True
+        print(
+            f"[snapshot] loaded {len(self.animals)} animals "
+            f"(animals row {self._sheet_marks['animals']}, records row {self._sheet_marks['records']})"
+        )
+        return True
+
+    def save_snapshot(self) -> bool:
+        """現在の状態をスナップショットに保存する（Sheets のみで動いている場合だけ）。"""
+        if self.store is not None or DEV_MODE:
+            return False
+        with _lock:
+            # 記録リストだけ複製しておけば、保存中に他のスレッドが追加・削除しても影響しない
+            animals = {
+                animal_id: animal.model_copy(update={"records": list(getattr(animal, "records", None) or [])})
+                for animal_id, animal in self.animals.items()
+            }
+            sheet_rows = dict(self._idx.sheet_rows)
+            # この処理で追記した行は読み込み済みに含めない（他の書き手の追記を飛ばさないため。
+            # 次回の差分でもう一度読まれるが id で除かれる）
+            marks = dict(self._sheet_marks)
+            sheet_hashes = {tab: dict(hashes) for tab, hashes in self._sheet_hashes.items()}
+            loaded_at = self._sheets_loaded_at
+            self._dirty = False
+        try:
+            size = save_snapshot(
+                self._snapshot_stamp(),
+                {
+                    "animals": animals,
+                    "sheet_rows": sheet_rows,
+                    "marks": marks,
+                    "sheet_hashes": sheet_hashes,
+                    "loaded_at": loaded_at,
+                },
+            )
+        except Exception as e:
+            self._dirty = True
+            print(f"[snapshot] save failed: {e}")
+            return False
+        print(f"[snapshot] saved {len(animals)} animals ({size} bytes)")
+        return True
+
+    def save_snapshot_if_dirty(self) -> bool:
+        if not self._dirty or self.needs_catch_up:
+            return False
+        return self.save_snapshot()
+
+    def catch_up_from_sheets(self) -> int:
+        """スナップショット以降に Sheets へ追記された行を読み込み、取り込んだ行数を返す。
+
+        追記分を先に取り込んで応答に反映してから、refresh_from_sheets（スナップショットに保存した
+        行ハッシュとの比較）で、保存後に書き換え・削除された既存行も反映する。
+        """
+        if not self.needs_catch_up:
+            return 0
+        service = _get_sheets_service()
+        spreadsheet_id = os.getenv("SPREADSHEET_ID")
+        animals_from = self._sheet_marks["animals"] + 1
+        records_from = self._sheet_marks["records"] + 1
+        animals_data = service.spreadsheets().values().get(
+            spreadsheetId=spreadsheet_id, range=f"{ANIMALS_TAB}!A{animals_from}:G"
+        ).execute().get("values", [])
+        records_data = service.spreadsheets().values().get(
+            spreadsheetId=spreadsheet_id, range=f"{RECORDS_TAB}!A{records_from}:M"
+        ).execute().get("values", [])
+        new_animals = []
+        for row in animals_data:
+            try:
+                animal = _animal_from_row(row)
+            except Exception:
+                continue
+            if animal is not None:
+                new_animals.append(animal)
+        new_records = []
+        for row_number, row in enumerate(records_data, start=records_from):
+            try:
+                record = _record_from_row(row)
+            except Exception:
+                continue
+            if record is not None:
+                new_records.append((row_number, record))
+
+        added = 0
+        with _lock:
+            for animal in new_animals:
+                previous = self.animals.get(animal.id)
+                if previous is not None:
+                    # 同じ id の再登録は後の行を優先する（load_from_sheets と同じ）。記録は引き継ぐ
+                    self._idx.remove_animal(previous)
+                    animal.records = getattr(previous, "records", None) or []
+                self.animals[animal.id] = animal
+                self._idx.add_animal(animal)
+                added += 1
+            for row_number, record in new_records:
+                animal = self.animals.get(record.animalId)
+                # 自分で追記してスナップショットに含まれている記録は id で除く
+                if animal is None or record.id in self._idx.records:
+                    continue
+                animal.records.append(record)
+                self._idx.add_record(animal, record, len(animal.records) - 1)
+                self._idx.sheet_rows[record.id] = row_number
+                added += 1
+            self._sheet_marks["animals"] = max(self._sheet_marks["animals"], animals_from - 1 + len(animals_data))
+            self._sheet_marks["records"] = max(self._sheet_marks["records"], records_from - 1 + len(records_data))
+            self.needs_catch_up = False
+        print(f"[snapshot] caught up {added} new row(s) from Google Sheets")
+        try:
+            self.refresh_from_sheets()
+        except Exception as e:
+            # 全件読み込みの時刻は進まないので、続けば DB_SNAPSHOT_MAX_AGE_SECONDS で読み直しになる
+            print(f"[snapshot] refresh after catch-up failed: {e}")
+        self.save_snapshot()
+        return added
+
     def load_from_sheets(self):
         if DEV_MODE:
             print("LOCAL_DEV=1: Skip loading data from Google Sheets. Start with empty DB.")
             self.animals = {}
+            self._idx = _DBIndexes()
             return
         print("Loading data from Google Sheets...")
+        started = time.time()
         service = _get_sheets_service()
         spreadsheet_id = os.getenv("SPREADSHEET_ID")
         temp_animals: Dict[str, Animal] = {}
@@ -250,76 +1089,38 @@ class InMemoryDB:
             spreadsheetId=spreadsheet_id, range=f"{ANIMALS_TAB}!A2:G"
         ).execute().get("values", [])
         print(f"animals rows: {len(animals_data)}")
-        for i, row in enumerate(animals_data):
+        for row in animals_data:
             try:
-                animal_id = row[0] if len(row) > 0 else None
-                if not animal_id:
-                    continue
-                farm_id = row[1] if len(row) > 1 else None
-                name = row[2] if len(row) > 2 else None
-                if not name:
-                    continue
-                age = None
-                if len(row) > 3:
-                    try:
-                        age = int(row[3]) if str(row[3]).isdigit() else None
-                    except Exception:
-                        age = None
-                sex = row[4] if len(row) > 4 else None
-                breed = row[5] if len(row) > 5 else None
-                thumbnailUrl = row[6] if len(row) > 6 else None
-                animal = Animal(
-                    id=animal_id,
-                    microchip_number=animal_id,
-                    farm_id=farm_id,
-                    name=name,
-                    age=age,
-                    sex=sex,
-                    breed=breed,
-                    thumbnailUrl=thumbnailUrl,
-                    records=[],
-                )
-                temp_animals[animal.id] = animal
+                animal = _animal_from_row(row)
             except Exception:
                 continue
+            if animal is not None:
+                temp_animals[animal.id] = animal
         # records
         records_data = service.spreadsheets().values().get(
             spreadsheetId=spreadsheet_id, range=f"{RECORDS_TAB}!A2:M"
         ).execute().get("values", [])
         print(f"records rows: {len(records_data)}")
-        for row in records_data:
+        sheet_rows: Dict[str, int] = {}
+        for row_number, row in enumerate(records_data, start=2):
             try:
-                if not row or not row[0]:
-                    continue
-                animal_id = row[0]
-                if animal_id not in temp_animals:
-                    continue
-                soap = SoapNotes(
-                    s=row[3] if len(row) > 3 else "",
-                    o=row[4] if len(row) > 4 else "",
-                    a=row[5] if len(row) > 5 else "",
-                    p=row[6] if len(row) > 6 else "",
-                )
-                record = Record(
-                    animalId=animal_id,
-                    id=row[1],
-                    visit_date=row[2],
-                    soap=soap,
-                    medication_history=row[7].split(",") if len(row) > 7 and row[7] else [],
-                    next_visit_date=row[8] if len(row) > 8 else None,
-                    next_visit_time=row[9] if len(row) > 9 else None,
-                    images=row[10].split(",") if len(row) > 10 and row[10] else [],
-                    audioUrl=row[11] if len(row) > 11 else None,
-                )
-                try:
-                    if len(row) > 12 and row[12]:
-                        setattr(record, 'doctor', row[12])
-                except Exception:
-                    pass
-                temp_animals[animal_id].records.append(record)
+                record = _record_from_row(row)
             except Exception:
                 continue
-        self.animals = temp_animals
+            if record is None or record.animalId not in temp_animals:
+                continue
+            temp_animals[record.animalId].records.append(record)
+            sheet_rows[record.id] = row_number
+        with _lock:
+            self._install(temp_animals, sheet_rows)
+        self._sheet_hashes = {
+            "animals": {row[0]: _row_hash(row) for row in animals_data if row and row[0]},
+            "records": {row[1]: _row_hash(row) for row in records_data if len(row) > 1 and row[0] and row[1]},
+        }
+        self._sheet_marks = {"animals": 1 + len(animals_data), "records": 1 + len(records_data)}
+        self._sheets_loaded_at = started
+        self._dirty = False
+        self.needs_catch_up = False
         print(f"Loaded animals: {len(self.animals)}; with records: {sum(len(getattr(a,'records',[]) or []) for a in self.animals.values())}")
 
     def generate_summary(self, animal_id: str) -> str:
@@ -337,4 +1138,4 @@ class InMemoryDB:
 
 
 # Default instance
-DB = InMemoryDB()
+DB = InMemoryDB(store=SQLiteStore(SQLITE_DB_PATH) if DB_BACKEND == "sqlite" else None)
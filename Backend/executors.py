@@ -0,0 +1,95 @@
+import asyncio
+import functools
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import AsyncIterator, Callable, Dict, Iterable, TypeVar
+
+T = TypeVar("T")
+
+# 外部依存ごとのスレッドプール（同時実行数の上限）。
+# async エンドポイントからブロッキング呼び出しを直接行うと uvicorn のイベントループ全体が
+# 止まるため、必ずここ経由で実行する。プールを分けることで、例えば Gemini が遅くても
+# Sheets やファイル保存の枠は食い潰されない。
+POOL_SIZES: Dict[str, int] = {
+    "speech": int(os.getenv("SPEECH_MAX_CONCURRENCY", "4")),
+    # long_running_recognize の完了待ちは数分かかるため、短い書き起こしとは別枠にする
+    "speech_long": int(os.getenv("SPEECH_LONG_MAX_CONCURRENCY", "2")),
+    # WebSocket のライブ書き起こし。1セッションが録音中ずっと1スレッドを占有する
+    "speech_stream": int(os.getenv("SPEECH_STREAM_MAX_CONCURRENCY", "8")),
+    # 発話区間ごとに分割した音声の同期認識（1件の書き起こしから並列に投げる）
+    "speech_segment": int(os.getenv("SPEECH_SEGMENT_MAX_CONCURRENCY", "8")),
+    # 書き起こし前の音声変換（ffmpeg）。CPU を使うので小さめ
+    "audio": int(os.getenv("AUDIO_MAX_CONCURRENCY", "2")),
+    # 画像の派生サイズ生成（Pillow）。CPU を使うので小さめ
+    "image": int(os.getenv("IMAGE_MAX_CONCURRENCY", "2")),
+    "gemini": int(os.getenv("GEMINI_MAX_CONCURRENCY", "8")),
+    # 記録作成後の自動書き起こし・SOAP 生成ジョブ（record_jobs）
+    "record_jobs": int(os.getenv("RECORD_JOB_MAX_CONCURRENCY", "2")),
+    "sheets": int(os.getenv("SHEETS_MAX_CONCURRENCY", "4")),
+    "storage": int(os.getenv("STORAGE_MAX_CONCURRENCY", "8")),
+}
+
+_lock = threading.Lock()
+_executors: Dict[str, ThreadPoolExecutor] = {}
+
+
+def get_executor(name: str) -> ThreadPoolExecutor:
+    executor = _executors.get(name)
+    if executor is not None:
+        return executor
+    with _lock:
+        executor = _executors.get(name)
+        if executor is None:
+            size = max(1, POOL_SIZES.get(name, 4))
+            executor = ThreadPoolExecutor(max_workers=size, thread_name_prefix=f"{name}-pool")
+            _executors[name] = executor
+        return executor
+
+
+async def run_in(pool: str, func: Callable[..., T], *args, **kwargs) -> T:
+    """func(*args, **kwargs) を指定プールのスレッドで実行し、結果を await で受け取る。"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(get_executor(pool), functools.partial(func, *args, **kwargs))
+
+
+async def iterate_in(pool: str, func: Callable[..., Iterable[T]], *args, **kwargs) -> AsyncIterator[T]:
+    """func(*args, **kwargs) が返すイテレータを指定プールのスレッドで回し、要素を順に async で受け取る。
+
+    Gemini のストリーミング応答など、1要素ごとにブロックする同期イテレータ向け。
+    受け取り側が途中でやめた場合は、次の要素でスレッド側のループも打ち切る。
+    """
+    loop = asyncio.get_running_loop()
+    items: asyncio.Queue = asyncio.Queue()
+    stopped = threading.Event()
+    end = object()
+
+    def pump():
+        try:
+            for item in func(*args, **kwargs):
+                if stopped.is_set():
+                    return
+                loop.call_soon_threadsafe(items.put_nowait, (item, None))
+            loop.call_soon_threadsafe(items.put_nowait, (end, None))
+        except BaseException as e:
+            loop.call_soon_threadsafe(items.put_nowait, (end, e))
+
+    loop.run_in_executor(get_executor(pool), pump)
+    try:
+        while True:
+            item, error = await items.get()
+            if item is end:
+                if error is not None:
+                    raise error
+                return
+            yield item
+    finally:
+        stopped.set()
+
+
+def shutdown_executors(wait: bool = True) -> None:
+    with _lock:
+        executors = list(_executors.values())
+        _executors.clear()
+    for executor in executors:
+        executor.shutdown(wait=wait, cancel_futures=not wait)
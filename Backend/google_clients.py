@@ -0,0 +1,128 @@
+# Google API クライアントの共有レジストリ。
+# 資格情報の復号・discovery ドキュメントの解析・TLS 接続の確立は重いので一度だけ行って使い回す。
+# - Sheets / Calendar のサービス（httplib2）はスレッドセーフでないため、スレッドごとに1つ保持
+# - storage.Client はコネクションプールを持ちスレッドセーフなのでプロセスで1つ
+# - google SDK の import 自体が重いので、モジュールの読み込み時ではなく初回利用時に import する
+import base64
+import json
+import os
+import threading
+from typing import TYPE_CHECKING, Dict, Tuple
+
+if TYPE_CHECKING:
+    from google.oauth2.service_account import Credentials
+
+SHEETS_SCOPES = ("https://www.googleapis.com/auth/spreadsheets",)
+CALENDAR_SCOPES = ("https://www.googleapis.com/auth/calendar",)
+
+# Google API 呼び出しの HTTP タイムアウト（秒）
+GOOGLE_HTTP_TIMEOUT = float(os.getenv("GOOGLE_HTTP_TIMEOUT", "60"))
+
+_lock = threading.Lock()
+_credentials: Dict[Tuple[str, ...], "Credentials"] = {}
+_local = threading.local()
+_generation = 0
+_storage_client = None
+
+
+def _load_credentials(scopes: Tuple[str, ...]) -> "Credentials":
+    """Obtain Google credentials.
+    Priority:
+    1) GOOGLE_SERVICE_ACCOUNT_B64 (base64-encoded JSON)
+    2) GOOGLE_APPLICATION_CREDENTIALS or local 'service_account.json' file
+    """
+    from google.oauth2.service_account import Credentials
+
+    b64_str = os.getenv("GOOGLE_SERVICE_ACCOUNT_B64")
+    if b64_str:
+        try:
+            data = base64.b64decode(b64_str)
+            info = json.loads(data.decode("utf-8"))
+        except (ValueError, json.JSONDecodeError) as e:
+            raise RuntimeError(f"Failed to decode GOOGLE_SERVICE_ACCOUNT_B64: {e}")
+        return Credentials.from_service_account_info(info, scopes=list(scopes))
+
+    cred_path = os.getenv("GOOGLE_APPLICATION_CREDENTIALS") or "service_account.json"
+    if os.path.exists(cred_path):
+        return Credentials.from_service_account_file(cred_path, scopes=list(scopes))
+
+    raise RuntimeError("No Google service account credentials found. Set GOOGLE_SERVICE_ACCOUNT_B64 or provide service_account.json")
+
+
+def get_credentials(scopes: Tuple[str, ...]) -> "Credentials":
+    """スコープごとにキャッシュした資格情報を返す。"""
+    key = tuple(sorted(scopes))
+    creds = _credentials.get(key)
+    if creds is not None:
+        return creds
+    with _lock:
+        creds = _credentials.get(key)
+        if creds is None:
+            creds = _load_credentials(key)
+            _credentials[key] = creds
+        return creds
+
+
+def _thread_services() -> Dict[Tuple[str, str], object]:
+    services = getattr(_local, "services", None)
+    if services is None or getattr(_local, "generation", None) != _generation:
+        services = {}
+        _local.services = services
+        _local.generation = _generation
+    return services
+
+
+def _get_service(name: str, version: str, scopes: Tuple[str, ...]):
+    services = _thread_services()
+    service = services.get((name, version))
+    if service is None:
+        import google_auth_httplib2
+        import httplib2
+        from googleapiclient.discovery import build
+
+        http = google_auth_httplib2.AuthorizedHttp(
+            get_credentials(scopes),
+            http=httplib2.Http(timeout=GOOGLE_HTTP_TIMEOUT),
+        )
+        # 同梱の discovery ドキュメントを使い、ネットワーク取得とファイルキャッシュを避ける
+        service = build(name, version, http=http, cache_discovery=False, static_discovery=True)
+        services[(name, version)] = service
+    return service
+
+
+def get_sheets_service():
+    """呼び出し元スレッド専用の Sheets v4 サービス（使い回し）。"""
+    return _get_service("sheets", "v4", SHEETS_SCOPES)
+
+
+def get_calendar_service():
+    """呼び出し元スレッド専用の Calendar v3 サービス（使い回し）。"""
+    return _get_service("calendar", "v3", CALENDAR_SCOPES)
+
+
+def get_storage_client():
+    """共有の Cloud Storage クライアント。google-cloud-storage が無ければ None。"""
+    global _storage_client
+    if _storage_client is not None:
+        return _storage_client
+    try:
+        from google.cloud import storage  # type: ignore
+    except Exception:
+        return None
+    with _lock:
+        if _storage_client is None:
+            # 認証は GOOGLE_APPLICATION_CREDENTIALS 等に依存
+            _storage_client = storage.Client()
+        return _storage_client
+
+
+def reset_clients() -> None:
+    """キャッシュを破棄する（資格情報のローテーション時など）。
+
+    各スレッドのサービスは次回呼び出し時に作り直される。
+    """
+    global _generation, _storage_client
+    with _lock:
+        _credentials.clear()
+        _storage_client = None
+        _generation += 1
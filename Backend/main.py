@@ -1,20 +1,37 @@
 ﻿from dotenv import load_dotenv
+import asyncio
 import os
 import base64
+import queue
 import uuid
 from typing import List, Optional
 
-from fastapi import FastAPI, File, UploadFile, Form, HTTPException
+from fastapi import FastAPI, File, UploadFile, Form, HTTPException, Query, WebSocket
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
-from fastapi.staticfiles import StaticFiles
+from fastapi.responses import JSONResponse, Response, StreamingResponse
 
-from database import DB
-from schemas import Animal, Record, UploadResponse, SoapNotes, AnimalDetailData
-from storage import save_file
+from database import DB, SHEETS_REFRESH_INTERVAL
+from schemas import Animal, AnimalSummary, Record, UploadResponse, SoapNotes, AnimalDetailData
+from storage import (
+    MAX_AUDIO_UPLOAD_BYTES,
+    MAX_IMAGE_UPLOAD_BYTES,
+    UploadTooLarge,
+    read_upload,
+    save_image_upload,
+    save_upload,
+    variant_url,
+)
+from request_limits import RequestSizeLimitMiddleware
+from media import MediaFiles
 from audio_service import GoogleAudioService
 from ai_service import GoogleAIService
+from ai_cache import get_ai_cache
 from config import init_env, get_gemini_api_key
+from executors import get_executor, iterate_in, run_in, shutdown_executors
+from google_clients import get_sheets_service
+from transcription_jobs import TRANSCRIPTION_JOBS
+from record_jobs import RECORD_JOBS
+from snapshot import DB_SNAPSHOT_INTERVAL
 import json as _json
 
 # .env を読み込み + 基本環境を初期化
@@ -25,16 +42,23 @@ init_env()
 _LOCAL_DEV = os.getenv("LOCAL_DEV", "0") == "1"
 _SPREADSHEET_ID = os.getenv("SPREADSHEET_ID")
 
-# Google サービスは起動時に初期化
+# Google サービスは起動時に初期化（SDK の読み込みとクライアント作成は初回利用時、または起動後のウォームアップで行う）
 google_audio_service: Optional[GoogleAudioService] = None
 google_ai_service: Optional[GoogleAIService] = None
+# 起動後、バックグラウンドで SDK を読み込んでおく（0 で無効。初回リクエスト時に読み込む）
+STARTUP_WARMUP = os.getenv("STARTUP_WARMUP", "1") == "1"
+# 接続の受け付けを先に始めるため、ウォームアップ開始を遅らせる秒数
+STARTUP_WARMUP_DELAY = float(os.getenv("STARTUP_WARMUP_DELAY", "1"))
+# 診療記録に添付された画像を同時に保存する数
+RECORD_IMAGE_CONCURRENCY = int(os.getenv("RECORD_IMAGE_CONCURRENCY", "4"))
 
-# DB 初期ロード（LOCAL_DEV もしくは Sheets 未設定ならスキップ）
-if not _LOCAL_DEV and _SPREADSHEET_ID:
+# DB 初期ロード（SQLite が主ストアならそこから。Sheets のみの場合、LOCAL_DEV もしくは未設定ならスキップ）
+# Sheets のみの場合はスナップショットがあればそれを読み、追記分は起動後にバックグラウンドで取り込む
+if DB.store is not None or (not _LOCAL_DEV and _SPREADSHEET_ID):
     try:
-        DB.load_from_sheets()
+        DB.load()
     except Exception:
-        print("Google Sheets からの初期データ読み込みに失敗しました")
+        print("初期データの読み込みに失敗しました")
         import traceback
         traceback.print_exc()
 else:
@@ -42,6 +66,9 @@ else:
 
 app = FastAPI(title="AI Vet Chart Backend")
 
+# アップロードは受信中に大きさを制限する（ファイル単位の上限は storage 側で書き出し中に確認）
+app.add_middleware(RequestSizeLimitMiddleware)
+
 # CORS 設定（環境変数で上書き可）
 default_origins = [
     "http://localhost:3000",
@@ -58,10 +85,12 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Total-Count", "X-Next-Cursor"],
 )
 
 # 静的ファイル（画像など）
-app.mount("/uploads", StaticFiles(directory="uploads"), name="uploads")
+# ETag / 304・immutable キャッシュ・Range（音声のシーク）に対応。GCS のみにあるファイルは署名付き URL へリダイレクト
+app.mount("/uploads", MediaFiles(directory="uploads"), name="uploads")
 
 @app.get("/health")
 async def health():
@@ -108,58 +137,230 @@ if DEBUG_ENDPOINTS:
 if DEBUG_ENDPOINTS:
     @app.get("/api/debug/reload-sheets")
     async def reload_sheets_get():
-        """Google Sheets からデータを再読込（GET）。"""
+        """主ストア（SQLite 利用時）または Google Sheets からデータを再読込（GET）。Sheets は変更分のみ反映。"""
         try:
-            DB.load_from_sheets()
+            changes = await run_in("sheets", DB.reload)
             animal_ids = list(DB.animals.keys())
             preview = animal_ids[:5]
-            return {"ok": True, "animals_count": len(animal_ids), "animals_preview": preview}
+            return {"ok": True, "animals_count": len(animal_ids), "animals_preview": preview, "changes": changes}
         except Exception as e:
             return JSONResponse(status_code=500, content={"ok": False, "error": str(e)})
 
     @app.post("/api/debug/reload-sheets")
     async def reload_sheets_post():
-        """Google Sheets からデータを再読込（POST）。"""
+        """主ストア（SQLite 利用時）または Google Sheets からデータを再読込（POST）。Sheets は変更分のみ反映。"""
         try:
-            DB.load_from_sheets()
+            changes = await run_in("sheets", DB.reload)
             animal_ids = list(DB.animals.keys())
             preview = animal_ids[:5]
-            return {"ok": True, "animals_count": len(animal_ids), "animals_preview": preview}
+            return {"ok": True, "animals_count": len(animal_ids), "animals_preview": preview, "changes": changes}
         except Exception as e:
             return JSONResponse(status_code=500, content={"ok": False, "error": str(e)})
+
+    @app.get("/api/debug/ai-cache")
+    async def debug_ai_cache():
+        """Gemini 応答キャッシュのヒット率など。"""
+        return get_ai_cache().stats()
+
+    @app.get("/api/debug/stt-cache")
+    async def debug_stt_cache():
+        """書き起こし結果キャッシュのヒット率など。"""
+        if google_audio_service is None:
+            raise HTTPException(status_code=500, detail="音声サービスが初期化されていません")
+        return google_audio_service.cache.stats()
+
+async def _catch_up_db():
+    try:
+        await run_in("sheets", DB.catch_up_from_sheets)
+    except Exception as e:
+        # 取り込めなくてもスナップショットの内容で動き続ける（次回起動時に再試行）
+        print(f"[startup] Sheets catch-up failed: {e}")
+
+async def _resume_record_jobs(db_ready: Optional[asyncio.Task] = None):
+    """前回の起動で終わらなかった自動書き起こしジョブを再開する。
+
+    スナップショットで起動した場合は、Sheets の取り込みが終わって記録が揃ってから再開する
+    （取り込み前の記録が見つからずにジョブが失敗しないように）。
+    """
+    if db_ready is not None:
+        await db_ready
+    try:
+        await run_in("storage", RECORD_JOBS.start, _process_record_job, on_failure=_on_record_job_failed)
+    except Exception as e:
+        print(f"[startup] failed to resume record jobs: {e}")
+
+async def _snapshot_loop():
+    while True:
+        await asyncio.sleep(DB_SNAPSHOT_INTERVAL)
+        try:
+            await run_in("storage", DB.save_snapshot_if_dirty)
+        except Exception as e:
+            print(f"[snapshot] periodic save failed: {e}")
+
+async def _refresh_loop():
+    """Sheets 上の変更（手作業の編集や他インスタンスの書き込み）を定期的に取り込む。"""
+    while True:
+        await asyncio.sleep(SHEETS_REFRESH_INTERVAL)
+        try:
+            await run_in("sheets", DB.refresh_from_sheets)
+        except Exception as e:
+            print(f"[sheets] periodic refresh failed: {e}")
+
+async def _warm_up():
+    """Google SDK の import・クライアント作成を先に済ませ、最初のリクエストの待ち時間を減らす。
+
+    失敗してもサービスは無効にしない（クライアントは未作成のまま残り、最初のリクエストで作り直す）。
+    """
+    await asyncio.sleep(STARTUP_WARMUP_DELAY)
+    jobs = {}
+    if google_audio_service is not None:
+        jobs["speech"] = run_in("speech", google_audio_service.warm_up)
+    if google_ai_service is not None:
+        jobs["gemini"] = run_in("gemini", google_ai_service.warm_up)
+    if not _LOCAL_DEV and _SPREADSHEET_ID:
+        jobs["sheets"] = run_in("sheets", get_sheets_service)
+    loop = asyncio.get_running_loop()
+    started = loop.time()
+    results = await asyncio.gather(*jobs.values(), return_exceptions=True)
+    for name, result in zip(jobs, results):
+        if isinstance(result, Exception):
+            print(f"[startup] warm-up of {name} failed (will retry on first use): {result}")
+    if jobs:
+        print(f"[startup] warmed up {', '.join(jobs)} in {loop.time() - started:.2f}s")
+
+_background_tasks: List[asyncio.Task] = []
+
 @app.on_event("startup")
 async def on_startup():
     global google_audio_service, google_ai_service
+    catch_up = None
+    if DB.needs_catch_up:
+        # スナップショットで起動済み。Sheets の追記分は応答を始めてから取り込む
+        catch_up = asyncio.create_task(_catch_up_db())
+        _background_tasks.append(catch_up)
+    if DB.store is None and DB_SNAPSHOT_INTERVAL > 0:
+        _background_tasks.append(asyncio.create_task(_snapshot_loop()))
+    if DB.store is None and SHEETS_REFRESH_INTERVAL > 0 and not _LOCAL_DEV and _SPREADSHEET_ID:
+        _background_tasks.append(asyncio.create_task(_refresh_loop()))
     # Only initialize AI services when an API key is present
     if get_gemini_api_key():
         try:
             google_audio_service = GoogleAudioService()
             google_ai_service = GoogleAIService(audio_service=google_audio_service)
             print("Google Audio / AI services initialized")
+            # 前回の起動で終わらなかった自動書き起こしジョブも再開する（DB の準備ができてから）
+            _background_tasks.append(asyncio.create_task(_resume_record_jobs(catch_up)))
         except Exception as e:
             google_audio_service = None
             google_ai_service = None
             print(f"[startup] Google services not initialized: {e}")
     else:
         print("[startup] Gemini API key not set; AI services disabled")
+    if STARTUP_WARMUP:
+        _background_tasks.append(asyncio.create_task(_warm_up()))
+
+@app.on_event("shutdown")
+async def on_shutdown():
+    # 書き込みキューに残った Sheets 追記を取りこぼさないよう書き出してから終了
+    if not DB.flush_pending_writes(timeout=30):
+        print("[shutdown] Sheets write queue did not drain within 30s")
+    for task in _background_tasks:
+        task.cancel()
+    # 次回の起動で読む量を減らすため、変更があればスナップショットを書き直す
+    DB.save_snapshot_if_dirty()
+    shutdown_executors(wait=False)
+
+def _too_large(e: UploadTooLarge) -> HTTPException:
+    return HTTPException(status_code=400, detail=f"ファイルサイズは{e.limit // (1024 * 1024)}MB以下にしてください")
+
+async def _save_upload(upload: UploadFile, filename: str, max_bytes: int):
+    try:
+        return await save_upload(upload, filename=filename, max_bytes=max_bytes)
+    except UploadTooLarge as e:
+        raise _too_large(e)
+
+async def _save_image(upload: UploadFile, filename: str):
+    try:
+        return await save_image_upload(upload, filename=filename, max_bytes=MAX_IMAGE_UPLOAD_BYTES)
+    except UploadTooLarge as e:
+        raise _too_large(e)
+
+async def _store_record_images(images: List[UploadFile]) -> List[dict]:
+    """画像を RECORD_IMAGE_CONCURRENCY 件ずつ並行して保存し、1件ごとの結果を送信順で返す。
+
+    保存できなかった画像は status="error" として返し、他の画像と記録の保存は続ける。
+    """
+    semaphore = asyncio.Semaphore(max(1, RECORD_IMAGE_CONCURRENCY))
+
+    async def store(img: UploadFile) -> dict:
+        info = {"name": img.filename, "size": img.size}
+        async with semaphore:
+            try:
+                url, key, variants = await save_image_upload(
+                    img, filename=f"rec_{uuid.uuid4().hex}_{img.filename}", max_bytes=MAX_IMAGE_UPLOAD_BYTES
+                )
+            except UploadTooLarge as e:
+                return {**info, "status": "error", "error": _too_large(e).detail}
+            except Exception as e:
+                print(f"[storage] failed to save image {img.filename}: {e}")
+                return {**info, "status": "error", "error": "画像の保存に失敗しました"}
+        return {**info, "status": "success", "url": url, "key": key, "variants": variants}
+
+    return list(await asyncio.gather(*(store(img) for img in images if img and img.filename)))
+
+async def _read_audio(upload: UploadFile) -> bytes:
+    try:
+        return await read_upload(upload, MAX_AUDIO_UPLOAD_BYTES)
+    except UploadTooLarge as e:
+        raise _too_large(e)
+
+def _encode_cursor(offset: int) -> str:
+    return base64.urlsafe_b64encode(f"o:{offset}".encode("utf-8")).decode("ascii").rstrip("=")
+
+def _decode_cursor(cursor: str) -> int:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode("utf-8")
+        kind, value = raw.split(":", 1)
+        if kind != "o" or int(value) < 0:
+            raise ValueError(raw)
+        return int(value)
+    except Exception:
+        raise HTTPException(status_code=400, detail="cursor が不正です")
 
 # 動物一覧・検索（簡易フィルタ対応）
-@app.get("/api/animals")
+# レスポンスは AnimalSummary の配列。総件数と次ページのカーソルはヘッダで返す
+# （X-Total-Count / X-Next-Cursor）。limit 未指定時は従来通り全件。
+@app.get("/api/animals", response_model=List[AnimalSummary])
 async def list_animals(
+    response: Response,
     query: str = "",
     microchip_number: str = None,
     farm_id: str = None,
     breed: str = None,
     sex: str = None,
+    limit: int = Query(None, ge=1, le=500),
+    offset: int = Query(0, ge=0),
+    cursor: str = None,
 ):
-    animals = list(DB.animals.values()) if not query else DB.search_animals(query)
-    def match(a: Animal) -> bool:
-        if microchip_number and a.microchip_number != microchip_number: return False
-        if farm_id and getattr(a, "farm_id", None) and farm_id not in a.farm_id: return False
-        if breed and getattr(a, "breed", None) and breed != a.breed: return False
-        if sex and getattr(a, "sex", None) and sex != a.sex: return False
-        return True
-    return [a for a in animals if match(a)]
+    hits = DB.search_animals(query) if query else None
+    animals = DB.filter_animals(
+        microchip_number=microchip_number,
+        farm_id=farm_id,
+        breed=breed,
+        sex=sex,
+        within=hits,
+    )
+    start = _decode_cursor(cursor) if cursor else offset
+    end = len(animals) if limit is None else start + limit
+    page = animals[start:end]
+    response.headers["X-Total-Count"] = str(len(animals))
+    if end < len(animals):
+        response.headers["X-Next-Cursor"] = _encode_cursor(end)
+    summaries = [DB.summarize_animal(a) for a in page]
+    for s in summaries:
+        # 一覧ではサムネイル用の小さい派生画像を返す
+        s.thumbnailUrl = variant_url(s.thumbnailUrl, "thumb")
+    return summaries
 
 @app.get("/api/animals/{animal_id}", response_model=AnimalDetailData)
 async def get_animal(animal_id: str):
@@ -183,8 +384,7 @@ async def create_animal(
 ):
     thumbnail_url = None
     if file is not None:
-        data = await file.read()
-        url, _ = save_file(data, filename=f"animal_{microchip_number}_{file.filename}")
+        url, _, _ = await _save_image(file, f"animal_{microchip_number}_{file.filename}")
         thumbnail_url = url
     animal = Animal(
         id=microchip_number,
@@ -197,14 +397,13 @@ async def create_animal(
         thumbnailUrl=thumbnail_url,
         records=[],
     )
-    DB.add_animal(animal)
+    await run_in("sheets", DB.add_animal, animal)
     return animal
 
 @app.post("/api/uploads/images")
 async def upload_image(file: UploadFile = File(...)):
-    data = await file.read()
-    url, key = save_file(data, filename=f"img_{uuid.uuid4().hex}_{file.filename}")
-    return UploadResponse(url=url, key=key)
+    url, key, variants = await _save_image(file, f"img_{uuid.uuid4().hex}_{file.filename}")
+    return UploadResponse(url=url, key=key, variants=variants or None)
 
 @app.post("/api/transcribe")
 async def transcribe_audio(audio: UploadFile = File(...), lang: str = Form(None)):
@@ -212,21 +411,117 @@ async def transcribe_audio(audio: UploadFile = File(...), lang: str = Form(None)
         raise HTTPException(status_code=500, detail="音声サービスが初期化されていません")
     if not audio or not audio.filename:
         raise HTTPException(status_code=400, detail="音声ファイルが選択されていません")
-    audio_data = await audio.read()
-    if len(audio_data) > 25 * 1024 * 1024:
-        raise HTTPException(status_code=400, detail="ファイルサイズは25MB以下にしてください")
-    text = google_audio_service.transcribe_audio_data(audio_data, audio.filename, language_code=lang)
+    audio_data = await _read_audio(audio)
+    recognition = await run_in("speech", google_audio_service.recognize_audio_data, audio_data, audio.filename, language_code=lang)
+    text = recognition.text if recognition is not None else None
     if not text:
         raise HTTPException(status_code=500, detail="音声の書き起こしに失敗しました")
     return {
         "transcription": text,
         "transcribed_text": text,
+        # AUDIO_MAX_SECONDS を超えた後ろの部分は書き起こしていない
+        "truncated": recognition.truncated,
         "filename": audio.filename,
         "file_size": len(audio_data),
         "status": "success",
         "service": "google_speech_to_text",
     }
 
+# 長時間音声（約60秒超）の書き起こしジョブ。POST で受け付けて job_id を返し、GET でポーリングする
+@app.post("/api/transcribe/jobs", status_code=202)
+async def create_transcription_job(audio: UploadFile = File(...), lang: str = Form(None)):
+    if google_audio_service is None:
+        raise HTTPException(status_code=500, detail="音声サービスが初期化されていません")
+    if not audio or not audio.filename:
+        raise HTTPException(status_code=400, detail="音声ファイルが選択されていません")
+    audio_data = await _read_audio(audio)
+    return TRANSCRIPTION_JOBS.submit(google_audio_service, audio_data, audio.filename, language_code=lang)
+
+@app.get("/api/transcribe/jobs/{job_id}")
+async def get_transcription_job(job_id: str):
+    job = TRANSCRIPTION_JOBS.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="ジョブが見つかりません")
+    return job
+
+# ライブ書き起こし（WebSocket）
+# クライアントは MediaRecorder のチャンク（WebM/Opus）をバイナリで送り、録音終了時に
+# テキスト "stop" を送る。サーバは {"type": "interim"|"final", "text", "stability"} を逐次返し、
+# 最後に {"type": "done", "transcription"} を送って閉じる。
+@app.websocket("/api/transcribe/stream")
+async def transcribe_stream(
+    websocket: WebSocket,
+    lang: str = None,
+    audio_format: str = Query("webm", alias="format"),
+    sample_rate: int = None,
+):
+    await websocket.accept()
+    if google_audio_service is None:
+        await websocket.send_json({"type": "error", "detail": "音声サービスが初期化されていません"})
+        await websocket.close(code=1011)
+        return
+    loop = asyncio.get_running_loop()
+    chunks: "queue.Queue[Optional[bytes]]" = queue.Queue()
+    results: asyncio.Queue = asyncio.Queue()
+
+    def audio_chunks():
+        while True:
+            chunk = chunks.get()
+            if chunk is None:
+                return
+            yield chunk
+
+    def recognize():
+        try:
+            for text, is_final, stability in google_audio_service.streaming_recognize(
+                audio_chunks(), f"stream.{audio_format}", language_code=lang, sample_rate_hertz=sample_rate
+            ):
+                msg = {"type": "final" if is_final else "interim", "text": text, "stability": stability}
+                loop.call_soon_threadsafe(results.put_nowait, msg)
+        except Exception as e:
+            print(f"[stt-stream] recognize error: {e}")
+            loop.call_soon_threadsafe(results.put_nowait, {"type": "error", "detail": str(e)})
+        finally:
+            loop.call_soon_threadsafe(results.put_nowait, None)
+
+    async def send_results():
+        finals: List[str] = []
+        while True:
+            msg = await results.get()
+            if msg is None:
+                break
+            if msg["type"] == "final":
+                finals.append(msg["text"].strip())
+            await websocket.send_json(msg)
+        await websocket.send_json({"type": "done", "transcription": " ".join(t for t in finals if t)})
+
+    worker = loop.run_in_executor(get_executor("speech_stream"), recognize)
+    sender = asyncio.create_task(send_results())
+    try:
+        while not sender.done():
+            receiver = asyncio.ensure_future(websocket.receive())
+            done, _ = await asyncio.wait({receiver, sender}, return_when=asyncio.FIRST_COMPLETED)
+            if receiver not in done:
+                receiver.cancel()
+                break
+            message = receiver.result()
+            if message["type"] == "websocket.disconnect":
+                break
+            if message.get("bytes"):
+                chunks.put(message["bytes"])
+            elif (message.get("text") or "").strip().lower() in ("stop", "end", "eos"):
+                break
+    finally:
+        # 音声の終端を通知すると streaming_recognize が残りの結果を返して終了する
+        chunks.put(None)
+    try:
+        await sender
+        await worker
+        await websocket.close()
+    except Exception:
+        # クライアント側が先に切断した場合
+        sender.cancel()
+
 @app.post("/api/generateSoap")
 async def generate_soap_endpoint(audio: UploadFile = File(None), transcribed_text: str = Form(None), lang: str = Form(None), target_lang: str = Form(None)):
     if google_ai_service is None:
@@ -235,31 +530,55 @@ async def generate_soap_endpoint(audio: UploadFile = File(None), transcribed_tex
     if not text and audio is not None:
         if google_audio_service is None:
             raise HTTPException(status_code=500, detail="音声サービスが初期化されていません")
-        data = await audio.read()
-        if len(data) > 25 * 1024 * 1024:
-            raise HTTPException(status_code=400, detail="ファイルサイズは25MB以下にしてください")
-        text = google_audio_service.transcribe_audio_data(data, audio.filename, language_code=lang)
+        data = await _read_audio(audio)
+        text = await run_in("speech", google_audio_service.transcribe_audio_data, data, audio.filename, language_code=lang)
     if not text:
         raise HTTPException(status_code=400, detail="テキストが指定されていません")
-    soap_notes = google_ai_service.generate_soap_from_text(text)
+    soap_notes = await run_in("gemini", google_ai_service.generate_soap_from_text, text)
     # 生成後に出力言語を揃えたい場合は、target_lang を指定して翻訳
+    translation = None
     if target_lang:
-        try:
-            s = google_ai_service.translate_text(soap_notes.s, target_lang)
-            o = google_ai_service.translate_text(soap_notes.o, target_lang)
-            a = google_ai_service.translate_text(soap_notes.a, target_lang)
-            p = google_ai_service.translate_text(soap_notes.p, target_lang)
-            from schemas import SoapNotes as _SN
-            soap_notes = _SN(s=s, o=o, a=a, p=p)
-        except Exception:
-            pass
+        soap_notes, translation = await _translate_soap_notes(soap_notes, target_lang)
     return {
         "soap_notes": soap_notes.model_dump(),
         "original_text": text,
+        "translation": translation,
         "status": "success",
         "service": "google_gemini",
     }
 
+async def _translate_soap_notes(soap_notes: SoapNotes, target_lang: str):
+    """SOAP をまとめて翻訳する。
+
+    まず1回の構造化リクエストで4項目を翻訳し、取れなかった項目だけ項目ごとの翻訳を
+    並列に実行する。それでも失敗した項目は原文のまま残し、failed_fields で返す。
+    """
+    original = soap_notes.model_dump()
+    pending = [k for k, v in original.items() if v]
+    translated = {}
+    try:
+        translated = await run_in("gemini", google_ai_service.translate_soap, soap_notes, target_lang)
+    except Exception as e:
+        print(f"[translate] structured SOAP translation failed; falling back per field: {e}")
+    missing = [k for k in pending if k not in translated]
+    if missing:
+        results = await asyncio.gather(
+            *(run_in("gemini", google_ai_service.translate_text, original[k], target_lang, raise_on_error=True) for k in missing),
+            return_exceptions=True,
+        )
+        for k, result in zip(missing, results):
+            if not isinstance(result, Exception):
+                translated[k] = result
+    failed = [k for k in pending if k not in translated]
+    if not pending or not failed:
+        status = "complete"
+    elif len(failed) < len(pending):
+        status = "partial"
+    else:
+        status = "failed"
+    info = {"target_lang": target_lang, "status": status, "failed_fields": failed}
+    return SoapNotes(**{**original, **translated}), info
+
 @app.post("/api/records")
 async def create_record(
     animalId: str = Form(...),
@@ -294,30 +613,28 @@ async def create_record(
         soap = SoapNotes(s=soap_s, o=soap_o, a=soap_a, p=soap_p)
     else:
         soap = SoapNotes()
-    image_urls: List[str] = []
-    if images:
-        for img in images:
-            if img and img.filename:
-                content = await img.read()
-                url, _ = save_file(content, filename=f"rec_{uuid.uuid4().hex}_{img.filename}")
-                image_urls.append(url)
+    processed_images = await _store_record_images(images) if images else []
+    image_urls = [info["url"] for info in processed_images if info["status"] == "success"]
     audio_url = None
-    transcribed = None
+    pending_audio = None
     if audio is not None:
-        data = await audio.read()
-        if len(data) > 25 * 1024 * 1024:
-            raise HTTPException(status_code=400, detail="ファイルサイズは25MB以下にしてください")
-        audio_url, _ = save_file(data, filename=f"audio_{uuid.uuid4().hex}_{audio.filename}")
-        if auto_transcribe and google_audio_service is not None and not soap:
-            transcribed = google_audio_service.transcribe_audio_data(data, audio.filename, language_code=lang)
-            if transcribed:
-                soap = google_ai_service.generate_soap_from_text(transcribed)
+        audio_url, _ = await _save_upload(audio, f"audio_{uuid.uuid4().hex}_{audio.filename}", MAX_AUDIO_UPLOAD_BYTES)
+        # SOAP が未入力のときだけ、書き起こし → SOAP 生成をバックグラウンドジョブで行う
+        if (
+            auto_transcribe
+            and google_audio_service is not None
+            and google_ai_service is not None
+            and not any(soap.model_dump().values())
+        ):
+            # 保存済みの一時ファイル（multipart の解析で書き出されたもの）をジョブのスプールへ複製する
+            pending_audio = (audio.file, audio.filename)
     record = Record(
         id=uuid.uuid4().hex,
         animalId=animalId,
         soap=soap,
         images=image_urls,
         audioUrl=audio_url,
+        processing_status="pending" if pending_audio else None,
     )
     if next_visit_date:
         record.next_visit_date = next_visit_date
@@ -342,18 +659,82 @@ async def create_record(
         record.external_case_id = external_case_id
     if external_ref_url:
         record.external_ref_url = external_ref_url
-    DB.add_record(record)
+    await run_in("sheets", DB.add_record, record)
+    job = None
+    if pending_audio:
+        await audio.seek(0)
+        job = await run_in("storage", RECORD_JOBS.submit, record.id, *pending_audio, language_code=lang)
+    message = "記録を保存しました。書き起こしと SOAP 生成はバックグラウンドで行います" if job else "記録が正常に保存されました"
+    failed_images = sum(1 for info in processed_images if info["status"] != "success")
+    if failed_images:
+        message += f"（保存できなかった画像: {failed_images} 件）"
     return {
         "record": record,
-        "transcribed_text": transcribed,
         "auto_transcribe": auto_transcribe,
-        "processed_images": [],
+        "job": job,
+        "processed_images": processed_images,
         "record_id": record.id,
-        "message": "記録が正常に保存されました",
+        "message": message,
         "status": "success",
         "api_used": "google_cloud_apis",
     }
 
+def _update_record_fields(record_id: str, **fields) -> None:
+    _, record, _ = DB.find_record(record_id)
+    if record is None:
+        raise RuntimeError(f"記録 {record_id} が見つかりません")
+    DB.update_record_by_id(record_id, record.model_copy(update=fields))
+
+def _soap_filled_in(record_id: str) -> bool:
+    _, record, _ = DB.find_record(record_id)
+    if record is None:
+        raise RuntimeError(f"記録 {record_id} が見つかりません")
+    return any(record.soap.model_dump().values())
+
+def _process_record_job(job: dict, audio_data: bytes) -> str:
+    """自動書き起こしジョブの本体（record_jobs プールのスレッドで実行）。
+
+    処理中に SOAP が入力された（Sheets で直接編集された等）記録には、生成した SOAP を書き込まない。
+    """
+    if google_audio_service is None or google_ai_service is None:
+        raise RuntimeError("AIサービスが初期化されていません")
+    transcribed = google_audio_service.transcribe_audio_data(audio_data, job["filename"], language_code=job["language_code"])
+    if transcribed is None:
+        raise RuntimeError("音声の書き起こしに失敗しました")
+    if _soap_filled_in(job["record_id"]):
+        print(f"[record-jobs] {job['record_id']}: SOAP was entered while processing; generated SOAP not applied")
+        _update_record_fields(job["record_id"], processing_status=None)
+        return transcribed
+    soap = google_ai_service.generate_soap_from_text(transcribed) if transcribed else SoapNotes()
+    # SOAP の生成中に入力された場合も上書きしない
+    if _soap_filled_in(job["record_id"]):
+        print(f"[record-jobs] {job['record_id']}: SOAP was entered while processing; generated SOAP not applied")
+        _update_record_fields(job["record_id"], processing_status=None)
+        return transcribed
+    _update_record_fields(job["record_id"], soap=soap, processing_status=None)
+    return transcribed
+
+def _on_record_job_failed(job: dict) -> None:
+    _update_record_fields(job["record_id"], processing_status="error")
+
+# 自動書き起こしジョブの状態。status は pending / running / done / error。
+# 完了後は更新済みの記録も返す
+@app.get("/api/records/jobs/{job_id}")
+async def get_record_job(job_id: str):
+    job = await run_in("storage", RECORD_JOBS.get, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="ジョブが見つかりません")
+    _, record, _ = DB.find_record(job["record_id"])
+    return {**job, "record": record}
+
+@app.get("/api/records/{record_id}/job")
+async def get_job_for_record(record_id: str):
+    job = await run_in("storage", RECORD_JOBS.get_for_record, record_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="ジョブが見つかりません")
+    _, record, _ = DB.find_record(record_id)
+    return {**job, "record": record}
+
 # 互換API: テキストからSOAP生成（Frontend互換）
 @app.post("/api/generateSoapFromText")
 async def generate_soap_from_text_compat(text: str = Form(None), transcribed_text: str = Form(None)):
@@ -362,7 +743,7 @@ async def generate_soap_from_text_compat(text: str = Form(None), transcribed_tex
     t = transcribed_text or text
     if not t:
         raise HTTPException(status_code=400, detail="text is required")
-    soap_notes = google_ai_service.generate_soap_from_text(t)
+    soap_notes = await run_in("gemini", google_ai_service.generate_soap_from_text, t)
     return {
         "soap_notes": soap_notes.model_dump(),
         "original_text": t,
@@ -370,6 +751,46 @@ async def generate_soap_from_text_compat(text: str = Form(None), transcribed_tex
         "service": "google_gemini",
     }
 
+# SOAP 生成（ストリーミング, Server-Sent Events）
+# 各項目の生成が終わった時点で "field" イベント {"field": "s", "value": ...} を送り、
+# 最後に "done" イベントで /api/generateSoap と同じ形のレスポンスを送る。
+# 失敗時は "error" イベント {"detail": ...} を送って終了する。
+def _sse(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {_json.dumps(data, ensure_ascii=False)}\n\n"
+
+@app.post("/api/generateSoap/stream")
+async def generate_soap_stream(text: str = Form(None), transcribed_text: str = Form(None), target_lang: str = Form(None)):
+    if google_ai_service is None:
+        raise HTTPException(status_code=500, detail="AIサービスが初期化されていません")
+    t = transcribed_text or text
+    if not t:
+        raise HTTPException(status_code=400, detail="テキストが指定されていません")
+
+    async def events():
+        fields = {}
+        try:
+            async for key, value in iterate_in("gemini", google_ai_service.stream_soap_from_text, t):
+                fields[key] = value
+                yield _sse("field", {"field": key, "value": value})
+            soap_notes = SoapNotes(**fields)
+            translation = None
+            if target_lang:
+                soap_notes, translation = await _translate_soap_notes(soap_notes, target_lang)
+            yield _sse("done", {
+                "soap_notes": soap_notes.model_dump(),
+                "original_text": t,
+                "translation": translation,
+                "status": "success",
+                "service": "google_gemini",
+            })
+        except Exception as e:
+            print(f"[gemini] SOAP stream failed: {e}")
+            yield _sse("error", {"detail": str(e), "fields": fields})
+
+    # プロキシ（nginx 等）のバッファリングを止めて、項目ごとに届くようにする
+    headers = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    return StreamingResponse(events(), media_type="text/event-stream", headers=headers)
+
 @app.post("/api/translate")
 async def api_translate(text: str = Form(...), target_lang: str = Form("en")):
     """Translate arbitrary text into target language using Gemini if available.
@@ -380,48 +801,16 @@ async def api_translate(text: str = Form(...), target_lang: str = Form("en")):
         raise HTTPException(status_code=400, detail="text is required")
     if google_ai_service is None:
         return {"translated": text, "target_lang": target_lang, "service": None}
-    translated = google_ai_service.translate_text(text, target_lang=target_lang)
+    translated = await run_in("gemini", google_ai_service.translate_text, text, target_lang=target_lang)
     return {"translated": translated, "target_lang": target_lang, "service": "google_gemini"}
 
 
 # 予定一覧（レコードの next_visit_date から集計）
 @app.get("/api/appointments")
-async def get_appointments(date: str = None):
-    items = []
-    for animal in DB.animals.values():
-        records = DB.get_records_for_animal(animal.id)
-        if not records:
-            continue
-        for r in records:
-            nxt = getattr(r, "next_visit_date", None)
-            if not nxt:
-                continue
-            d = None
-            t = getattr(r, "next_visit_time", None)
-            if isinstance(nxt, str):
-                if "T" in nxt:
-                    d, tpart = nxt.split("T", 1)
-                    if not t:
-                        t = tpart[:5]
-                else:
-                    d = nxt
-            if not d:
-                try:
-                    d = str(nxt)[:10]
-                except Exception:
-                    continue
-            if date and d != date:
-                continue
-            items.append({
-                "id": f"{animal.id}-{getattr(r, 'id', '')}",
-                "microchip_number": animal.id,
-                "animal_name": getattr(animal, "name", ""),
-                "farm_id": getattr(animal, "farm_id", None),
-                "date": d,
-                "time": t or "",
-                "description": None,
-                "summary": getattr(getattr(r, 'soap', None), 'a', None),
-                "status": "scheduled",
-                "doctor": getattr(r, 'doctor', None),
-            })
-    return items
+async def get_appointments(
+    date: str = None,
+    date_from: str = Query(None, alias="from"),
+    date_to: str = Query(None, alias="to"),
+    doctor: str = None,
+):
+    return DB.list_appointments(date=date, date_from=date_from, date_to=date_to, doctor=doctor)
@@ -0,0 +1,213 @@
+import hashlib
+import mimetypes
+import os
+import re
+import stat as stat_module
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+import aiofiles
+from starlette.concurrency import run_in_threadpool
+from starlette.requests import Request
+from starlette.responses import FileResponse, RedirectResponse, Response, StreamingResponse
+
+from google_clients import get_storage_client
+from storage import GCS_BASE_URL, GCS_BUCKET_NAME, IMMUTABLE_CACHE_CONTROL, UPLOAD_DIR
+
+# 名前が uuid4 / 内容ハッシュ（16進32桁）のファイルは中身が変わらないので、ブラウザに長期間キャッシュさせる
+_IMMUTABLE_NAME = re.compile(r"^[0-9a-f]{32}(\.[A-Za-z0-9]+)*$")
+# それ以外（以前の保存名など）は毎回 ETag で確認させる
+REVALIDATE_CACHE_CONTROL = "public, no-cache"
+# GCS の署名付き URL の有効期間（秒）。同じファイルへのリダイレクトは期限近くまで使い回す
+GCS_SIGNED_URL_TTL = int(os.getenv("GCS_SIGNED_URL_TTL", "3600"))
+_SIGNED_URL_MARGIN = 60
+# 以前の保存名のファイルについて覚えておく ETag の数（古いものから捨てる）
+MEDIA_ETAG_CACHE_SIZE = int(os.getenv("MEDIA_ETAG_CACHE_SIZE", "1024"))
+# 部分取得（Range）で読み出す単位
+_RANGE_CHUNK_SIZE = 64 * 1024
+_RANGE = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+
+class MediaFiles:
+    """/uploads の配信（StaticFiles の代わり）。
+
+    - 強い ETag（内容ハッシュ）と If-None-Match による 304
+    - uuid / ハッシュ名のファイルは Cache-Control: immutable
+    - Range（単一範囲）による 206。音声のシーク用
+    - ローカルに無く GCS が使える場合は署名付き URL へリダイレクト
+    """
+
+    def __init__(self, directory: str = UPLOAD_DIR, etag_cache_size: int = MEDIA_ETAG_CACHE_SIZE):
+        self.directory = Path(directory)
+        # 以前の保存名のファイルの ETag（名前, サイズ, 更新時刻）-> SHA-256。LRU で件数を制限する
+        self._etags: "OrderedDict[Tuple[str, int, int], str]" = OrderedDict()
+        self._etag_cache_size = max(1, etag_cache_size)
+        self._signed: Dict[str, Tuple[str, float]] = {}
+        self._lock = threading.Lock()
+
+    async def __call__(self, scope, receive, send):
+        assert scope["type"] == "http"
+        request = Request(scope, receive)
+        response = await self.handle(request)
+        await response(scope, receive, send)
+
+    def _name(self, scope) -> Optional[str]:
+        path = scope["path"]
+        root_path = scope.get("root_path", "")
+        if root_path and path.startswith(root_path):
+            path = path[len(root_path):]
+        name = path.lstrip("/")
+        # uploads 直下のファイルだけを配信する（書き込み途中の .part などの隠しファイルも除く）
+        if not name or "/" in name or "\\" in name or name.startswith("."):
+            return None
+        return name
+
+    async def handle(self, request: Request) -> Response:
+        if request.method not in ("GET", "HEAD"):
+            return Response("Method Not Allowed", status_code=405, headers={"Allow": "GET, HEAD"})
+        name = self._name(request.scope)
+        if name is None:
+            return Response("Not Found", status_code=404)
+        path = self.directory / name
+        try:
+            stat = await run_in_threadpool(os.stat, path)
+        except OSError:
+            stat = None
+        if stat is None or not stat_module.S_ISREG(stat.st_mode):
+            if GCS_BUCKET_NAME:
+                return await self._redirect_to_gcs(name)
+            return Response("Not Found", status_code=404)
+
+        etag = await self._etag(name, path, stat)
+        headers = {
+            "ETag": etag,
+            "Cache-Control": IMMUTABLE_CACHE_CONTROL if _IMMUTABLE_NAME.match(name) else REVALIDATE_CACHE_CONTROL,
+            "Accept-Ranges": "bytes",
+        }
+        if _etag_matches(request.headers.get("if-none-match"), etag):
+            return Response(status_code=304, headers=headers)
+
+        media_type = mimetypes.guess_type(name)[0] or "application/octet-stream"
+        byte_range = self._range(request, etag, stat.st_size)
+        if byte_range == "invalid":
+            headers["Content-Range"] = f"bytes */{stat.st_size}"
+            return Response(status_code=416, headers=headers)
+        if byte_range is None:
+            return FileResponse(path, headers=headers, media_type=media_type, stat_result=stat, method=request.method)
+        start, end = byte_range
+        headers["Content-Range"] = f"bytes {start}-{end}/{stat.st_size}"
+        headers["Content-Length"] = str(end - start + 1)
+        if request.method == "HEAD":
+            return Response(status_code=206, headers=headers, media_type=media_type)
+        return StreamingResponse(
+            _read_range(path, start, end), status_code=206, headers=headers, media_type=media_type
+        )
+
+    async def _etag(self, name: str, path: Path, stat: os.stat_result) -> str:
+        # uuid / ハッシュ名は中身と1対1なので名前をそのまま ETag にする
+        if _IMMUTABLE_NAME.match(name):
+            return f'"{name}"'
+        cache_key = (name, stat.st_size, stat.st_mtime_ns)
+        with self._lock:
+            digest = self._etags.get(cache_key)
+            if digest is not None:
+                self._etags.move_to_end(cache_key)
+        if digest is None:
+            digest = await run_in_threadpool(_sha256_file, path)
+            with self._lock:
+                self._etags[cache_key] = digest
+                while len(self._etags) > self._etag_cache_size:
+                    self._etags.popitem(last=False)
+        return f'"{digest[:32]}"'
+
+    @staticmethod
+    def _range(request: Request, etag: str, size: int):
+        """Range ヘッダから (start, end) を返す。全体を返す場合は None、満たせない範囲は "invalid"。"""
+        value = request.headers.get("range")
+        if not value or size == 0:
+            return None
+        # If-Range が現在の ETag と違えば（ファイルが変わっていれば）全体を返す
+        if_range = request.headers.get("if-range")
+        if if_range is not None and if_range.strip() != etag:
+            return None
+        match = _RANGE.match(value.strip())
+        if match is None:
+            # 複数範囲などは扱わず全体を返す（RFC 9110 で許容）
+            return None
+        first, last = match.groups()
+        if not first and not last:
+            return None
+        if not first:
+            # bytes=-N は末尾 N バイト
+            length = int(last)
+            if length == 0:
+                return "invalid"
+            return max(0, size - length), size - 1
+        start = int(first)
+        end = min(int(last), size - 1) if last else size - 1
+        if start >= size or start > end:
+            return "invalid"
+        return start, end
+
+    async def _redirect_to_gcs(self, name: str) -> Response:
+        try:
+            url, expires = await run_in_threadpool(self._signed_url, name)
+        except Exception as e:
+            print(f"[media] signed URL failed for {name}: {e}")
+            if not GCS_BASE_URL:
+                return Response("Not Found", status_code=404)
+            url, expires = f"{GCS_BASE_URL}/uploads/{name}", time.time() + GCS_SIGNED_URL_TTL
+        # リダイレクト自体も URL の期限が切れる少し前までブラウザにキャッシュさせる
+        max_age = max(0, int(expires - time.time()) - _SIGNED_URL_MARGIN)
+        return RedirectResponse(url, status_code=307, headers={"Cache-Control": f"private, max-age={max_age}"})
+
+    def _signed_url(self, name: str) -> Tuple[str, float]:
+        now = time.time()
+        with self._lock:
+            cached = self._signed.get(name)
+        if cached is not None and cached[1] - now > _SIGNED_URL_MARGIN:
+            return cached
+        client = get_storage_client()
+        if client is None:
+            raise RuntimeError("google-cloud-storage is not available")
+        blob = client.bucket(GCS_BUCKET_NAME).blob(f"uploads/{name}")
+        url = blob.generate_signed_url(version="v4", expiration=GCS_SIGNED_URL_TTL, method="GET")
+        entry = (url, now + GCS_SIGNED_URL_TTL)
+        with self._lock:
+            # 期限切れのものを捨ててから追加する
+            self._signed = {k: v for k, v in self._signed.items() if v[1] > now}
+            self._signed[name] = entry
+        return entry
+
+
+def _etag_matches(header: Optional[str], etag: str) -> bool:
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    # If-None-Match は弱い比較（W/ の有無は問わない）
+    tags = (tag.strip() for tag in header.split(","))
+    return any((tag[2:] if tag.startswith("W/") else tag) == etag for tag in tags)
+
+
+def _sha256_file(path: Path) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+async def _read_range(path: Path, start: int, end: int):
+    remaining = end - start + 1
+    async with aiofiles.open(path, "rb") as f:
+        await f.seek(start)
+        while remaining > 0:
+            chunk = await f.read(min(_RANGE_CHUNK_SIZE, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
@@ -0,0 +1,199 @@
+import os
+import shutil
+import sqlite3
+import threading
+import time
+import uuid
+from pathlib import Path
+from typing import BinaryIO, Callable, Optional, Union
+
+from executors import get_executor
+
+# 診療記録の後処理ジョブ（書き起こし → SOAP 生成）の保存先
+RECORD_JOBS_PATH = os.getenv("RECORD_JOBS_PATH", "record_jobs.sqlite3")
+# 処理が終わるまで音声を置いておくディレクトリ（公開される uploads とは分ける）
+RECORD_JOBS_SPOOL_DIR = os.getenv("RECORD_JOBS_SPOOL_DIR", "job_spool")
+RECORD_JOB_MAX_ATTEMPTS = int(os.getenv("RECORD_JOB_MAX_ATTEMPTS", "3"))
+RECORD_JOB_RETRY_BASE_DELAY = float(os.getenv("RECORD_JOB_RETRY_BASE_DELAY", "5"))
+# 完了・失敗したジョブを保持する時間（秒）
+RECORD_JOB_TTL_SECONDS = 7 * 24 * 60 * 60
+
+_COLUMNS = (
+    "job_id", "record_id", "filename", "language_code", "spool_path", "status",
+    "attempts", "transcription", "error", "created_at", "updated_at",
+)
+
+
+class RecordJobQueue:
+    """診療記録作成後の自動書き起こし・SOAP 生成を行うジョブキュー。
+
+    - ジョブと音声は SQLite とスプールディレクトリに保存し、再起動後は未完了のジョブから再開する
+    - 処理は "record_jobs" プールで行い、失敗時は指数バックオフで RECORD_JOB_MAX_ATTEMPTS 回まで再試行する
+    - 実際の処理内容は start() に渡す handler(job, audio_data) が担う（戻り値は書き起こし結果）
+    """
+
+    def __init__(
+        self,
+        path: str = RECORD_JOBS_PATH,
+        spool_dir: str = RECORD_JOBS_SPOOL_DIR,
+        max_attempts: int = RECORD_JOB_MAX_ATTEMPTS,
+        retry_base_delay: float = RECORD_JOB_RETRY_BASE_DELAY,
+    ):
+        self.path = path
+        self.spool_dir = Path(spool_dir)
+        self.max_attempts = max(1, max_attempts)
+        self.retry_base_delay = retry_base_delay
+        self._lock = threading.Lock()
+        self._db: Optional[sqlite3.Connection] = None
+        self._handler: Optional[Callable[[dict, bytes], Optional[str]]] = None
+        self._on_failure: Optional[Callable[[dict], None]] = None
+
+    def _conn(self) -> sqlite3.Connection:
+        # 呼び出し元で self._lock を保持していること
+        if self._db is None:
+            self._db = sqlite3.connect(self.path, check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS record_jobs ("
+                " job_id TEXT PRIMARY KEY, record_id TEXT NOT NULL, filename TEXT, language_code TEXT,"
+                " spool_path TEXT, status TEXT NOT NULL, attempts INTEGER NOT NULL DEFAULT 0,"
+                " transcription TEXT, error TEXT, created_at REAL NOT NULL, updated_at REAL NOT NULL)"
+            )
+            self._db.execute("CREATE INDEX IF NOT EXISTS record_jobs_record ON record_jobs (record_id)")
+            self._db.execute("CREATE INDEX IF NOT EXISTS record_jobs_status ON record_jobs (status)")
+            self._db.commit()
+        return self._db
+
+    def start(
+        self,
+        handler: Callable[[dict, bytes], Optional[str]],
+        on_failure: Optional[Callable[[dict], None]] = None,
+    ) -> int:
+        """処理関数を登録し、前回のプロセスで終わらなかったジョブを再投入する。再投入した件数を返す。"""
+        self._handler = handler
+        self._on_failure = on_failure
+        self._purge()
+        with self._lock:
+            rows = self._conn().execute(
+                "SELECT job_id FROM record_jobs WHERE status IN ('pending', 'running') ORDER BY created_at"
+            ).fetchall()
+        for (job_id,) in rows:
+            get_executor("record_jobs").submit(self._run, job_id)
+        if rows:
+            print(f"[record-jobs] resumed {len(rows)} unfinished job(s)")
+        return len(rows)
+
+    def submit(
+        self,
+        record_id: str,
+        audio: Union[bytes, BinaryIO],
+        filename: str,
+        language_code: Optional[str] = None,
+    ) -> dict:
+        """audio はバイト列またはファイルオブジェクト（現在位置から末尾までをスプールへ複製する）。"""
+        job_id = uuid.uuid4().hex
+        self.spool_dir.mkdir(parents=True, exist_ok=True)
+        spool_path = self.spool_dir / f"{job_id}{Path(filename).suffix.lower()}"
+        if isinstance(audio, (bytes, bytearray)):
+            spool_path.write_bytes(audio)
+        else:
+            with open(spool_path, "wb") as f:
+                shutil.copyfileobj(audio, f, 1024 * 1024)
+        now = time.time()
+        with self._lock:
+            conn = self._conn()
+            conn.execute(
+                "INSERT INTO record_jobs (job_id, record_id, filename, language_code, spool_path, status,"
+                " attempts, created_at, updated_at) VALUES (?, ?, ?, ?, ?, 'pending', 0, ?, ?)",
+                (job_id, record_id, filename, language_code, str(spool_path), now, now),
+            )
+            conn.commit()
+        if self._handler is not None:
+            get_executor("record_jobs").submit(self._run, job_id)
+        return self.get(job_id)
+
+    def get(self, job_id: str) -> Optional[dict]:
+        with self._lock:
+            row = self._conn().execute(
+                f"SELECT {', '.join(_COLUMNS)} FROM record_jobs WHERE job_id = ?", (job_id,)
+            ).fetchone()
+        return self._public(row)
+
+    def get_for_record(self, record_id: str) -> Optional[dict]:
+        """記録に対する最新のジョブ。"""
+        with self._lock:
+            row = self._conn().execute(
+                f"SELECT {', '.join(_COLUMNS)} FROM record_jobs WHERE record_id = ? ORDER BY created_at DESC LIMIT 1",
+                (record_id,),
+            ).fetchone()
+        return self._public(row)
+
+    @staticmethod
+    def _public(row) -> Optional[dict]:
+        if row is None:
+            return None
+        job = dict(zip(_COLUMNS, row))
+        job.pop("spool_path")
+        return job
+
+    def _update(self, job_id: str, **fields) -> None:
+        fields["updated_at"] = time.time()
+        assignments = ", ".join(f"{k} = ?" for k in fields)
+        with self._lock:
+            conn = self._conn()
+            conn.execute(f"UPDATE record_jobs SET {assignments} WHERE job_id = ?", (*fields.values(), job_id))
+            conn.commit()
+
+    def _run(self, job_id: str) -> None:
+        with self._lock:
+            row = self._conn().execute(
+                f"SELECT {', '.join(_COLUMNS)} FROM record_jobs WHERE job_id = ?", (job_id,)
+            ).fetchone()
+        if row is None:
+            return
+        job = dict(zip(_COLUMNS, row))
+        if job["status"] not in ("pending", "running"):
+            return
+        attempts = job["attempts"] + 1
+        self._update(job_id, status="running", attempts=attempts)
+        try:
+            audio_data = Path(job["spool_path"]).read_bytes()
+            transcription = self._handler(self._public(row), audio_data)
+        except Exception as e:
+            if attempts < self.max_attempts:
+                delay = self.retry_base_delay * (2 ** (attempts - 1))
+                print(f"[record-jobs] {job_id} failed (attempt {attempts}); retry in {delay:.0f}s: {e}")
+                self._update(job_id, status="pending", error=str(e))
+                timer = threading.Timer(delay, lambda: get_executor("record_jobs").submit(self._run, job_id))
+                timer.daemon = True
+                timer.start()
+                return
+            print(f"[record-jobs] {job_id} failed: {e}")
+            self._update(job_id, status="error", error=str(e))
+            self._discard_spool(job["spool_path"])
+            if self._on_failure is not None:
+                try:
+                    self._on_failure(self.get(job_id))
+                except Exception as cb_error:
+                    print(f"[record-jobs] failure handler error: {cb_error}")
+            return
+        self._update(job_id, status="done", transcription=transcription, error=None)
+        self._discard_spool(job["spool_path"])
+
+    @staticmethod
+    def _discard_spool(spool_path: Optional[str]) -> None:
+        if spool_path:
+            try:
+                Path(spool_path).unlink(missing_ok=True)
+            except Exception as e:
+                print(f"[record-jobs] failed to remove {spool_path}: {e}")
+
+    def _purge(self) -> None:
+        cutoff = time.time() - RECORD_JOB_TTL_SECONDS
+        with self._lock:
+            conn = self._conn()
+            conn.execute("DELETE FROM record_jobs WHERE status IN ('done', 'error') AND updated_at < ?", (cutoff,))
+            conn.commit()
+
+
+RECORD_JOBS = RecordJobQueue()
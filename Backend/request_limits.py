@@ -0,0 +1,45 @@
+import os
+
+from fastapi import HTTPException
+from fastapi.responses import JSONResponse
+
+# リクエスト本文全体の上限（バイト）。0 で無制限
+# 診療記録の作成は音声1件＋画像複数を1リクエストで送るので、ファイル単位の上限より大きくする
+MAX_REQUEST_BYTES = int(os.getenv("MAX_REQUEST_BYTES", str(100 * 1024 * 1024)))
+
+_DETAIL = "リクエストが大きすぎます"
+
+
+class RequestSizeLimitMiddleware:
+    """リクエスト本文の大きさを受信しながら制限する ASGI ミドルウェア。
+
+    Content-Length が上限を超えていれば本文を読まずに 413 を返す。ヘッダが無い
+    （チャンク転送など）場合は受信した量を数え、超えた時点で multipart の解析を打ち切る。
+    """
+
+    def __init__(self, app, max_bytes: int = MAX_REQUEST_BYTES):
+        self.app = app
+        self.max_bytes = max_bytes
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or self.max_bytes <= 0:
+            await self.app(scope, receive, send)
+            return
+        length = dict(scope["headers"]).get(b"content-length")
+        if length is not None and length.isdigit() and int(length) > self.max_bytes:
+            response = JSONResponse(status_code=413, content={"detail": _DETAIL})
+            await response(scope, receive, send)
+            return
+        received = 0
+
+        async def limited_receive():
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > self.max_bytes:
+                    # 本文の解析中に投げると FastAPI がそのまま 413 として返す
+                    raise HTTPException(status_code=413, detail=_DETAIL)
+            return message
+
+        await self.app(scope, limited_receive, send)
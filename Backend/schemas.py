@@ -1,5 +1,5 @@
 from pydantic import BaseModel, Field
-from typing import List, Optional
+from typing import Dict, List, Optional
 from datetime import datetime, date
 
 # 順番が重要なので、利用されるモデルを先に定義します
@@ -40,6 +40,8 @@ class Record(BaseModel):
     # 外部受付連携用（将来拡張）
     external_case_id: Optional[str] = None
     external_ref_url: Optional[str] = None
+    # 自動書き起こし・SOAP 生成の状態（"pending" / "error"。完了後・対象外は None）
+    processing_status: Optional[str] = None
     
     # createdAtはFastAPIから返却する際に使われる想定
     createdAt: datetime = Field(default_factory=datetime.utcnow)
@@ -61,6 +63,17 @@ class Animal(BaseModel):
     # recordsはそのまま
     records: List['Record'] = []
 
+class AnimalSummary(BaseModel):
+    """一覧・検索結果用の軽量な動物情報（診療記録本体は含めない）"""
+    id: str
+    name: str
+    microchip_number: str
+    farm_id: Optional[str] = None
+    breed: Optional[str] = None
+    thumbnailUrl: Optional[str] = None
+    record_count: int = 0
+    last_visit: Optional[str] = None
+
 class Appointment(BaseModel):
     """予約情報のモデル"""
     id: str
@@ -75,6 +88,8 @@ class Appointment(BaseModel):
 class UploadResponse(BaseModel):
     url: Optional[str] = None
     key: Optional[str] = None
+    # 画像の派生サイズ（thumb / medium / full）の URL。元ファイルのまま保存した場合は None
+    variants: Optional[Dict[str, str]] = None
     message: Optional[str] = None
 
 # Animalモデルが自身の定義内で'Record'を参照しているため、
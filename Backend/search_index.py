@@ -0,0 +1,147 @@
+import math
+import re
+import unicodedata
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+# 文字 n-gram の長さ。日本語は分かち書きされないため、単語ではなく 2-gram で索引する
+NGRAM_SIZE = 2
+
+# フィールドごとの重み（名前・マイクロチップ一致をカルテ本文より上位に）
+FIELD_WEIGHTS = {
+    "name": 3.0,
+    "microchip": 3.0,
+    "farm": 2.0,
+    "soap": 1.0,
+}
+
+_SPLIT_RE = re.compile(r"[\s、。，．,.・/()（）「」\[\]:：;；!！?？\"'`]+")
+
+
+def normalize(text: str) -> str:
+    """全角/半角・大文字/小文字を揃える。"""
+    return unicodedata.normalize("NFKC", text or "").lower()
+
+
+def tokenize(text: str, n: int = NGRAM_SIZE) -> List[str]:
+    """文字 n-gram に分割する。n 文字未満の語はそのまま 1 トークンにする。"""
+    tokens: List[str] = []
+    for run in _SPLIT_RE.split(normalize(text)):
+        if not run:
+            continue
+        if len(run) < n:
+            tokens.append(run)
+            continue
+        tokens.extend(run[i:i + n] for i in range(len(run) - n + 1))
+    return tokens
+
+
+class SearchIndex:
+    """動物単位の転置インデックス（名前・農場ID・マイクロチップ・SOAP本文）。
+
+    文書は動物。1頭の動物には複数の「ソース」（動物情報そのもの、各診療記録）が
+    ぶら下がり、ソース単位で追加・削除できるので記録の更新に追従できる。
+    n-gram は候補の絞り込みにだけ使い、最後に検索語がどれかの項目の部分文字列かを確かめる
+    （別々の項目・記録にある n-gram の組み合わせでは一致させない）。
+    """
+
+    def __init__(self):
+        # token -> {animal_id: 重み付き出現数}
+        self._postings: Dict[str, Dict[str, float]] = {}
+        # (animal_id, source) -> {token: 重み付き出現数}
+        self._sources: Dict[Tuple[str, str], Dict[str, float]] = {}
+        # (animal_id, source) -> 正規化した項目テキスト（部分文字列の確認用）
+        self._texts: Dict[Tuple[str, str], List[str]] = {}
+        self._animal_sources: Dict[str, Set[str]] = {}
+
+    def __len__(self) -> int:
+        return len(self._animal_sources)
+
+    def add(self, animal_id: str, source: str, fields: Iterable[Tuple[str, Optional[str]]]) -> None:
+        """fields: (フィールド名, テキスト) の列。既存の同じソースは置き換える。"""
+        self.remove(animal_id, source)
+        weights: Dict[str, float] = {}
+        texts: List[str] = []
+        for field, text in fields:
+            if not text:
+                continue
+            w = FIELD_WEIGHTS.get(field, 1.0)
+            texts.append(normalize(str(text)))
+            for tok in tokenize(str(text)):
+                weights[tok] = weights.get(tok, 0.0) + w
+        self._animal_sources.setdefault(animal_id, set()).add(source)
+        if texts:
+            self._texts[(animal_id, source)] = texts
+        if not weights:
+            return
+        self._sources[(animal_id, source)] = weights
+        for tok, w in weights.items():
+            posting = self._postings.setdefault(tok, {})
+            posting[animal_id] = posting.get(animal_id, 0.0) + w
+
+    def remove(self, animal_id: str, source: str) -> None:
+        weights = self._sources.pop((animal_id, source), None)
+        self._texts.pop((animal_id, source), None)
+        sources = self._animal_sources.get(animal_id)
+        if sources is not None:
+            sources.discard(source)
+            if not sources:
+                del self._animal_sources[animal_id]
+        if not weights:
+            return
+        for tok, w in weights.items():
+            posting = self._postings.get(tok)
+            if posting is None:
+                continue
+            remaining = posting.get(animal_id, 0.0) - w
+            if remaining > 1e-9:
+                posting[animal_id] = remaining
+            else:
+                posting.pop(animal_id, None)
+                if not posting:
+                    del self._postings[tok]
+
+    def remove_animal(self, animal_id: str) -> None:
+        for source in list(self._animal_sources.get(animal_id, ())):
+            self.remove(animal_id, source)
+
+    def _postings_for(self, token: str) -> Dict[str, float]:
+        if len(token) >= NGRAM_SIZE:
+            return dict(self._postings.get(token) or {})
+        # 1文字の検索語は、その文字だけの語とその文字を含む n-gram をまとめて引く
+        merged: Dict[str, float] = {}
+        for key, p in list(self._postings.items()):
+            if token in key:
+                for animal_id, w in list(p.items()):
+                    merged[animal_id] = merged.get(animal_id, 0.0) + w
+        return merged
+
+    def _contains(self, animal_id: str, needle: str) -> bool:
+        for source in self._animal_sources.get(animal_id, ()):
+            for text in self._texts.get((animal_id, source), ()):
+                if needle in text:
+                    return True
+        return False
+
+    def search(self, query: str) -> List[Tuple[str, float]]:
+        """検索語を部分文字列として含む動物をスコア降順で返す（tf-idf をフィールド重みで加重）。"""
+        tokens = list(dict.fromkeys(tokenize(query)))
+        if not tokens:
+            return []
+        postings = [self._postings_for(tok) for tok in tokens]
+        if any(not p for p in postings):
+            return []
+        postings.sort(key=len)
+        total = max(len(self._animal_sources), 1)
+        scores: Dict[str, float] = {}
+        candidates = set(postings[0])
+        for p in postings[1:]:
+            candidates &= p.keys()
+            if not candidates:
+                return []
+        needle = normalize(query).strip()
+        candidates = {animal_id for animal_id in candidates if self._contains(animal_id, needle)}
+        for p in postings:
+            idf = math.log(1.0 + total / len(p))
+            for animal_id in candidates:
+                scores[animal_id] = scores.get(animal_id, 0.0) + p[animal_id] * idf
+        return sorted(scores.items(), key=lambda kv: kv[1], reverse=True)
@@ -0,0 +1,255 @@
+import os
+import random
+import re
+import threading
+import time
+from concurrent.futures import Future
+from typing import Callable, Dict, List, Optional, Tuple
+
+# まとめて書き込む行数の上限と、溜まった行を書き出すまでの最大待ち時間（秒）
+SHEETS_BATCH_SIZE = int(os.getenv("SHEETS_BATCH_SIZE", "50"))
+SHEETS_FLUSH_INTERVAL = float(os.getenv("SHEETS_FLUSH_INTERVAL", "1.0"))
+# クォータ超過(429)・一時的なサーバエラー時のリトライ
+SHEETS_MAX_RETRIES = int(os.getenv("SHEETS_MAX_RETRIES", "5"))
+SHEETS_RETRY_BASE_DELAY = float(os.getenv("SHEETS_RETRY_BASE_DELAY", "1.0"))
+
+_RETRYABLE_STATUS = {429, 500, 502, 503, 504}
+_ROW_RE = re.compile(r"!\$?[A-Za-z]+\$?(\d+)")
+
+
+def _is_retryable(error: Exception) -> bool:
+    status = getattr(getattr(error, "resp", None), "status", None)
+    try:
+        return int(status) in _RETRYABLE_STATUS
+    except (TypeError, ValueError):
+        return False
+
+
+def _first_row(response: dict) -> Optional[int]:
+    """append のレスポンス（updates.updatedRange）から書き込み先の先頭行番号を取り出す。"""
+    updated = ((response or {}).get("updates") or {}).get("updatedRange") or ""
+    m = _ROW_RE.search(updated)
+    return int(m.group(1)) if m else None
+
+
+class SheetsWriteQueue:
+    """Google Sheets への追記を溜めて、タブごとに複数行まとめて append する。
+
+    - 行数が SHEETS_BATCH_SIZE に達するか、SHEETS_FLUSH_INTERVAL 秒経過で書き出す
+    - urgent=True の行（STRICT_SHEETS_WRITE 時）は待たずにすぐ書き出す。
+      書き込み中に届いた行は次のバッチにまとめられる
+    - 429 / 5xx は指数バックオフでリトライ
+    - enqueue が返す Future は書き込まれた行番号（不明なら None）で完了する
+    """
+
+    def __init__(
+        self,
+        service_factory: Callable[[], object],
+        batch_size: int = SHEETS_BATCH_SIZE,
+        flush_interval: float = SHEETS_FLUSH_INTERVAL,
+        max_retries: int = SHEETS_MAX_RETRIES,
+        retry_base_delay: float = SHEETS_RETRY_BASE_DELAY,
+    ):
+        self._service_factory = service_factory
+        self.batch_size = max(1, batch_size)
+        self.flush_interval = max(0.0, flush_interval)
+        self.max_retries = max(0, max_retries)
+        self.retry_base_delay = retry_base_delay
+        self._cond = threading.Condition()
+        self._pending: List[Tuple[str, list, Future]] = []
+        self._oldest: Optional[float] = None
+        self._urgent = False
+        self._inflight = 0
+        self._stopping = False
+        self._thread: Optional[threading.Thread] = None
+
+    def _ensure_started(self) -> None:
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, name="sheets-writer", daemon=True)
+            self._thread.start()
+
+    def enqueue(self, tab: str, row: list, urgent: bool = False) -> Future:
+        future: Future = Future()
+        with self._cond:
+            self._ensure_started()
+            self._pending.append((tab, row, future))
+            if self._oldest is None:
+                self._oldest = time.monotonic()
+            if urgent:
+                self._urgent = True
+            self._cond.notify()
+        return future
+
+    def pending_count(self) -> int:
+        with self._cond:
+            return len(self._pending) + self._inflight
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """溜まっている行を書き出して完了を待つ。timeout 内に終われば True。"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            if self._pending:
+                # 何も溜まっていない時に立てると、次の通常の追記が1行だけで書き出されてしまう
+                self._ensure_started()
+                self._urgent = True
+                self._cond.notify_all()
+            while self._pending or self._inflight:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._cond.wait(remaining)
+        return True
+
+    def stop(self, timeout: Optional[float] = None) -> bool:
+        flushed = self.flush(timeout)
+        with self._cond:
+            self._stopping = True
+            self._cond.notify_all()
+        return flushed
+
+    def _ready(self) -> bool:
+        if not self._pending:
+            return False
+        if self._urgent or self._stopping or len(self._pending) >= self.batch_size:
+            return True
+        return self._oldest is not None and time.monotonic() - self._oldest >= self.flush_interval
+
+    def _run(self) -> None:
+        while True:
+            with self._cond:
+                while not self._ready():
+                    if self._stopping and not self._pending:
+                        return
+                    timeout = None
+                    if self._oldest is not None:
+                        timeout = max(0.0, self.flush_interval - (time.monotonic() - self._oldest))
+                    self._cond.wait(timeout)
+                batch = self._pending[:self.batch_size]
+                del self._pending[:self.batch_size]
+                self._oldest = time.monotonic() if self._pending else None
+                if not self._pending:
+                    self._urgent = False
+                self._inflight += len(batch)
+            try:
+                self._write(batch)
+            finally:
+                with self._cond:
+                    self._inflight -= len(batch)
+                    self._cond.notify_all()
+
+    def _write(self, batch: List[Tuple[str, list, Future]]) -> None:
+        by_tab: Dict[str, List[Tuple[list, Future]]] = {}
+        for tab, row, future in batch:
+            by_tab.setdefault(tab, []).append((row, future))
+        for tab, items in by_tab.items():
+            rows = [row for row, _ in items]
+            try:
+                first = self._append_with_retry(tab, rows)
+            except Exception as e:
+                print(f"[sheets] failed to append {len(rows)} row(s) to {tab}: {e}")
+                for _, future in items:
+                    future.set_exception(e)
+                continue
+            for i, (_, future) in enumerate(items):
+                future.set_result(first + i if first is not None else None)
+
+    def _append_with_retry(self, tab: str, rows: List[list]) -> Optional[int]:
+        attempt = 0
+        while True:
+            try:
+                service = self._service_factory()
+                response = service.spreadsheets().values().append(
+                    spreadsheetId=os.getenv("SPREADSHEET_ID"),
+                    range=f"{tab}!A1",
+                    valueInputOption="USER_ENTERED",
+                    insertDataOption="INSERT_ROWS",
+                    body={"values": rows},
+                ).execute()
+                return _first_row(response)
+            except Exception as e:
+                if attempt >= self.max_retries or not _is_retryable(e):
+                    raise
+                delay = self.retry_base_delay * (2 ** attempt) * (1 + random.random() * 0.25)
+                print(f"[sheets] retryable error on {tab} (attempt {attempt + 1}); retry in {delay:.1f}s: {e}")
+                time.sleep(delay)
+                attempt += 1
+
+
+class SheetsReplicator:
+    """主ストアに書いた更新・削除を Sheets に順番どおり複製する（専用スレッド1本）。
+
+    - 投入順に1件ずつ実行するので、同じ記録への更新→削除が入れ替わらない
+    - 失敗したものは先頭に残したまま指数バックオフで再試行する（後続も追い越さない）
+    - permanent(e) が True の失敗（Sheets に行が無い等）と、max_retries 回失敗したものは破棄する
+    """
+
+    def __init__(
+        self,
+        max_retries: int = SHEETS_MAX_RETRIES,
+        retry_base_delay: float = SHEETS_RETRY_BASE_DELAY,
+        max_delay: float = 60.0,
+        permanent: Callable[[Exception], bool] = lambda e: False,
+    ):
+        self.max_retries = max(0, max_retries)
+        self.retry_base_delay = retry_base_delay
+        self.max_delay = max_delay
+        self.permanent = permanent
+        self._cond = threading.Condition()
+        self._pending: List[Tuple[Callable, tuple]] = []
+        self._busy = False
+        self._thread: Optional[threading.Thread] = None
+
+    def submit(self, func: Callable, *args) -> None:
+        with self._cond:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="sheets-replicator", daemon=True)
+                self._thread.start()
+            self._pending.append((func, args))
+            self._cond.notify_all()
+
+    def pending_count(self) -> int:
+        with self._cond:
+            return len(self._pending)
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """溜まっている複製が終わるまで待つ。timeout 内に終われば True。"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            while self._pending or self._busy:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._cond.wait(remaining)
+        return True
+
+    def _run(self) -> None:
+        while True:
+            with self._cond:
+                while not self._pending:
+                    self._cond.wait()
+                func, args = self._pending[0]
+                self._busy = True
+            try:
+                self._call_with_retry(func, args)
+            finally:
+                with self._cond:
+                    self._pending.pop(0)
+                    self._busy = False
+                    self._cond.notify_all()
+
+    def _call_with_retry(self, func: Callable, args: tuple) -> None:
+        label = f"{getattr(func, '__name__', func)}{args[:1]}"
+        attempt = 0
+        while True:
+            try:
+                func(*args)
+                return
+            except Exception as e:
+                detail = getattr(e, "detail", None) or e
+                if self.permanent(e) or attempt >= self.max_retries:
+                    print(f"[sheets] replication of {label} dropped after {attempt + 1} attempt(s): {detail}")
+                    return
+                delay = min(self.max_delay, self.retry_base_delay * (2 ** attempt)) * (1 + random.random() * 0.25)
+                print(f"[sheets] replication of {label} failed (attempt {attempt + 1}); retry in {delay:.1f}s: {detail}")
+                time.sleep(delay)
+                attempt += 1
@@ -0,0 +1,138 @@
+import gzip
+import hashlib
+import json
+import os
+import time
+from pathlib import Path
+from typing import Optional
+
+from google_clients import get_storage_client
+from schemas import Animal, Record
+
+# 起動高速化用の DB スナップショット。ローカルパスまたは gs://<bucket>/<key>
+# （Render の無料プランなどインスタンスのディスクが再起動で消える環境では GCS を指定する）
+DB_SNAPSHOT_PATH = os.getenv("DB_SNAPSHOT_PATH", "db_snapshot.json.gz")
+# Sheets から最後に全件読んでからこれだけ経ったスナップショットは使わずに、全件読み込み直す
+DB_SNAPSHOT_MAX_AGE_SECONDS = float(os.getenv("DB_SNAPSHOT_MAX_AGE_SECONDS", str(7 * 24 * 60 * 60)))
+# 変更があった場合にスナップショットを書き直す間隔（秒）
+DB_SNAPSHOT_INTERVAL = float(os.getenv("DB_SNAPSHOT_INTERVAL", "300"))
+
+# 保存形式を変えたら上げる（2: pickle をやめて gzip 圧縮した JSON に変更、
+# 3: Sheets の行ハッシュと全件読み込みの時刻を追加）
+SNAPSHOT_FORMAT = 3
+
+
+def _schema_hash() -> str:
+    """モデルの項目構成。項目が増減したら古いスナップショットは読まない。"""
+    fields = ",".join(sorted(Animal.model_fields)) + "|" + ",".join(sorted(Record.model_fields))
+    return hashlib.sha256(fields.encode("utf-8")).hexdigest()[:16]
+
+
+def snapshot_stamp(spreadsheet_id: Optional[str], animals_tab: str, records_tab: str) -> dict:
+    """スナップショットの版情報。読み込み時に現在の設定と一致しなければ破棄する。"""
+    return {
+        "format": SNAPSHOT_FORMAT,
+        "schema": _schema_hash(),
+        "spreadsheet_id": spreadsheet_id,
+        "tabs": [animals_tab, records_tab],
+    }
+
+
+def _split_gcs(path: str):
+    bucket, _, key = path[len("gs://"):].partition("/")
+    return bucket, key
+
+
+def _read(path: str) -> Optional[bytes]:
+    if path.startswith("gs://"):
+        client = get_storage_client()
+        if client is None:
+            raise RuntimeError("google-cloud-storage is not available")
+        bucket, key = _split_gcs(path)
+        blob = client.bucket(bucket).blob(key)
+        if not blob.exists():
+            return None
+        return blob.download_as_bytes()
+    p = Path(path)
+    return p.read_bytes() if p.exists() else None
+
+
+def _write(path: str, data: bytes) -> None:
+    if path.startswith("gs://"):
+        client = get_storage_client()
+        if client is None:
+            raise RuntimeError("google-cloud-storage is not available")
+        bucket, key = _split_gcs(path)
+        client.bucket(bucket).blob(key).upload_from_string(data, content_type="application/octet-stream")
+        return
+    # 書き込み途中で落ちても壊れたファイルを残さないよう、一時ファイルから置き換える
+    tmp = Path(f"{path}.tmp")
+    tmp.write_bytes(data)
+    os.replace(tmp, path)
+
+
+def _encode_state(state: dict) -> dict:
+    return {
+        "animals": {animal_id: animal.model_dump(mode="json") for animal_id, animal in state["animals"].items()},
+        "sheet_rows": state["sheet_rows"],
+        "marks": state["marks"],
+        "sheet_hashes": state["sheet_hashes"],
+        "loaded_at": state["loaded_at"],
+    }
+
+
+def _decode_state(data: dict) -> dict:
+    # モデルの検証を通すので、任意のオブジェクトは復元されない（pickle と違いコードは実行されない）
+    return {
+        "animals": {animal_id: Animal.model_validate(animal) for animal_id, animal in data["animals"].items()},
+        "sheet_rows": {str(record_id): int(row) for record_id, row in data["sheet_rows"].items()},
+        "marks": {str(tab): int(row) for tab, row in data["marks"].items()},
+        "sheet_hashes": {
+            str(tab): {str(key): str(h) for key, h in hashes.items()}
+            for tab, hashes in data["sheet_hashes"].items()
+        },
+        "loaded_at": float(data["loaded_at"]),
+    }
+
+
+def save_snapshot(stamp: dict, state: dict, path: str = DB_SNAPSHOT_PATH) -> int:
+    """state（animals / 行番号など）を版情報付きで保存し、書き込んだバイト数を返す。
+
+    state["loaded_at"] は Sheets から最後に全件読んだ時刻。保存し直してもこれは変えないので、
+    差分の取り込みだけを続けたスナップショットも DB_SNAPSHOT_MAX_AGE_SECONDS で読み直しになる。
+    """
+    payload = {"stamp": stamp, "created_at": time.time(), "state": _encode_state(state)}
+    data = gzip.compress(json.dumps(payload, ensure_ascii=False, separators=(",", ":")).encode("utf-8"))
+    _write(path, data)
+    return len(data)
+
+
+def load_snapshot(stamp: dict, path: str = DB_SNAPSHOT_PATH, max_age: float = DB_SNAPSHOT_MAX_AGE_SECONDS) -> Optional[dict]:
+    """版情報が一致し、max_age 以内のスナップショットの state を返す。使えなければ None。"""
+    try:
+        data = _read(path)
+    except Exception as e:
+        print(f"[snapshot] read failed ({path}): {e}")
+        return None
+    if data is None:
+        return None
+    try:
+        payload = json.loads(gzip.decompress(data).decode("utf-8"))
+        if not isinstance(payload, dict):
+            raise ValueError("snapshot is not a JSON object")
+    except Exception as e:
+        print(f"[snapshot] unreadable snapshot ignored ({path}): {e}")
+        return None
+    if payload.get("stamp") != stamp:
+        print("[snapshot] snapshot version/config mismatch; ignoring")
+        return None
+    try:
+        state = _decode_state(payload["state"])
+    except Exception as e:
+        print(f"[snapshot] invalid snapshot contents ignored ({path}): {e}")
+        return None
+    age = time.time() - state["loaded_at"]
+    if age > max_age:
+        print(f"[snapshot] last full load from Sheets was {age / 3600:.1f}h ago; ignoring")
+        return None
+    return state
@@ -0,0 +1,166 @@
+import sqlite3
+import threading
+import time
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from schemas import Animal, Record
+
+_SCHEMA = (
+    "CREATE TABLE IF NOT EXISTS animals ("
+    " id TEXT PRIMARY KEY, microchip_number TEXT NOT NULL, farm_id TEXT, name TEXT NOT NULL,"
+    " sex TEXT, breed TEXT, data TEXT NOT NULL, updated_at REAL NOT NULL)",
+    "CREATE TABLE IF NOT EXISTS records ("
+    " id TEXT PRIMARY KEY, animal_id TEXT NOT NULL, visit_date TEXT, next_visit_date TEXT,"
+    " doctor TEXT, data TEXT NOT NULL, updated_at REAL NOT NULL)",
+    "CREATE INDEX IF NOT EXISTS animals_microchip ON animals (microchip_number)",
+    "CREATE INDEX IF NOT EXISTS animals_farm ON animals (farm_id)",
+    "CREATE INDEX IF NOT EXISTS records_animal ON records (animal_id)",
+    "CREATE INDEX IF NOT EXISTS records_next_visit ON records (next_visit_date)",
+    # Sheets にまだ複製していない書き込み（主ストアへの書き込みと同じトランザクションで追加し、複製できたら消す）
+    "CREATE TABLE IF NOT EXISTS sheets_outbox ("
+    " id TEXT PRIMARY KEY, op TEXT NOT NULL, key TEXT NOT NULL, data TEXT, created_at REAL NOT NULL)",
+)
+
+
+class SQLiteStore:
+    """動物・診療記録の永続ストア（SQLite / WAL）。
+
+    各行はモデル全体を JSON で持ち（Sheets の列に無い投薬情報なども失わない）、
+    検索に使う項目だけを列として持ってインデックスを張る。並び順は挿入順（rowid）。
+    書き込みはすべて1接続・1ロックで直列化する。
+
+    書き込みに outbox_id を渡すと、同じトランザクションで sheets_outbox にも1行追加する
+    （Sheets への複製が終わったら outbox_done で消す。残っていれば次回起動時に pending_outbox から再実行する）。
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        # WAL では NORMAL でもクラッシュ時に DB は壊れない（直前のコミットのみ失われうる）
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        for statement in _SCHEMA:
+            self._db.execute(statement)
+        self._db.commit()
+
+    @staticmethod
+    def _animal_params(animal: Animal) -> tuple:
+        return (
+            animal.id,
+            animal.microchip_number,
+            getattr(animal, "farm_id", None),
+            animal.name,
+            getattr(animal, "sex", None),
+            getattr(animal, "breed", None),
+            animal.model_dump_json(exclude={"records"}),
+            time.time(),
+        )
+
+    @staticmethod
+    def _record_params(record: Record) -> tuple:
+        return (
+            record.id,
+            record.animalId,
+            record.visit_date,
+            record.next_visit_date,
+            getattr(record, "doctor", None),
+            record.model_dump_json(),
+            time.time(),
+        )
+
+    def load_animals(self) -> Dict[str, Animal]:
+        """全件を読み込む（動物・記録とも挿入順）。"""
+        with self._lock:
+            animal_rows = self._db.execute("SELECT data FROM animals ORDER BY rowid").fetchall()
+            record_rows = self._db.execute("SELECT animal_id, data FROM records ORDER BY rowid").fetchall()
+        animals: Dict[str, Animal] = {}
+        for (data,) in animal_rows:
+            animal = Animal.model_validate_json(data)
+            animal.records = []
+            animals[animal.id] = animal
+        for animal_id, data in record_rows:
+            animal = animals.get(animal_id)
+            if animal is not None:
+                animal.records.append(Record.model_validate_json(data))
+        return animals
+
+    def count(self) -> int:
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM animals").fetchone()[0]
+
+    def _add_outbox(self, outbox_id: Optional[str], op: str, key: str, data: Optional[str]) -> None:
+        if outbox_id is not None:
+            self._db.execute(
+                "INSERT INTO sheets_outbox (id, op, key, data, created_at) VALUES (?, ?, ?, ?, ?)",
+                (outbox_id, op, key, data, time.time()),
+            )
+
+    def pending_outbox(self) -> List[Tuple[str, str, str, Optional[str]]]:
+        """複製が終わっていない書き込み (id, op, key, data) を書き込んだ順に返す。"""
+        with self._lock:
+            return self._db.execute("SELECT id, op, key, data FROM sheets_outbox ORDER BY rowid").fetchall()
+
+    def outbox_done(self, outbox_id: str) -> None:
+        with self._lock, self._db:
+            self._db.execute("DELETE FROM sheets_outbox WHERE id = ?", (outbox_id,))
+
+    def save_animal(self, animal: Animal, outbox_id: Optional[str] = None) -> None:
+        """動物を追加（同じ id があれば上書き。並び順は変えない）。"""
+        with self._lock, self._db:
+            self._db.execute(
+                "INSERT INTO animals (id, microchip_number, farm_id, name, sex, breed, data, updated_at)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?, ?)"
+                " ON CONFLICT(id) DO UPDATE SET microchip_number = excluded.microchip_number,"
+                " farm_id = excluded.farm_id, name = excluded.name, sex = excluded.sex,"
+                " breed = excluded.breed, data = excluded.data, updated_at = excluded.updated_at",
+                self._animal_params(animal),
+            )
+            self._add_outbox(outbox_id, "save_animal", animal.id, animal.model_dump_json(exclude={"records"}))
+
+    def save_record(self, record: Record, outbox_id: Optional[str] = None) -> None:
+        with self._lock, self._db:
+            params = self._record_params(record)
+            self._db.execute(
+                "INSERT INTO records (id, animal_id, visit_date, next_visit_date, doctor, data, updated_at)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?)",
+                params,
+            )
+            self._add_outbox(outbox_id, "save_record", record.id, params[5])
+
+    def update_record(self, record_id: str, record: Record, outbox_id: Optional[str] = None) -> bool:
+        """record_id の記録を置き換える（id の変更も可）。該当がなければ False。"""
+        with self._lock, self._db:
+            params = self._record_params(record)
+            cur = self._db.execute(
+                "UPDATE records SET id = ?, animal_id = ?, visit_date = ?, next_visit_date = ?, doctor = ?,"
+                " data = ?, updated_at = ? WHERE id = ?",
+                (*params, record_id),
+            )
+            if cur.rowcount == 0:
+                return False
+            self._add_outbox(outbox_id, "update_record", record_id, params[5])
+            return True
+
+    def delete_record(self, record_id: str, outbox_id: Optional[str] = None) -> bool:
+        with self._lock, self._db:
+            cur = self._db.execute("DELETE FROM records WHERE id = ?", (record_id,))
+            if cur.rowcount == 0:
+                return False
+            self._add_outbox(outbox_id, "delete_record", record_id, None)
+            return True
+
+    def import_animals(self, animals: Iterable[Animal]) -> None:
+        """動物と記録をまとめて取り込む（初回の Sheets からの移行用。1トランザクション）。"""
+        with self._lock, self._db:
+            for animal in animals:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO animals (id, microchip_number, farm_id, name, sex, breed, data, updated_at)"
+                    " VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                    self._animal_params(animal),
+                )
+                self._db.executemany(
+                    "INSERT OR REPLACE INTO records (id, animal_id, visit_date, next_visit_date, doctor, data, updated_at)"
+                    " VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    [self._record_params(r) for r in getattr(animal, "records", None) or []],
+                )
@@ -1,17 +1,108 @@
+import hashlib
+import io
 import os
 import uuid
-from typing import Tuple, Optional
+from typing import BinaryIO, Dict, Tuple, Optional
 from pathlib import Path
 
+import aiofiles
+from fastapi import UploadFile
+
+from executors import run_in
+from google_clients import get_storage_client
+
 # ファイルアップロード用のディレクトリ
 UPLOAD_DIR = "uploads"
 GCS_BUCKET_NAME = os.getenv("GCS_BUCKET_NAME")
 GCS_BASE_URL = os.getenv("GCS_BASE_URL")  # 例: https://storage.googleapis.com/<bucket>
+# 1 にすると GCS のファイルにも /uploads/<名前> の URL を返し、配信時に署名付き URL へリダイレクトする（非公開バケット用）
+GCS_SIGNED_URLS = os.getenv("GCS_SIGNED_URLS", "0") == "1"
+# 保存名は uuid か内容ハッシュで、同じ名前の中身は変わらない
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+# アップロードを読み書きする単位。ファイル全体をメモリに載せない
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+# GCS の再開可能アップロードで1リクエストに送る量（256KB の倍数）
+GCS_UPLOAD_CHUNK_SIZE = int(os.getenv("GCS_UPLOAD_CHUNK_SIZE", str(8 * 1024 * 1024)))
+# 保存するファイルの名前は内容の SHA-256（先頭32桁）。同じ内容の再アップロードは既存のファイルを使い回す
+CONTENT_KEY_LENGTH = 32
+# 1ファイルあたりの上限（バイト）
+MAX_AUDIO_UPLOAD_BYTES = int(os.getenv("MAX_AUDIO_UPLOAD_BYTES", str(25 * 1024 * 1024)))
+MAX_IMAGE_UPLOAD_BYTES = int(os.getenv("MAX_IMAGE_UPLOAD_BYTES", str(25 * 1024 * 1024)))
+
+# 画像は元ファイルの代わりに派生サイズ（WebP・EXIF 除去済み）を保存する。0 で元ファイルのまま保存
+IMAGE_DERIVATIVES = os.getenv("IMAGE_DERIVATIVES", "1") == "1"
+# 派生サイズごとの長辺の上限（px）。full は元の解像度のまま（上限を超える場合だけ縮小）
+IMAGE_VARIANTS: Dict[str, int] = {
+    "thumb": int(os.getenv("IMAGE_THUMB_SIZE", "320")),
+    "medium": int(os.getenv("IMAGE_MEDIUM_SIZE", "1280")),
+    "full": int(os.getenv("IMAGE_FULL_MAX_SIZE", "4096")),
+}
+IMAGE_WEBP_QUALITY = int(os.getenv("IMAGE_WEBP_QUALITY", "80"))
+# 派生画像のキーは "<stem>.<variant>.webp"。記録には full の URL を保存し、他のサイズは名前から求める
+_VARIANT_SUFFIX = ".webp"
+
+
+class UploadTooLarge(ValueError):
+    """アップロードが上限を超えた（読み込み・書き出しの途中で打ち切った）。"""
+
+    def __init__(self, limit: int):
+        super().__init__(f"upload exceeds {limit} bytes")
+        self.limit = limit
+
+
+class _LimitedReader:
+    """読んだ量が上限を超えたら UploadTooLarge を投げるファイルラッパー（GCS へのストリーム用）。"""
+
+    def __init__(self, fileobj: BinaryIO, limit: Optional[int]):
+        self._fileobj = fileobj
+        self._limit = limit
+
+    def read(self, size: int = -1) -> bytes:
+        chunk = self._fileobj.read(size)
+        if self._limit is not None and self._fileobj.tell() > self._limit:
+            raise UploadTooLarge(self._limit)
+        return chunk
+
+    def tell(self) -> int:
+        return self._fileobj.tell()
+
+    def seek(self, offset: int, whence: int = 0) -> int:
+        # 再開可能アップロードの再送時に使われる
+        return self._fileobj.seek(offset, whence)
+
+def _gcs_url(blob, key: str) -> str:
+    """GCS に保存したファイル（key は uploads/<名前>）の URL。"""
+    if GCS_SIGNED_URLS:
+        return f"/{key}"
+    return f"{GCS_BASE_URL}/{key}" if GCS_BASE_URL else blob.public_url
 
 def ensure_upload_dir():
     """アップロードディレクトリが存在することを確認"""
     Path(UPLOAD_DIR).mkdir(exist_ok=True)
 
+def content_key(digest: str, filename: str) -> str:
+    """内容のハッシュ（16進）と元のファイル名の拡張子から保存名を作る。"""
+    return f"{digest[:CONTENT_KEY_LENGTH]}{Path(filename).suffix.lower()}"
+
+def _hash_file(fileobj: BinaryIO, max_bytes: Optional[int] = None) -> Tuple[str, int]:
+    """ファイルオブジェクトを先頭から読んで (SHA-256, サイズ) を返し、先頭に戻す。
+
+    max_bytes を超えた時点で UploadTooLarge を投げる。
+    """
+    fileobj.seek(0)
+    h = hashlib.sha256()
+    size = 0
+    while True:
+        chunk = fileobj.read(UPLOAD_CHUNK_SIZE)
+        if not chunk:
+            break
+        size += len(chunk)
+        if max_bytes is not None and size > max_bytes:
+            raise UploadTooLarge(max_bytes)
+        h.update(chunk)
+    fileobj.seek(0)
+    return h.hexdigest(), size
+
 def _save_file_local(data: bytes, filename: str) -> Tuple[str, str]:
     """
     ファイルをローカルのuploadsディレクトリに保存し、URLとキーを返す
@@ -25,44 +116,37 @@ def _save_file_local(data: bytes, filename: str) -> Tuple[str, str]:
     """
     ensure_upload_dir()
     
-    # 一意のファイル名を生成
-    file_extension = Path(filename).suffix
-    unique_filename = f"{uuid.uuid4().hex}{file_extension}"
+    # 内容から名前を決める（同じ内容なら同じ名前）
+    key = content_key(hashlib.sha256(data).hexdigest(), filename)
     
     # ファイルパス
-    file_path = Path(UPLOAD_DIR) / unique_filename
+    file_path = Path(UPLOAD_DIR) / key
     
-    # ファイルを保存
-    with open(file_path, 'wb') as f:
-        f.write(data)
+    # 同じ内容が保存済みなら書き込まない
+    if not file_path.exists():
+        part_path = file_path.with_name(f".{uuid.uuid4().hex}.part")
+        with open(part_path, 'wb') as f:
+            f.write(data)
+        os.replace(part_path, file_path)
     
     # URLとキーを返す
-    url = f"/uploads/{unique_filename}"
-    key = unique_filename
-    
-    return url, key
+    return f"/uploads/{key}", key
 
 def _save_file_gcs(data: bytes, filename: str) -> Optional[Tuple[str, str]]:
     """GCS に保存（利用可能な場合）。利用不可なら None を返す。"""
-    try:
-        from google.cloud import storage  # type: ignore
-    except Exception:
-        return None
     bucket_name = GCS_BUCKET_NAME
     if not bucket_name:
         return None
-    client = storage.Client()  # 認証は GOOGLE_APPLICATION_CREDENTIALS 等に依存
+    client = get_storage_client()  # 共有クライアント（コネクションプールを使い回す）
+    if client is None:
+        return None
     bucket = client.bucket(bucket_name)
-    ext = Path(filename).suffix
-    key = f"uploads/{uuid.uuid4().hex}{ext}"
+    key = f"uploads/{content_key(hashlib.sha256(data).hexdigest(), filename)}"
     blob = bucket.blob(key)
-    blob.upload_from_string(data)
-    # URL 生成
-    if GCS_BASE_URL:
-        url = f"{GCS_BASE_URL}/{key}"
-    else:
-        url = blob.public_url
-    return url, key
+    if not blob.exists():
+        blob.cache_control = IMMUTABLE_CACHE_CONTROL
+        blob.upload_from_string(data)
+    return _gcs_url(blob, key), key
 
 def save_file(data: bytes, filename: str) -> Tuple[str, str]:
     """環境に応じて GCS or ローカルに保存。"""
@@ -71,6 +155,202 @@ def save_file(data: bytes, filename: str) -> Tuple[str, str]:
         return g
     return _save_file_local(data, filename)
 
+def _save_stream_gcs(fileobj: BinaryIO, filename: str, content_type: Optional[str], max_bytes: Optional[int]) -> Optional[Tuple[str, str]]:
+    """ファイルオブジェクトを GCS へ再開可能アップロードで送る。GCS が使えなければ None。"""
+    if not GCS_BUCKET_NAME:
+        return None
+    client = get_storage_client()
+    if client is None:
+        return None
+    # 名前を決めるために先にハッシュを取る（受信済みの一時ファイルを読むだけで、上限もここで確認する）
+    digest, size = _hash_file(fileobj, max_bytes)
+    key = f"uploads/{content_key(digest, filename)}"
+    blob = client.bucket(GCS_BUCKET_NAME).blob(key)
+    if blob.exists():
+        print(f"[storage] {filename}: same content already stored as {key}; upload skipped")
+    else:
+        # chunk_size を指定すると、サイズ不明のストリームでも分割して送る再開可能アップロードになる
+        # 同じ内容の同時アップロードで上書きし合っても中身は同じ
+        blob.chunk_size = GCS_UPLOAD_CHUNK_SIZE
+        blob.cache_control = IMMUTABLE_CACHE_CONTROL
+        blob.upload_from_file(_LimitedReader(fileobj, max_bytes), content_type=content_type, size=size)
+    return _gcs_url(blob, key), key
+
+async def _save_upload_local(upload: UploadFile, filename: str, max_bytes: Optional[int]) -> Tuple[str, str]:
+    ensure_upload_dir()
+    # 書き込み途中のファイルが配信されないよう、一時名で書きながらハッシュを取り、内容から決めた名前に置き換える
+    part_path = Path(UPLOAD_DIR) / f".{uuid.uuid4().hex}.part"
+    h = hashlib.sha256()
+    size = 0
+    try:
+        async with aiofiles.open(part_path, "wb") as f:
+            while True:
+                chunk = await upload.read(UPLOAD_CHUNK_SIZE)
+                if not chunk:
+                    break
+                size += len(chunk)
+                if max_bytes is not None and size > max_bytes:
+                    raise UploadTooLarge(max_bytes)
+                h.update(chunk)
+                await f.write(chunk)
+        key = content_key(h.hexdigest(), filename)
+        file_path = Path(UPLOAD_DIR) / key
+        if file_path.exists():
+            # 同じ内容が保存済み（再送など）。既存のファイルを使う
+            print(f"[storage] {filename}: same content already stored as {key}")
+            part_path.unlink()
+        else:
+            os.replace(part_path, file_path)
+    except BaseException:
+        part_path.unlink(missing_ok=True)
+        raise
+    return f"/uploads/{key}", key
+
+async def save_upload(upload: UploadFile, filename: str, max_bytes: Optional[int] = None) -> Tuple[str, str]:
+    """UploadFile をチャンクごとに GCS（再開可能アップロード）またはローカルへ書き出す。
+
+    max_bytes を超えた時点で UploadTooLarge を投げ、書きかけのファイルは残さない。
+    保存名は内容のハッシュなので、同じ内容なら既存のファイルと同じ (URL, key) を返す。
+    戻り値は save_file と同じ (URL, key)。
+    """
+    await upload.seek(0)
+    g = await run_in("storage", _save_stream_gcs, upload.file, filename, upload.content_type, max_bytes)
+    if g is not None:
+        return g
+    return await _save_upload_local(upload, filename, max_bytes)
+
+async def read_upload(upload: UploadFile, max_bytes: int) -> bytes:
+    """アップロードを読み込む。上限を超えた時点で読むのをやめて UploadTooLarge を投げる。"""
+    chunks = []
+    size = 0
+    while True:
+        chunk = await upload.read(UPLOAD_CHUNK_SIZE)
+        if not chunk:
+            break
+        size += len(chunk)
+        if size > max_bytes:
+            raise UploadTooLarge(max_bytes)
+        chunks.append(chunk)
+    return b"".join(chunks)
+
+def _stored_url(key: str) -> Optional[str]:
+    """キーのファイルが保存済みならその URL、無ければ None（GCS が使えればそちらを見る）。"""
+    client = get_storage_client() if GCS_BUCKET_NAME else None
+    if client is not None:
+        blob = client.bucket(GCS_BUCKET_NAME).blob(f"uploads/{key}")
+        if not blob.exists():
+            return None
+        return _gcs_url(blob, f"uploads/{key}")
+    return f"/uploads/{key}" if (Path(UPLOAD_DIR) / key).exists() else None
+
+def _store_bytes(key: str, data: bytes, content_type: str) -> str:
+    """キーを指定して保存し、URL を返す（GCS が使えればそちら）。"""
+    client = get_storage_client() if GCS_BUCKET_NAME else None
+    if client is not None:
+        blob = client.bucket(GCS_BUCKET_NAME).blob(f"uploads/{key}")
+        blob.cache_control = IMMUTABLE_CACHE_CONTROL
+        blob.upload_from_string(data, content_type=content_type)
+        return _gcs_url(blob, f"uploads/{key}")
+    ensure_upload_dir()
+    file_path = Path(UPLOAD_DIR) / key
+    part_path = file_path.with_name(f".{uuid.uuid4().hex}.part")
+    part_path.write_bytes(data)
+    os.replace(part_path, file_path)
+    return f"/uploads/{key}"
+
+def render_image_variants(fileobj: BinaryIO) -> Optional[Dict[str, bytes]]:
+    """画像を IMAGE_VARIANTS の各サイズの WebP に変換する。画像として読めなければ None。
+
+    EXIF の向きは画素に反映してから捨てる（位置情報などのメタデータは出力に含めない）。
+    CPU を使うので executors の "image" プールから呼ぶこと。
+    """
+    try:
+        from PIL import Image, ImageOps
+    except ImportError:
+        return None
+    try:
+        with Image.open(fileobj) as opened:
+            image = ImageOps.exif_transpose(opened)
+            image.load()
+    except Exception as e:
+        print(f"[image] not an image or unreadable; storing original: {e}")
+        return None
+    # WebP が扱えるモードに揃える（透過は残す）
+    has_alpha = image.mode in ("RGBA", "LA", "PA") or (image.mode == "P" and "transparency" in image.info)
+    image = image.convert("RGBA" if has_alpha else "RGB")
+    variants: Dict[str, bytes] = {}
+    for name, max_edge in IMAGE_VARIANTS.items():
+        sized = image.copy()
+        # thumbnail は縦横比を保ち、元より大きくはしない
+        sized.thumbnail((max_edge, max_edge), Image.LANCZOS)
+        buf = io.BytesIO()
+        sized.save(buf, format="WEBP", quality=IMAGE_WEBP_QUALITY, method=4)
+        variants[name] = buf.getvalue()
+    return variants
+
+def _image_stem(digest: str) -> str:
+    """派生画像の名前。元画像の内容に加えて変換設定も含める（設定を変えたら作り直す）。"""
+    settings = f"{sorted(IMAGE_VARIANTS.items())}|{IMAGE_WEBP_QUALITY}"
+    return hashlib.sha256(f"{digest}|{settings}".encode("utf-8")).hexdigest()[:CONTENT_KEY_LENGTH]
+
+def _find_image_variants(stem: str) -> Optional[Dict[str, str]]:
+    """同じ画像の派生サイズがすべて保存済みならその URL を返す。"""
+    urls = {}
+    for name in IMAGE_VARIANTS:
+        url = _stored_url(f"{stem}.{name}{_VARIANT_SUFFIX}")
+        if url is None:
+            return None
+        urls[name] = url
+    return urls
+
+def _save_image_variants(stem: str, variants: Dict[str, bytes]) -> Dict[str, str]:
+    return {
+        name: _store_bytes(f"{stem}.{name}{_VARIANT_SUFFIX}", data, "image/webp")
+        for name, data in variants.items()
+    }
+
+async def save_image_upload(
+    upload: UploadFile, filename: str, max_bytes: Optional[int] = None
+) -> Tuple[str, str, Dict[str, str]]:
+    """画像を派生サイズ（thumb / medium / full の WebP）にして保存する。
+
+    戻り値は (full の URL, full のキー, {サイズ名: URL})。画像として読めない場合や
+    IMAGE_DERIVATIVES=0 の場合は save_upload で元ファイルを保存し、サイズ名の dict は空。
+    同じ画像の派生サイズが保存済みなら変換せずにそれを返す。
+    """
+    if IMAGE_DERIVATIVES:
+        await upload.seek(0)
+        digest, size = await run_in("storage", _hash_file, upload.file, max_bytes)
+        stem = _image_stem(digest)
+        urls = await run_in("storage", _find_image_variants, stem)
+        if urls is not None:
+            print(f"[image] {filename}: same image already stored as {stem}; conversion skipped")
+            return urls["full"], f"{stem}.full{_VARIANT_SUFFIX}", urls
+        variants = await run_in("image", render_image_variants, upload.file)
+        if variants:
+            urls = await run_in("storage", _save_image_variants, stem, variants)
+            print(
+                f"[image] {filename}: {size} bytes -> "
+                + ", ".join(f"{name} {len(data)}" for name, data in variants.items())
+            )
+            return urls["full"], f"{stem}.full{_VARIANT_SUFFIX}", urls
+    url, key = await save_upload(upload, filename, max_bytes=max_bytes)
+    return url, key, {}
+
+def variant_url(url: Optional[str], variant: str) -> Optional[str]:
+    """派生画像の URL（またはキー・ファイル名）を別のサイズのものに置き換える。
+
+    派生画像でないもの（以前に保存した元ファイルなど）はそのまま返す。
+    """
+    if not url or variant not in IMAGE_VARIANTS:
+        return url
+    head, sep, query = url.partition("?")
+    for name in IMAGE_VARIANTS:
+        suffix = f".{name}{_VARIANT_SUFFIX}"
+        if head.endswith(suffix):
+            return head[: -len(suffix)] + f".{variant}{_VARIANT_SUFFIX}" + sep + query
+    return url
+
 def delete_file(key: str) -> bool:
     """
     ファイルを削除する
@@ -91,14 +371,17 @@ def delete_file(key: str) -> bool:
         print(f"ファイル削除エラー: {e}")
         return False
 
-def get_file_url(key: str) -> str:
+def get_file_url(key: str, variant: Optional[str] = None) -> str:
     """
     ファイルキーからURLを生成する
     
     Args:
         key: ファイルのキー
+        variant: 画像の派生サイズ（thumb / medium / full）。派生画像でないキーでは無視
         
     Returns:
         str: ファイルのURL
     """
+    if variant:
+        key = variant_url(key, variant)
     return f"/uploads/{key}"
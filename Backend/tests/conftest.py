@@ -0,0 +1,12 @@
+import os
+import sys
+from pathlib import Path
+
+# テストは Sheets / Google API に接続しない（インメモリDBのみ）
+os.environ.setdefault("LOCAL_DEV", "1")
+os.environ.setdefault("STARTUP_WARMUP", "0")
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BACKEND_DIR))
+# main.py などは Backend を作業ディレクトリとして相対パスを使う
+os.chdir(BACKEND_DIR)
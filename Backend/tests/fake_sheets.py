@@ -0,0 +1,111 @@
+import re
+import threading
+
+_RANGE = re.compile(r"^([^!]+)!([A-Z]+)(\d*)(?::([A-Z]+)(\d*))?$")
+
+
+def _column(letters: str) -> int:
+    n = 0
+    for c in letters:
+        n = n * 26 + ord(c) - ord("A") + 1
+    return n - 1
+
+
+def _cell(value) -> str:
+    # null は空セルとして書かれる
+    return "" if value is None else str(value)
+
+
+class _Request:
+    def __init__(self, func):
+        self._func = func
+
+    def execute(self):
+        return self._func()
+
+
+class FakeSpreadsheet:
+    """spreadsheets().values() の get / update / clear / append だけを持つ Sheets API の代わり。
+
+    タブごとに行（1 行目はヘッダ）を保持する。読み出しは実際の API と同じく、
+    末尾の空セル・空行を詰めて返す。
+    """
+
+    def __init__(self, **tabs):
+        self.tabs = {name: [list(row) for row in rows] for name, rows in tabs.items()}
+        self.calls = []
+        self._lock = threading.Lock()
+
+    def spreadsheets(self):
+        return self
+
+    def values(self):
+        return self
+
+    def _parse(self, range_):
+        m = _RANGE.match(range_)
+        if m is None:
+            raise ValueError(f"unsupported range {range_}")
+        tab, col1, row1, col2, row2 = m.groups()
+        rows = self.tabs.setdefault(tab, [])
+        first_row = int(row1) if row1 else 1
+        first_col = _column(col1)
+        if col2 is None:
+            # "B7"（1セル）または "B"（1列）
+            return rows, first_row, first_row if row1 else None, first_col, first_col
+        return rows, first_row, int(row2) if row2 else None, first_col, _column(col2)
+
+    def get(self, spreadsheetId, range):
+        def run():
+            with self._lock:
+                self.calls.append(("get", range))
+                rows, first_row, last_row, first_col, last_col = self._parse(range)
+                end = len(rows) if last_row is None else min(last_row, len(rows))
+                values = []
+                for row in rows[first_row - 1:end]:
+                    cells = row[first_col:None if last_col is None else last_col + 1]
+                    while cells and cells[-1] in ("", None):
+                        cells = cells[:-1]
+                    values.append(list(cells))
+                while values and not values[-1]:
+                    values.pop()
+                return {"values": values} if values else {}
+        return _Request(run)
+
+    def update(self, spreadsheetId, range, valueInputOption, body):
+        def run():
+            with self._lock:
+                self.calls.append(("update", range))
+                rows, first_row, _, first_col, _ = self._parse(range)
+                for offset, values in enumerate(body["values"]):
+                    while len(rows) < first_row + offset:
+                        rows.append([])
+                    row = rows[first_row + offset - 1]
+                    row.extend([""] * (first_col + len(values) - len(row)))
+                    row[first_col:first_col + len(values)] = [_cell(v) for v in values]
+                return {}
+        return _Request(run)
+
+    def clear(self, spreadsheetId, range):
+        def run():
+            with self._lock:
+                self.calls.append(("clear", range))
+                rows, first_row, last_row, first_col, last_col = self._parse(range)
+                for row in rows[first_row - 1:last_row or len(rows)]:
+                    # 引数の range が組み込みの range を隠すのでスライスで消す
+                    cells = row[first_col:last_col + 1]
+                    row[first_col:last_col + 1] = [""] * len(cells)
+                return {}
+        return _Request(run)
+
+    def append(self, spreadsheetId, range, valueInputOption, insertDataOption, body):
+        def run():
+            with self._lock:
+                self.calls.append(("append", range))
+                tab = range.split("!")[0]
+                rows = self.tabs.setdefault(tab, [])
+                first = len(rows) + 1
+                rows.extend([_cell(v) for v in values] for values in body["values"])
+                last = len(rows)
+                return {"updates": {"updatedRange": f"{tab}!A{first}:M{last}"}}
+        return _Request(run)
@@ -0,0 +1,191 @@
+import json
+import sqlite3
+
+import pytest
+
+import ai_cache
+from ai_cache import ResponseCache
+from ai_service import GoogleAIService, SoapFieldScanner
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(ai_cache.time, "time", clock)
+    return clock
+
+
+def test_make_key_separates_kind_model_and_language():
+    keys = {
+        ResponseCache.make_key("soap", "m", "prompt"),
+        ResponseCache.make_key("translate", "m", "prompt"),
+        ResponseCache.make_key("soap", "other", "prompt"),
+        ResponseCache.make_key("translate", "m", "prompt", "en"),
+        ResponseCache.make_key("translate", "m", "prompt", "fr"),
+    }
+    assert len(keys) == 5
+    assert ResponseCache.make_key("soap", "m", "prompt") == ResponseCache.make_key("soap", "m", "prompt")
+
+
+def test_lru_evicts_least_recently_used():
+    cache = ResponseCache(max_entries=2, disk_path=None)
+    cache.set("a", "1")
+    cache.set("b", "2")
+    assert cache.get("a") == "1"
+    cache.set("c", "3")
+    assert cache.get("b") is None
+    assert (cache.get("a"), cache.get("c")) == ("1", "3")
+    stats = cache.stats()
+    assert (stats["entries"], stats["hits"], stats["misses"]) == (2, 3, 1)
+
+
+def test_entries_expire_after_ttl(clock):
+    cache = ResponseCache(ttl_seconds=60, disk_path=None)
+    cache.set("a", "1")
+    clock.now += 60
+    assert cache.get("a") == "1"
+    clock.now += 1
+    assert cache.get("a") is None
+    assert cache.stats()["entries"] == 0
+
+
+def test_disk_cache_survives_restart(tmp_path, clock):
+    path = str(tmp_path / "ai_cache.sqlite3")
+    ResponseCache(disk_path=path).set("a", "1")
+    restarted = ResponseCache(disk_path=path)
+    assert restarted.get("a") == "1"
+    assert restarted.stats()["disk_hits"] == 1
+    # 2回目はメモリから
+    assert restarted.get("a") == "1"
+    assert restarted.stats()["disk_hits"] == 1
+
+
+def test_disk_cache_drops_expired_rows(tmp_path, clock):
+    path = str(tmp_path / "ai_cache.sqlite3")
+    ResponseCache(ttl_seconds=60, disk_path=path).set("a", "1")
+    clock.now += 61
+    assert ResponseCache(ttl_seconds=60, disk_path=path).get("a") is None
+
+
+def test_disk_cache_purges_expired_rows_on_write(tmp_path, clock):
+    path = str(tmp_path / "ai_cache.sqlite3")
+    cache = ResponseCache(ttl_seconds=60, disk_path=path)
+    cache.set("a", "1")
+    clock.now += 61
+    cache.set("b", "2")
+    assert [row[0] for row in cache._db.execute("SELECT key FROM ai_cache")] == ["b"]
+
+
+def test_disk_cache_evicts_least_recently_used_rows(tmp_path, clock):
+    path = str(tmp_path / "ai_cache.sqlite3")
+    cache = ResponseCache(max_entries=1, disk_path=path, disk_max_entries=2)
+    cache.set("a", "1")
+    clock.now += 1
+    cache.set("b", "2")
+    clock.now += 1
+    # メモリには b しか無いので a はディスクから読まれ、最近使われた扱いになる
+    assert cache.get("a") == "1"
+    clock.now += 1
+    cache.set("c", "3")
+    restarted = ResponseCache(disk_path=path, disk_max_entries=2)
+    assert (restarted.get("a"), restarted.get("b"), restarted.get("c")) == ("1", None, "3")
+
+
+def test_disk_cache_without_used_column_is_migrated(tmp_path, clock):
+    path = str(tmp_path / "ai_cache.sqlite3")
+    db = sqlite3.connect(path)
+    db.execute("CREATE TABLE ai_cache (key TEXT PRIMARY KEY, value TEXT NOT NULL, created REAL NOT NULL)")
+    db.execute("INSERT INTO ai_cache VALUES ('old', 'v', ?)", (clock.now,))
+    db.commit()
+    db.close()
+    cache = ResponseCache(disk_path=path, disk_max_entries=1)
+    assert cache.get("old") == "v"
+    cache.set("new", "w")
+    assert [row[0] for row in cache._db.execute("SELECT key FROM ai_cache")] == ["new"]
+
+
+def test_unusable_disk_path_falls_back_to_memory(tmp_path):
+    cache = ResponseCache(disk_path=str(tmp_path / "missing" / "ai_cache.sqlite3"))
+    cache.set("a", "1")
+    assert cache.get("a") == "1"
+    assert cache.stats()["disk"] is False
+
+
+class Response:
+    def __init__(self, text):
+        self.text = text
+        self.prompt_feedback = None
+
+
+class FakeModel:
+    def __init__(self, reply):
+        self.reply = reply
+        self.calls = 0
+
+    def generate_content(self, prompt):
+        self.calls += 1
+        return Response(self.reply)
+
+
+@pytest.fixture
+def service(monkeypatch):
+    monkeypatch.setenv("GEMINI_API_KEY", "test")
+    service = GoogleAIService()
+    service.cache = ResponseCache(disk_path=None)
+    return service
+
+
+def test_soap_generation_is_cached(service):
+    service._model = FakeModel(json.dumps({"s": "S", "o": "O", "a": "A", "p": "P"}))
+    first = service.generate_soap_from_text("元気がない")
+    assert service.generate_soap_from_text("元気がない") == first
+    assert service._model.calls == 1
+    service.generate_soap_from_text("下痢")
+    assert service._model.calls == 2
+
+
+def test_streaming_shares_the_soap_cache(service):
+    service._model = FakeModel(json.dumps({"s": "S", "o": "O", "a": "A", "p": "P"}))
+    service.generate_soap_from_text("元気がない")
+    assert dict(service.stream_soap_from_text("元気がない")) == {"s": "S", "o": "O", "a": "A", "p": "P"}
+    assert service._model.calls == 1
+
+
+def test_failed_soap_generation_is_not_cached(service):
+    service._model = FakeModel("not json")
+    service.generate_soap_from_text("元気がない")
+    service.generate_soap_from_text("元気がない")
+    assert service._model.calls == 2
+
+
+def test_translation_is_cached_per_language(service):
+    service._model = FakeModel("Hello")
+    assert service.translate_text("こんにちは", "en") == "Hello"
+    assert service.translate_text("こんにちは", "en") == "Hello"
+    assert service._model.calls == 1
+    service.translate_text("こんにちは", "fr")
+    assert service._model.calls == 2
+
+
+def test_empty_translation_is_not_cached(service):
+    service._model = FakeModel("")
+    assert service.translate_text("こんにちは", "en") == "こんにちは"
+    service._model.reply = "Hello"
+    assert service.translate_text("こんにちは", "en") == "Hello"
+    assert service._model.calls == 2
+
+
+def test_scanner_emits_fields_as_their_values_close():
+    scanner = SoapFieldScanner()
+    assert scanner.feed('{"s": "食欲') == []
+    assert scanner.feed('なし", "o": "体温 \\"39.8\\"", "x": "無視", "a') == [("s", "食欲なし"), ("o", '体温 "39.8"')]
+    assert scanner.feed('": "肺炎", "p": ""}') == [("a", "肺炎"), ("p", "")]
+    assert scanner.fields == {"s": "食欲なし", "o": '体温 "39.8"', "a": "肺炎", "p": ""}
@@ -0,0 +1,75 @@
+import base64
+
+import pytest
+from fastapi.testclient import TestClient
+
+import main
+from database import InMemoryDB
+from schemas import Animal, Record, SoapNotes
+
+
+@pytest.fixture
+def client(monkeypatch):
+    db = InMemoryDB()
+    for i in range(5):
+        db.add_animal(Animal(id=f"a{i}", microchip_number=f"a{i}", name=f"牛{i}", farm_id="F-01" if i % 2 else "F-02"))
+    db.add_record(Record(id="r1", animalId="a0", visit_date="2024-05-01", soap=SoapNotes(s="咳")))
+    db.add_record(Record(id="r2", animalId="a0", visit_date="2024-06-01", soap=SoapNotes(s="回復")))
+    monkeypatch.setattr(main, "DB", db)
+    return TestClient(main.app)
+
+
+def _ids(r):
+    return [a["id"] for a in r.json()]
+
+
+def test_pages_follow_the_cursor(client):
+    r = client.get("/api/animals", params={"limit": 2})
+    assert (_ids(r), r.headers["X-Total-Count"]) == (["a0", "a1"], "5")
+    cursor = r.headers["X-Next-Cursor"]
+    assert base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)) == b"o:2"
+
+    r = client.get("/api/animals", params={"limit": 2, "cursor": cursor})
+    assert _ids(r) == ["a2", "a3"]
+    r = client.get("/api/animals", params={"limit": 2, "cursor": r.headers["X-Next-Cursor"]})
+    # 最後のページには次のカーソルが無い
+    assert _ids(r) == ["a4"]
+    assert "X-Next-Cursor" not in r.headers
+
+
+def test_exact_last_page_has_no_cursor(client):
+    r = client.get("/api/animals", params={"limit": 5})
+    assert len(r.json()) == 5
+    assert "X-Next-Cursor" not in r.headers
+
+
+def test_without_limit_returns_everything(client):
+    r = client.get("/api/animals")
+    assert _ids(r) == ["a0", "a1", "a2", "a3", "a4"]
+    assert r.headers["X-Total-Count"] == "5"
+    assert "X-Next-Cursor" not in r.headers
+
+
+def test_filters_are_paginated(client):
+    r = client.get("/api/animals", params={"farm_id": "F-02", "limit": 2})
+    assert (_ids(r), r.headers["X-Total-Count"]) == (["a0", "a2"], "3")
+    r = client.get("/api/animals", params={"farm_id": "F-02", "limit": 2, "cursor": r.headers["X-Next-Cursor"]})
+    assert _ids(r) == ["a4"]
+
+
+def test_offset_and_cursor_past_the_end(client):
+    assert _ids(client.get("/api/animals", params={"limit": 2, "offset": 3})) == ["a3", "a4"]
+    past = base64.urlsafe_b64encode(b"o:9").decode("ascii").rstrip("=")
+    r = client.get("/api/animals", params={"limit": 2, "cursor": past})
+    assert (r.status_code, r.json()) == (200, [])
+
+
+@pytest.mark.parametrize("cursor", ["not-base64!", base64.urlsafe_b64encode(b"x:2").decode(), base64.urlsafe_b64encode(b"o:-1").decode()])
+def test_bad_cursor_is_rejected(client, cursor):
+    assert client.get("/api/animals", params={"limit": 2, "cursor": cursor}).status_code == 400
+
+
+def test_summaries_omit_record_bodies(client):
+    summary = client.get("/api/animals", params={"limit": 1}).json()[0]
+    assert (summary["record_count"], summary["last_visit"]) == (2, "2024-06-01")
+    assert "records" not in summary
@@ -0,0 +1,71 @@
+import io
+import shutil
+
+import pytest
+
+import audio_normalize
+
+pytestmark = pytest.mark.skipif(shutil.which("ffmpeg") is None, reason="ffmpeg is not installed")
+
+
+def _stereo_wav(seconds_on_off, rate=44100):
+    """(秒, 音あり?) の並びから 44.1kHz ステレオの WAV を作る。"""
+    from pydub import AudioSegment
+    from pydub.generators import Sine
+
+    audio = AudioSegment.silent(duration=0, frame_rate=rate)
+    for seconds, loud in seconds_on_off:
+        ms = int(seconds * 1000)
+        if loud:
+            audio += Sine(440, sample_rate=rate).to_audio_segment(duration=ms, volume=-6)
+        else:
+            audio += AudioSegment.silent(ms, rate)
+    buf = io.BytesIO()
+    audio.set_channels(2).set_frame_rate(rate).export(buf, format="wav")
+    return buf.getvalue()
+
+
+def test_decode_mono_resamples_on_load():
+    data = _stereo_wav([(2, True)])
+    segment = audio_normalize._decode_mono(data, "memo.wav", 16000)
+    assert (segment.frame_rate, segment.channels, segment.sample_width) == (16000, 1, 2)
+    assert abs(len(segment) - 2000) < 50
+
+
+def test_split_speech_drops_silence(monkeypatch):
+    monkeypatch.setattr(audio_normalize, "AUDIO_TARGET_CODEC", "flac")
+    data = _stereo_wav([(1, True), (3, False), (1, True)])
+    segments, truncated = audio_normalize.split_speech(data, "memo.wav")
+    assert not truncated
+    assert len(segments) == 1
+    assert segments[0].audio.filename == "memo-000.flac"
+    assert audio_normalize._probe_header(segments[0].audio.data, ".flac") == (16000, 1)
+    # 間の 3 秒の無音は除かれる（発話 2 秒 + 前後の余白）
+    speech = audio_normalize._decode_mono(segments[0].audio.data, "memo-000.flac", 16000)
+    assert 2000 <= len(speech) < 3000
+
+
+def test_split_speech_caps_duration(monkeypatch):
+    monkeypatch.setattr(audio_normalize, "AUDIO_MAX_SECONDS", 2.0)
+    monkeypatch.setattr(audio_normalize, "AUDIO_SEGMENT_MAX_SECONDS", 50.0)
+    data = _stereo_wav([(1, True), (1, False), (1, True), (1, False), (1, True)])
+    segments, truncated = audio_normalize.split_speech(data, "memo.wav")
+    assert truncated
+    assert segments
+    assert max(s.end_seconds for s in segments) <= 2.0
+
+
+def test_split_speech_at_the_cap_is_not_truncated(monkeypatch):
+    monkeypatch.setattr(audio_normalize, "AUDIO_MAX_SECONDS", 2.0)
+    assert audio_normalize.split_speech(_stereo_wav([(2, True)]), "memo.wav").truncated is False
+
+
+def test_split_speech_silence_only():
+    assert audio_normalize.split_speech(_stereo_wav([(2, False)]), "memo.wav") == ([], False)
+
+
+def test_split_speech_undecodable_passthrough():
+    segments, truncated = audio_normalize.split_speech(b"not audio", "memo.webm")
+    assert not truncated
+    assert len(segments) == 1
+    assert segments[0].audio.data == b"not audio"
@@ -0,0 +1,246 @@
+import hashlib
+import io
+import threading
+
+import pytest
+from fastapi.testclient import TestClient
+from PIL import Image
+
+import audio_service
+import main
+from audio_normalize import NormalizedAudio, SpeechSegment, SpeechSplit
+import storage
+from storage import content_key, save_file
+
+
+class FakeBlob:
+    def __init__(self, bucket, name):
+        self.bucket = bucket
+        self.name = name
+        self.public_url = f"https://storage.example/{name}"
+
+    def exists(self):
+        return self.name in self.bucket.objects
+
+    def _store(self, data):
+        self.bucket.objects[self.name] = data
+        self.bucket.uploads.append(self.name)
+
+    def upload_from_string(self, data):
+        self._store(data)
+
+    def upload_from_file(self, fileobj, content_type=None, size=None):
+        self._store(fileobj.read())
+
+
+class FakeBucket:
+    def __init__(self):
+        self.objects = {}
+        self.uploads = []
+
+    def blob(self, name):
+        return FakeBlob(self, name)
+
+
+class FakeStorageClient:
+    def __init__(self):
+        self.bucket_ = FakeBucket()
+
+    def bucket(self, name):
+        return self.bucket_
+
+
+@pytest.fixture
+def local(tmp_path, monkeypatch):
+    monkeypatch.setattr(storage, "UPLOAD_DIR", str(tmp_path))
+    monkeypatch.setattr(storage, "GCS_BUCKET_NAME", None)
+    return tmp_path
+
+
+@pytest.fixture
+def gcs(tmp_path, monkeypatch):
+    client = FakeStorageClient()
+    monkeypatch.setattr(storage, "UPLOAD_DIR", str(tmp_path))
+    monkeypatch.setattr(storage, "GCS_BUCKET_NAME", "bucket")
+    monkeypatch.setattr(storage, "GCS_SIGNED_URLS", False)
+    monkeypatch.setattr(storage, "GCS_BASE_URL", None)
+    monkeypatch.setattr(storage, "get_storage_client", lambda: client)
+    return client.bucket_
+
+
+def _png(color):
+    buf = io.BytesIO()
+    Image.new("RGB", (64, 48), color).save(buf, format="PNG")
+    return buf.getvalue()
+
+
+def test_content_key_uses_hash_and_lower_case_extension():
+    digest = hashlib.sha256(b"data").hexdigest()
+    assert content_key(digest, "Memo.WEBM") == f"{digest[:32]}.webm"
+    assert content_key(digest, "no_extension") == digest[:32]
+
+
+def test_save_file_same_content_same_key(local):
+    url1, key1 = save_file(b"same", "a.txt")
+    url2, key2 = save_file(b"same", "b.TXT")
+    assert (url1, key1) == (url2, key2) == (f"/uploads/{key1}", key1)
+    _, other = save_file(b"other", "a.txt")
+    assert other != key1
+    assert sorted(p.name for p in local.iterdir()) == sorted([key1, other])
+
+
+def test_upload_same_content_stored_once(local, monkeypatch):
+    monkeypatch.setattr(storage, "IMAGE_DERIVATIVES", False)
+    client = TestClient(main.app)
+    keys = [
+        client.post("/api/uploads/images", files={"file": (name, b"scan", "application/pdf")}).json()["key"]
+        for name in ("first.pdf", "retry.pdf")
+    ]
+    assert keys[0] == keys[1]
+    # 一時ファイル（.part）も残らない
+    assert [p.name for p in local.iterdir()] == [keys[0]]
+
+
+def test_same_image_skips_conversion(local, monkeypatch):
+    client = TestClient(main.app)
+    first = client.post("/api/uploads/images", files={"file": ("cow.png", _png("red"), "image/png")}).json()
+
+    def must_not_render(fileobj):
+        raise AssertionError("already converted")
+
+    monkeypatch.setattr(storage, "render_image_variants", must_not_render)
+    again = client.post("/api/uploads/images", files={"file": ("cow-again.png", _png("red"), "image/png")}).json()
+    assert again == first
+    assert len(list(local.iterdir())) == 3
+
+
+def test_gcs_save_file_skips_existing_object(gcs):
+    url, key = save_file(b"same", "a.txt")
+    assert save_file(b"same", "b.txt") == (url, key)
+    assert key.startswith("uploads/")
+    assert url == f"https://storage.example/{key}"
+    assert gcs.uploads == [key]
+
+
+def test_gcs_stream_upload_skips_existing_object(gcs, monkeypatch):
+    monkeypatch.setattr(storage, "IMAGE_DERIVATIVES", False)
+    client = TestClient(main.app)
+    keys = [
+        client.post("/api/uploads/images", files={"file": ("scan.pdf", b"scan", "application/pdf")}).json()["key"]
+        for _ in range(2)
+    ]
+    assert keys[0] == keys[1]
+    assert gcs.uploads == [keys[0]]
+    assert gcs.objects[keys[0]] == b"scan"
+
+
+@pytest.fixture
+def stt(monkeypatch):
+    monkeypatch.setattr(audio_service, "ensure_gcp_credentials", lambda: None)
+    monkeypatch.setattr(audio_service, "STT_CACHE_PATH", None)
+    service = audio_service.GoogleAudioService()
+    calls = []
+    results = {}
+
+    def recognize(audio, filename, language_code=None):
+        calls.append((audio, language_code))
+        text = results.get(audio, f"text for {audio!r}")
+        return None if text is None else audio_service.Recognition([(text, 1.0)], True)
+
+    monkeypatch.setattr(service, "_recognize_content", recognize)
+    return service, calls, results
+
+
+def test_stt_cache_hit_skips_speech(stt):
+    service, calls, _ = stt
+    assert service.transcribe_audio_data(b"audio", "a.webm") == "text for b'audio'"
+    assert service.transcribe_audio_data(b"audio", "retry.webm") == "text for b'audio'"
+    assert len(calls) == 1
+    assert service.cache.stats()["hits"] == 1
+
+
+def test_stt_cache_key_includes_language(stt):
+    service, calls, _ = stt
+    service.transcribe_audio_data(b"audio", "a.webm", language_code="ja-JP")
+    service.transcribe_audio_data(b"audio", "a.webm", language_code="en-US")
+    service.transcribe_audio_data(b"other", "a.webm", language_code="ja-JP")
+    assert len(calls) == 3
+
+
+def test_stt_failures_are_not_cached(stt):
+    service, calls, results = stt
+    results[b"audio"] = None
+    assert service.transcribe_audio_data(b"audio", "a.webm") is None
+    del results[b"audio"]
+    assert service.transcribe_audio_data(b"audio", "a.webm") == "text for b'audio'"
+    assert len(calls) == 2
+
+
+def test_stt_partial_segment_failure_is_not_cached(monkeypatch):
+    monkeypatch.setattr(audio_service, "ensure_gcp_credentials", lambda: None)
+    monkeypatch.setattr(audio_service, "STT_CACHE_PATH", None)
+    service = audio_service.GoogleAudioService()
+    segments = [
+        SpeechSegment(NormalizedAudio(f"seg{i}".encode(), f"a-{i:03d}.flac", 16000, 1), i * 10.0, i * 10.0 + 5)
+        for i in range(3)
+    ]
+    monkeypatch.setattr(service, "_split", lambda data, filename: SpeechSplit(segments))
+    failures = {b"seg1": 1}
+    calls = []
+
+    def recognize_sync(normalized, language_code=None):
+        calls.append(normalized.data)
+        if failures.get(normalized.data):
+            failures[normalized.data] -= 1
+            raise RuntimeError("503 unavailable")
+        return normalized.data.decode()
+
+    monkeypatch.setattr(service, "_recognize_sync", recognize_sync)
+    # 1区間だけ一時的に失敗した結果は返すが、キャッシュしない
+    assert service.transcribe_audio_data(b"audio", "a.webm") == "seg0 seg2"
+    assert service.transcribe_audio_data(b"audio", "a.webm") == "seg0 seg1 seg2"
+    assert service.transcribe_audio_data(b"audio", "a.webm") == "seg0 seg1 seg2"
+    assert len(calls) == 6
+    assert service.transcribe_long_audio_data(b"audio", "a.webm") == "seg0 seg1 seg2"
+    assert len(calls) == 6
+
+
+def test_segments_are_reported_in_order_as_they_finish(monkeypatch):
+    monkeypatch.setattr(audio_service, "ensure_gcp_credentials", lambda: None)
+    monkeypatch.setattr(audio_service, "STT_CACHE_PATH", None)
+    service = audio_service.GoogleAudioService()
+    segments = [
+        SpeechSegment(NormalizedAudio(f"seg{i}".encode(), f"a-{i:03d}.flac", 16000, 1), i * 10.0, i * 10.0 + 5)
+        for i in range(3)
+    ]
+    release = threading.Event()
+
+    def recognize_sync(normalized, language_code=None):
+        if normalized.data == b"seg1":
+            # 後ろの区間が先に終わっても、通知は先頭から順に行う
+            release.wait(5)
+        return "" if normalized.data == b"seg2" else normalized.data.decode()
+
+    monkeypatch.setattr(service, "_recognize_sync", recognize_sync)
+    reported = []
+
+    def on_segment(text, end):
+        reported.append((text, end))
+        release.set()
+
+    recognition = service._recognize_segments(segments, on_segment=on_segment)
+    assert reported == recognition.segments == [("seg0", 5.0), ("seg1", 15.0)]
+
+
+def test_stt_truncated_transcript_is_flagged_and_not_cached(monkeypatch):
+    monkeypatch.setattr(audio_service, "ensure_gcp_credentials", lambda: None)
+    monkeypatch.setattr(audio_service, "STT_CACHE_PATH", None)
+    service = audio_service.GoogleAudioService()
+    segment = SpeechSegment(NormalizedAudio(b"seg", "a-000.flac", 16000, 1), 0.0, 1800.0)
+    monkeypatch.setattr(service, "_split", lambda data, filename: SpeechSplit([segment], truncated=True))
+    calls = []
+    monkeypatch.setattr(service, "_recognize_sync", lambda normalized, language_code=None: calls.append(1) or "text")
+    recognition = service.recognize_audio_data(b"audio", "a.webm")
+    assert (recognition.text, recognition.truncated) == ("text", True)
+    assert service.transcribe_audio_data(b"audio", "a.webm") == "text"
+    assert len(calls) == 2
@@ -0,0 +1,132 @@
+import pytest
+from fastapi.testclient import TestClient
+
+import main
+from database import InMemoryDB
+from schemas import Animal, Record, SoapNotes
+
+
+def _animal(animal_id, farm_id=None, breed=None, sex=None):
+    return Animal(id=animal_id, microchip_number=animal_id, name=f"牛{animal_id}", farm_id=farm_id, breed=breed, sex=sex)
+
+
+def _record(record_id, animal_id, next_visit_date=None, **fields):
+    return Record(id=record_id, animalId=animal_id, soap=SoapNotes(), next_visit_date=next_visit_date, **fields)
+
+
+@pytest.fixture
+def db():
+    db = InMemoryDB()
+    db.add_animal(_animal("a1", farm_id="F-01", breed="ホルスタイン", sex="メス"))
+    db.add_animal(_animal("a2", farm_id="F-02", breed="黒毛和種", sex="オス"))
+    db.add_animal(_animal("a3", farm_id="G-01", breed="ホルスタイン", sex="オス"))
+    db.add_animal(_animal("a4"))
+    return db
+
+
+def _ids(animals):
+    return [a.id for a in animals]
+
+
+def test_filters_use_the_indexes(db):
+    assert _ids(db.filter_animals(microchip_number="a2")) == ["a2"]
+    # farm_id は部分一致、未設定の動物は一致扱い
+    assert _ids(db.filter_animals(farm_id="F-0")) == ["a1", "a2", "a4"]
+    assert _ids(db.filter_animals(breed="ホルスタイン")) == ["a1", "a3", "a4"]
+    assert _ids(db.filter_animals(breed="ホルスタイン", sex="オス")) == ["a3", "a4"]
+    assert _ids(db.filter_animals(farm_id="F", breed="黒毛和種", sex="オス")) == ["a2", "a4"]
+    assert _ids(db.filter_animals()) == ["a1", "a2", "a3", "a4"]
+
+
+def test_filter_within_keeps_the_given_order(db):
+    within = [db.get_animal("a3"), db.get_animal("a2"), db.get_animal("a1")]
+    assert _ids(db.filter_animals(sex="オス", within=within)) == ["a3", "a2"]
+    assert _ids(db.filter_animals(within=within)) == ["a3", "a2", "a1"]
+
+
+def test_replacing_an_animal_updates_its_index_entries(db):
+    db.add_animal(_animal("a1", farm_id="G-02", breed="黒毛和種", sex="メス"))
+    assert _ids(db.filter_animals(farm_id="F-01")) == ["a4"]
+    assert _ids(db.filter_animals(breed="黒毛和種")) == ["a1", "a2", "a4"]
+    # 置き換えても一覧の並び順は変わらない
+    assert _ids(db.filter_animals()) == ["a1", "a2", "a3", "a4"]
+
+
+def test_record_index_follows_deletes(db):
+    for record_id in ("r1", "r2", "r3"):
+        db.add_record(_record(record_id, "a1"))
+    assert db.find_record("r2")[0::2] == ("a1", 1)
+    db.delete_record_by_id("r1")
+    assert db.find_record("r1") == (None, None, -1)
+    animal_id, record, pos = db.find_record("r3")
+    assert (animal_id, record.id, pos) == ("a1", "r3", 1)
+    assert db.get_animal("a1").records[pos] is record
+
+
+def test_record_index_repairs_a_stale_position(db):
+    db.add_record(_record("r1", "a1"))
+    db.add_record(_record("r2", "a1"))
+    # 位置がずれていても（インデックスを介さずにリストが変わった等）記録は見つかる
+    db.get_animal("a1").records.reverse()
+    animal_id, record, pos = db.find_record("r1")
+    assert (animal_id, record.id, pos) == ("a1", "r1", 1)
+    assert db.find_record("r2")[2] == 0
+
+
+@pytest.fixture
+def appointments(db):
+    db.add_record(_record("r1", "a1", "2024-06-03", doctor="佐藤"))
+    db.add_record(_record("r2", "a2", "2024-06-01T09:30"))
+    db.add_record(_record("r3", "a3", "2024-06-05", next_visit_time="14:00", doctor="佐藤"))
+    db.add_record(_record("r4", "a1", "2024-06-03T10:00"))
+    db.add_record(_record("r5", "a4"))
+    return db
+
+
+def _days(items):
+    return [(item["date"], item["id"]) for item in items]
+
+
+def test_appointments_are_sorted_by_date(appointments):
+    items = appointments.list_appointments()
+    assert _days(items) == [("2024-06-01", "a2-r2"), ("2024-06-03", "a1-r1"), ("2024-06-03", "a1-r4"), ("2024-06-05", "a3-r3")]
+    assert [item["time"] for item in items] == ["09:30", "", "10:00", "14:00"]
+    assert appointments._idx.appointment_days == ["2024-06-01", "2024-06-03", "2024-06-05"]
+
+
+def test_appointment_ranges_include_both_ends(appointments):
+    assert _days(appointments.list_appointments(date_from="2024-06-03", date_to="2024-06-05")) == [
+        ("2024-06-03", "a1-r1"), ("2024-06-03", "a1-r4"), ("2024-06-05", "a3-r3"),
+    ]
+    assert _days(appointments.list_appointments(date_from="2024-06-02", date_to="2024-06-04")) == [
+        ("2024-06-03", "a1-r1"), ("2024-06-03", "a1-r4"),
+    ]
+    assert _days(appointments.list_appointments(date_to="2024-06-01")) == [("2024-06-01", "a2-r2")]
+    assert _days(appointments.list_appointments(date_from="2024-06-04")) == [("2024-06-05", "a3-r3")]
+    assert appointments.list_appointments(date_from="2024-06-06") == []
+    assert _days(appointments.list_appointments(date="2024-06-03", doctor="佐藤")) == [("2024-06-03", "a1-r1")]
+    assert appointments.list_appointments(date="2024-06-02") == []
+
+
+def test_appointment_index_follows_updates_and_deletes(appointments):
+    moved = appointments.find_record("r2")[1].model_copy(update={"next_visit_date": "2024-06-04"})
+    appointments.update_record_by_id("r2", moved)
+    appointments.delete_record_by_id("r3")
+    assert _days(appointments.list_appointments()) == [
+        ("2024-06-03", "a1-r1"), ("2024-06-03", "a1-r4"), ("2024-06-04", "a2-r2"),
+    ]
+    # 予定が無くなった日はキーからも消える
+    assert appointments._idx.appointment_days == ["2024-06-03", "2024-06-04"]
+
+
+def test_returned_appointments_are_copies(appointments):
+    appointments.list_appointments()[0]["status"] = "done"
+    assert appointments.list_appointments()[0]["status"] == "scheduled"
+
+
+def test_appointments_endpoint(appointments, monkeypatch):
+    monkeypatch.setattr(main, "DB", appointments)
+    client = TestClient(main.app)
+    r = client.get("/api/appointments", params={"from": "2024-06-02", "to": "2024-06-05", "doctor": "佐藤"})
+    assert r.status_code == 200
+    assert [item["id"] for item in r.json()] == ["a1-r1", "a3-r3"]
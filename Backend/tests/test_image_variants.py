@@ -0,0 +1,118 @@
+import io
+
+import pytest
+from fastapi.testclient import TestClient
+from PIL import Image
+
+import main
+import storage
+from storage import get_file_url, render_image_variants, variant_url
+
+_ORIENTATION = 0x0112
+_MAKE = 0x010F
+
+
+def _jpeg(size=(2000, 1000), orientation=None):
+    image = Image.new("RGB", size, (200, 30, 30))
+    exif = Image.Exif()
+    exif[_MAKE] = "TestCamera"
+    if orientation:
+        exif[_ORIENTATION] = orientation
+    buf = io.BytesIO()
+    image.save(buf, format="JPEG", exif=exif.tobytes())
+    return buf.getvalue()
+
+
+def _open(data):
+    image = Image.open(io.BytesIO(data))
+    image.load()
+    return image
+
+
+def test_renders_each_size_as_webp_without_exif():
+    variants = render_image_variants(io.BytesIO(_jpeg()))
+    assert set(variants) == {"thumb", "medium", "full"}
+    sizes = {}
+    for name, data in variants.items():
+        image = _open(data)
+        assert image.format == "WEBP"
+        assert "exif" not in image.info
+        sizes[name] = image.size
+    assert sizes == {"thumb": (320, 160), "medium": (1280, 640), "full": (2000, 1000)}
+
+
+def test_exif_orientation_is_applied_to_pixels():
+    variants = render_image_variants(io.BytesIO(_jpeg(orientation=6)))
+    assert _open(variants["full"]).size == (1000, 2000)
+    assert _open(variants["thumb"]).size == (160, 320)
+
+
+def test_small_images_are_not_upscaled():
+    variants = render_image_variants(io.BytesIO(_jpeg(size=(100, 50))))
+    assert {name: _open(data).size for name, data in variants.items()} == {
+        "thumb": (100, 50), "medium": (100, 50), "full": (100, 50)
+    }
+
+
+def test_transparency_is_kept():
+    buf = io.BytesIO()
+    Image.new("RGBA", (40, 40), (0, 0, 0, 0)).save(buf, format="PNG")
+    assert _open(render_image_variants(io.BytesIO(buf.getvalue()))["full"]).mode == "RGBA"
+
+
+def test_non_image_returns_none():
+    assert render_image_variants(io.BytesIO(b"not an image")) is None
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    monkeypatch.setattr(storage, "UPLOAD_DIR", str(tmp_path))
+    monkeypatch.setattr(storage, "GCS_BUCKET_NAME", None)
+    return TestClient(main.app), tmp_path
+
+
+def test_upload_stores_variants_instead_of_original(client):
+    client, upload_dir = client
+    r = client.post("/api/uploads/images", files={"file": ("cow.jpg", _jpeg(), "image/jpeg")})
+    assert r.status_code == 200
+    body = r.json()
+    assert body["key"].endswith(".full.webp")
+    assert body["url"] == f"/uploads/{body['key']}"
+    assert body["variants"] == {name: variant_url(body["url"], name) for name in ("thumb", "medium", "full")}
+    assert sorted(p.name for p in upload_dir.iterdir()) == sorted(
+        variant_url(body["key"], name) for name in ("full", "medium", "thumb")
+    )
+
+
+def test_non_image_upload_keeps_original(client):
+    client, upload_dir = client
+    r = client.post("/api/uploads/images", files={"file": ("scan.pdf", b"%PDF-1.4 test", "application/pdf")})
+    assert r.status_code == 200
+    body = r.json()
+    assert body["key"].endswith(".pdf")
+    assert body["variants"] is None
+    assert (upload_dir / body["key"]).read_bytes() == b"%PDF-1.4 test"
+
+
+def test_derivatives_can_be_disabled(client, monkeypatch):
+    client, upload_dir = client
+    monkeypatch.setattr(storage, "IMAGE_DERIVATIVES", False)
+    data = _jpeg()
+    body = client.post("/api/uploads/images", files={"file": ("cow.jpg", data, "image/jpeg")}).json()
+    assert body["key"].endswith(".jpg")
+    assert (upload_dir / body["key"]).read_bytes() == data
+
+
+def test_variant_url_swaps_size_and_keeps_query():
+    assert variant_url("/uploads/abc.full.webp", "thumb") == "/uploads/abc.thumb.webp"
+    assert variant_url("https://x/uploads/abc.medium.webp?sig=1", "full") == "https://x/uploads/abc.full.webp?sig=1"
+    # 派生画像でないもの・未知のサイズ名はそのまま
+    assert variant_url("/uploads/old_photo.jpg", "thumb") == "/uploads/old_photo.jpg"
+    assert variant_url("/uploads/abc.full.webp", "huge") == "/uploads/abc.full.webp"
+    assert variant_url(None, "thumb") is None
+
+
+def test_get_file_url_variant():
+    assert get_file_url("abc.full.webp") == "/uploads/abc.full.webp"
+    assert get_file_url("abc.full.webp", variant="thumb") == "/uploads/abc.thumb.webp"
+    assert get_file_url("old.jpg", variant="thumb") == "/uploads/old.jpg"
@@ -0,0 +1,136 @@
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+import media
+from media import MediaFiles
+
+HASH_NAME = "0123456789abcdef0123456789abcdef.webm"
+BODY = bytes(range(256)) * 4
+
+
+@pytest.fixture
+def files(tmp_path, monkeypatch):
+    monkeypatch.setattr(media, "GCS_BUCKET_NAME", None)
+    (tmp_path / HASH_NAME).write_bytes(BODY)
+    (tmp_path / "audio_legacy name.webm").write_bytes(b"legacy")
+    (tmp_path / ".upload.part").write_bytes(b"partial")
+    app = FastAPI()
+    app.mount("/uploads", MediaFiles(directory=str(tmp_path), etag_cache_size=2), name="uploads")
+    return TestClient(app), tmp_path, app
+
+
+def test_full_response_has_immutable_cache_and_strong_etag(files):
+    client, _, _ = files
+    r = client.get(f"/uploads/{HASH_NAME}")
+    assert r.status_code == 200
+    assert r.content == BODY
+    assert r.headers["etag"] == f'"{HASH_NAME}"'
+    assert r.headers["cache-control"] == "public, max-age=31536000, immutable"
+    assert r.headers["accept-ranges"] == "bytes"
+    assert r.headers["content-type"].startswith("video/webm") or r.headers["content-type"].startswith("audio/webm")
+
+
+def test_if_none_match_returns_304(files):
+    client, _, _ = files
+    etag = client.get(f"/uploads/{HASH_NAME}").headers["etag"]
+    for header in (etag, f"W/{etag}", f'"other", {etag}', "*"):
+        r = client.get(f"/uploads/{HASH_NAME}", headers={"If-None-Match": header})
+        assert r.status_code == 304
+        assert r.content == b""
+    assert client.get(f"/uploads/{HASH_NAME}", headers={"If-None-Match": '"other"'}).status_code == 200
+
+
+@pytest.mark.parametrize("header, start, end", [
+    ("bytes=10-19", 10, 19),
+    ("bytes=1000-", 1000, 1023),
+    ("bytes=-5", 1019, 1023),
+    ("bytes=1020-5000", 1020, 1023),
+])
+def test_range_returns_206(files, header, start, end):
+    client, _, _ = files
+    r = client.get(f"/uploads/{HASH_NAME}", headers={"Range": header})
+    assert r.status_code == 206
+    assert r.headers["content-range"] == f"bytes {start}-{end}/{len(BODY)}"
+    assert r.content == BODY[start:end + 1]
+
+
+@pytest.mark.parametrize("header", ["bytes=1024-", "bytes=5000-6000", "bytes=20-10", "bytes=-0"])
+def test_unsatisfiable_range_returns_416(files, header):
+    client, _, _ = files
+    r = client.get(f"/uploads/{HASH_NAME}", headers={"Range": header})
+    assert r.status_code == 416
+    assert r.headers["content-range"] == f"bytes */{len(BODY)}"
+
+
+def test_multiple_ranges_and_stale_if_range_return_full_body(files):
+    client, _, _ = files
+    assert client.get(f"/uploads/{HASH_NAME}", headers={"Range": "bytes=0-1,5-6"}).status_code == 200
+    r = client.get(f"/uploads/{HASH_NAME}", headers={"Range": "bytes=0-1", "If-Range": '"old"'})
+    assert r.status_code == 200
+    assert r.content == BODY
+
+
+def test_head_range(files):
+    client, _, _ = files
+    r = client.head(f"/uploads/{HASH_NAME}", headers={"Range": "bytes=0-9"})
+    assert r.status_code == 206
+    assert r.headers["content-length"] == "10"
+
+
+def test_legacy_names_revalidate_with_content_hash_etag(files):
+    client, tmp_path, _ = files
+    r = client.get("/uploads/audio_legacy name.webm")
+    assert r.status_code == 200
+    assert r.headers["cache-control"] == "public, no-cache"
+    etag = r.headers["etag"]
+    assert client.get("/uploads/audio_legacy name.webm", headers={"If-None-Match": etag}).status_code == 304
+    (tmp_path / "audio_legacy name.webm").write_bytes(b"changed content")
+    assert client.get("/uploads/audio_legacy name.webm").headers["etag"] != etag
+
+
+def test_etag_cache_is_bounded(files):
+    client, tmp_path, app = files
+    for i in range(5):
+        (tmp_path / f"legacy_{i}.png").write_bytes(b"x" * i)
+        assert client.get(f"/uploads/legacy_{i}.png").status_code == 200
+    mount = next(route for route in app.routes if getattr(route, "path", None) == "/uploads")
+    assert len(mount.app._etags) == 2
+
+
+def test_missing_hidden_and_non_get(files):
+    client, _, _ = files
+    assert client.get("/uploads/missing.png").status_code == 404
+    assert client.get("/uploads/.upload.part").status_code == 404
+    assert client.get("/uploads/..%2Fsecret").status_code == 404
+    assert client.post(f"/uploads/{HASH_NAME}").status_code == 405
+
+
+def test_gcs_only_files_redirect_to_cached_signed_url(files, monkeypatch):
+    client, _, _ = files
+    signed = []
+
+    class Blob:
+        def __init__(self, key):
+            self.key = key
+
+        def generate_signed_url(self, **kwargs):
+            signed.append(self.key)
+            return f"https://signed.example/{self.key}?sig=1"
+
+    class Bucket:
+        def blob(self, key):
+            return Blob(key)
+
+    class Client:
+        def bucket(self, name):
+            return Bucket()
+
+    monkeypatch.setattr(media, "GCS_BUCKET_NAME", "bucket")
+    monkeypatch.setattr(media, "get_storage_client", lambda: Client())
+    for _ in range(2):
+        r = client.get("/uploads/remote.png", follow_redirects=False)
+        assert r.status_code == 307
+        assert r.headers["location"] == "https://signed.example/uploads/remote.png?sig=1"
+        assert r.headers["cache-control"].startswith("private, max-age=")
+    assert signed == ["uploads/remote.png"]
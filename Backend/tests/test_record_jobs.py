@@ -0,0 +1,233 @@
+import asyncio
+import io
+import threading
+import time
+
+import pytest
+from fastapi.testclient import TestClient
+
+import database
+import main
+import record_jobs
+from database import InMemoryDB
+from record_jobs import RecordJobQueue
+from schemas import Animal, Record, SoapNotes
+
+
+def _queue(tmp_path, **kwargs):
+    kwargs.setdefault("retry_base_delay", 0.01)
+    return RecordJobQueue(path=str(tmp_path / "jobs.sqlite3"), spool_dir=str(tmp_path / "spool"), **kwargs)
+
+
+def _wait(queue, job_id, statuses=("done", "error"), timeout=5.0):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        job = queue.get(job_id)
+        if job["status"] in statuses:
+            return job
+        time.sleep(0.01)
+    raise AssertionError(f"job {job_id} did not reach {statuses}: {queue.get(job_id)}")
+
+
+class Handler:
+    def __init__(self, failures=0):
+        self.failures = failures
+        self.calls = []
+        self.lock = threading.Lock()
+
+    def __call__(self, job, audio_data):
+        with self.lock:
+            self.calls.append((job["record_id"], audio_data))
+            if len(self.calls) <= self.failures:
+                raise RuntimeError(f"transient {len(self.calls)}")
+        return f"text for {job['record_id']}"
+
+
+def test_job_runs_and_removes_spool(tmp_path):
+    queue = _queue(tmp_path)
+    handler = Handler()
+    queue.start(handler)
+    job = queue.submit("rec-1", b"audio", "memo.WEBM", language_code="ja-JP")
+    assert job["status"] in ("pending", "running")
+    assert "spool_path" not in job
+    done = _wait(queue, job["job_id"])
+    assert (done["status"], done["transcription"], done["attempts"]) == ("done", "text for rec-1", 1)
+    assert done["language_code"] == "ja-JP"
+    assert handler.calls == [("rec-1", b"audio")]
+    assert list((tmp_path / "spool").iterdir()) == []
+
+
+def test_file_object_is_copied_from_current_position(tmp_path):
+    queue = _queue(tmp_path)
+    handler = Handler()
+    queue.start(handler)
+    upload = io.BytesIO(b"headeraudio")
+    upload.seek(6)
+    _wait(queue, queue.submit("rec-1", upload, "memo.webm")["job_id"])
+    assert handler.calls == [("rec-1", b"audio")]
+
+
+def test_transient_failures_are_retried(tmp_path):
+    queue = _queue(tmp_path, max_attempts=3)
+    handler = Handler(failures=2)
+    queue.start(handler)
+    done = _wait(queue, queue.submit("rec-1", b"audio", "memo.webm")["job_id"])
+    assert (done["status"], done["attempts"], done["error"]) == ("done", 3, None)
+    assert len(handler.calls) == 3
+
+
+def test_gives_up_after_max_attempts(tmp_path):
+    queue = _queue(tmp_path, max_attempts=2)
+    failed_jobs = []
+    queue.start(Handler(failures=10), on_failure=failed_jobs.append)
+    job_id = queue.submit("rec-1", b"audio", "memo.webm")["job_id"]
+    failed = _wait(queue, job_id)
+    assert (failed["status"], failed["attempts"], failed["error"]) == ("error", 2, "transient 2")
+    deadline = time.time() + 5
+    while not failed_jobs and time.time() < deadline:
+        time.sleep(0.01)
+    assert [job["job_id"] for job in failed_jobs] == [job_id]
+    assert list((tmp_path / "spool").iterdir()) == []
+
+
+def test_unfinished_jobs_resume_after_restart(tmp_path):
+    # ハンドラ未登録のまま投入したジョブ（前回のプロセスで終わらなかったもの）
+    before = _queue(tmp_path)
+    pending = before.submit("rec-1", b"one", "a.webm")["job_id"]
+    running = before.submit("rec-2", b"two", "b.webm")["job_id"]
+    before._update(running, status="running", attempts=1)
+    assert before.get(pending)["status"] == "pending"
+
+    after = _queue(tmp_path)
+    handler = Handler()
+    assert after.start(handler) == 2
+    assert _wait(after, pending)["status"] == "done"
+    assert _wait(after, running)["status"] == "done"
+    assert sorted(handler.calls) == [("rec-1", b"one"), ("rec-2", b"two")]
+
+
+def test_get_for_record_returns_latest(tmp_path):
+    queue = _queue(tmp_path)
+    first = queue.submit("rec-1", b"one", "a.webm")["job_id"]
+    time.sleep(0.01)
+    second = queue.submit("rec-1", b"two", "a.webm")["job_id"]
+    assert queue.get_for_record("rec-1")["job_id"] == second != first
+    assert queue.get_for_record("rec-2") is None
+    assert queue.get("missing") is None
+
+
+def test_old_finished_jobs_are_purged_on_start(tmp_path, monkeypatch):
+    queue = _queue(tmp_path)
+    old = queue.submit("rec-1", b"one", "a.webm")["job_id"]
+    queue._update(old, status="done")
+    with queue._lock:
+        queue._conn().execute("UPDATE record_jobs SET updated_at = 0 WHERE job_id = ?", (old,))
+        queue._conn().commit()
+    monkeypatch.setattr(record_jobs, "RECORD_JOB_TTL_SECONDS", 60)
+    queue.start(Handler())
+    assert queue.get(old) is None
+
+
+class FakeAudioService:
+    def transcribe_audio_data(self, audio_data, filename, language_code=None):
+        return "食欲なし"
+
+
+class FakeAIService:
+    def __init__(self, before_return=None):
+        self.before_return = before_return
+        self.calls = []
+
+    def generate_soap_from_text(self, text):
+        self.calls.append(text)
+        if self.before_return is not None:
+            self.before_return()
+        return SoapNotes(s=text, p="経過観察")
+
+
+@pytest.fixture
+def db(monkeypatch):
+    db = InMemoryDB()
+    db.add_animal(Animal(id="A-1", name="ハナ", microchip_number="123"))
+    db.add_record(Record(id="R-1", animalId="A-1", soap=SoapNotes(), processing_status="pending"))
+    monkeypatch.setattr(main, "DB", db)
+    monkeypatch.setattr(main, "google_audio_service", FakeAudioService())
+    return db
+
+
+def _job():
+    return {"record_id": "R-1", "filename": "memo.webm", "language_code": "ja-JP"}
+
+
+def test_generated_soap_is_written_to_an_empty_record(db, monkeypatch):
+    monkeypatch.setattr(main, "google_ai_service", FakeAIService())
+    assert main._process_record_job(_job(), b"audio") == "食欲なし"
+    record = db.find_record("R-1")[1]
+    assert (record.soap.s, record.soap.p, record.processing_status) == ("食欲なし", "経過観察", None)
+
+
+def test_soap_entered_before_generation_is_kept(db, monkeypatch):
+    ai = FakeAIService()
+    monkeypatch.setattr(main, "google_ai_service", ai)
+    db.update_record_by_id("R-1", db.find_record("R-1")[1].model_copy(update={"soap": SoapNotes(s="獣医師の所見")}))
+    main._process_record_job(_job(), b"audio")
+    record = db.find_record("R-1")[1]
+    assert (record.soap.s, record.soap.p, record.processing_status) == ("獣医師の所見", "", None)
+    assert ai.calls == []
+
+
+def test_soap_entered_during_generation_is_kept(db, monkeypatch):
+    def vet_edits():
+        db.update_record_by_id("R-1", db.find_record("R-1")[1].model_copy(update={"soap": SoapNotes(a="獣医師の評価")}))
+
+    monkeypatch.setattr(main, "google_ai_service", FakeAIService(before_return=vet_edits))
+    main._process_record_job(_job(), b"audio")
+    record = db.find_record("R-1")[1]
+    assert (record.soap.s, record.soap.a, record.processing_status) == ("", "獣医師の評価", None)
+
+
+def test_delete_record_in_dev_mode(db):
+    assert database.DEV_MODE
+    assert db.delete_record_by_id("R-1") is True
+    assert db.find_record("R-1")[1] is None
+    assert db.get_animal("A-1").records == []
+
+
+def test_jobs_resume_after_the_db_is_ready(monkeypatch):
+    events = []
+    monkeypatch.setattr(main.RECORD_JOBS, "start", lambda handler, on_failure=None: events.append("start"))
+
+    async def run():
+        ready = asyncio.Event()
+
+        async def catch_up():
+            await ready.wait()
+            events.append("caught up")
+
+        catch_up_task = asyncio.create_task(catch_up())
+        resume = asyncio.create_task(main._resume_record_jobs(catch_up_task))
+        await asyncio.sleep(0.05)
+        assert events == []
+        ready.set()
+        await resume
+
+    asyncio.run(run())
+    assert events == ["caught up", "start"]
+
+
+def test_create_record_response(db):
+    r = TestClient(main.app).post("/api/records", data={"animalId": "A-1", "soap_s": "食欲なし"})
+    assert r.status_code == 200
+    body = r.json()
+    assert (body["record"]["soap"]["s"], body["auto_transcribe"], body["job"]) == ("食欲なし", False, None)
+    assert "transcribed_text" not in body
+    assert db.find_record(body["record_id"])[1].soap.s == "食欲なし"
+
+
+@pytest.fixture(autouse=True)
+def _no_stray_timers():
+    yield
+    # 再試行用のタイマーが残っていれば終わるのを待つ
+    for thread in threading.enumerate():
+        if isinstance(thread, threading.Timer):
+            thread.join(1)
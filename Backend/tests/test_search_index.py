@@ -0,0 +1,70 @@
+from search_index import SearchIndex, tokenize
+
+
+def _index(*animals):
+    index = SearchIndex()
+    for animal_id, fields in animals:
+        index.add(animal_id, "animal", fields)
+    return index
+
+
+def _ids(index, query):
+    return [animal_id for animal_id, _score in index.search(query)]
+
+
+def test_tokenize_bigrams_and_short_words():
+    assert tokenize("ＡＢＣ") == ["ab", "bc"]
+    assert tokenize("牛 太郎") == ["牛", "太郎"]
+
+
+def test_single_character_query_matches_single_and_longer_names():
+    index = _index(
+        ("a1", [("name", "牛")]),
+        ("a2", [("name", "牛太郎")]),
+        ("a3", [("name", "花子")]),
+    )
+    assert sorted(_ids(index, "牛")) == ["a1", "a2"]
+
+
+def test_multi_character_query_is_substring_match():
+    index = _index(
+        ("a1", [("name", "はなこ"), ("farm", "F-01")]),
+        ("a2", [("name", "はなよ"), ("farm", "F-02")]),
+    )
+    assert _ids(index, "はなこ") == ["a1"]
+    assert sorted(_ids(index, "はな")) == ["a1", "a2"]
+    assert _ids(index, "f-02") == ["a2"]
+
+
+def test_bigrams_split_across_fields_do_not_match():
+    index = _index(("a1", [("name", "abx"), ("farm", "bcd")]))
+    assert _ids(index, "abcd") == []
+    assert _ids(index, "bcd") == ["a1"]
+
+
+def test_bigrams_split_across_records_do_not_match():
+    index = SearchIndex()
+    index.add("a1", "animal", [("name", "taro")])
+    index.add("a1", "record:r1", [("soap", "ab")])
+    index.add("a1", "record:r2", [("soap", "bc cd")])
+    assert _ids(index, "abcd") == []
+    index.add("a1", "record:r3", [("soap", "xabcdx")])
+    assert _ids(index, "abcd") == ["a1"]
+
+
+def test_removed_source_no_longer_matches():
+    index = SearchIndex()
+    index.add("a1", "animal", [("name", "taro")])
+    index.add("a1", "record:r1", [("soap", "乳房炎")])
+    assert _ids(index, "乳房炎") == ["a1"]
+    index.remove("a1", "record:r1")
+    assert _ids(index, "乳房炎") == []
+    assert _ids(index, "taro") == ["a1"]
+
+
+def test_name_match_ranks_above_record_match():
+    index = SearchIndex()
+    index.add("a1", "animal", [("name", "さくら")])
+    index.add("a2", "animal", [("name", "もも")])
+    index.add("a2", "record:r1", [("soap", "さくらの隣の牛")])
+    assert _ids(index, "さくら") == ["a1", "a2"]
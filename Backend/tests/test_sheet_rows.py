@@ -0,0 +1,99 @@
+import pytest
+
+import database
+from database import InMemoryDB, _animal_row, _record_row
+from fake_sheets import FakeSpreadsheet
+from schemas import Animal, Record, SoapNotes
+from sheets_writer import SheetsWriteQueue
+
+ANIMALS_HEADER = ["microchip_number", "farm_id", "name", "age", "sex", "breed", "thumbnail"]
+RECORDS_HEADER = ["animalId", "id", "visit_date", "s", "o", "a", "p", "meds", "next", "time", "images", "audio", "doctor"]
+
+
+def _record(record_id, s):
+    return Record(id=record_id, animalId="a1", visit_date="2024-05-01", soap=SoapNotes(s=s))
+
+
+@pytest.fixture
+def sheet(monkeypatch):
+    animal = Animal(id="a1", microchip_number="a1", name="はなこ", farm_id="F-01")
+    sheet = FakeSpreadsheet(
+        animals=[ANIMALS_HEADER, _animal_row(animal)],
+        records=[RECORDS_HEADER] + [_record_row(_record(f"r{i}", f"記録{i}")) for i in range(1, 4)],
+    )
+    monkeypatch.setenv("SPREADSHEET_ID", "sheet")
+    monkeypatch.setattr(database, "DEV_MODE", False)
+    monkeypatch.setattr(database, "get_sheets_service", lambda: sheet)
+    monkeypatch.setattr(database, "_SHEETS_WRITER", SheetsWriteQueue(
+        service_factory=database._get_sheets_service, flush_interval=0, max_retries=0
+    ))
+    return sheet
+
+
+@pytest.fixture
+def db(sheet):
+    db = InMemoryDB()
+    db.load_from_sheets()
+    sheet.calls.clear()
+    return db
+
+
+def _column_reads(sheet):
+    return [c for c in sheet.calls if c == ("get", "records!B:B")]
+
+
+def test_rows_are_mapped_on_load(db):
+    assert db._idx.sheet_rows == {"r1": 2, "r2": 3, "r3": 4}
+
+
+def test_update_checks_one_cell_instead_of_the_column(db, sheet):
+    db.update_record_by_id("r2", _record("r2", "訂正"))
+    assert sheet.calls == [("get", "records!B3"), ("update", "records!A3")]
+    assert sheet.tabs["records"][2][3] == "訂正"
+
+
+def test_delete_clears_only_its_row(db, sheet):
+    db.delete_record_by_id("r1")
+    assert sheet.calls == [("get", "records!B2"), ("clear", "records!A2:M2")]
+    assert [row[1] for row in sheet.tabs["records"][1:] if any(row)] == ["r2", "r3"]
+    assert "r1" not in db._idx.sheet_rows
+    # 行は詰めないので、他の記録の行番号はそのまま使える
+    db.update_record_by_id("r3", _record("r3", "訂正"))
+    assert _column_reads(sheet) == []
+    assert sheet.tabs["records"][3][3] == "訂正"
+
+
+def test_moved_rows_are_found_by_rereading_the_column(db, sheet):
+    # 手作業で行が挿入された
+    sheet.tabs["records"].insert(1, _record_row(Record(id="x9", animalId="a1", soap=SoapNotes())))
+    db.update_record_by_id("r2", _record("r2", "訂正"))
+    assert _column_reads(sheet) == [("get", "records!B:B")]
+    assert sheet.tabs["records"][3][1:4] == ["r2", "2024-05-01", "訂正"]
+    assert db._idx.sheet_rows["r2"] == 4
+    sheet.calls.clear()
+    db.update_record_by_id("r3", _record("r3", "訂正"))
+    assert _column_reads(sheet) == []
+
+
+def test_appended_rows_are_mapped_from_the_append_response(db, sheet):
+    db.add_record(_record("r4", "追加"))
+    db.update_record_by_id("r4", _record("r4", "追加（訂正）"))
+    assert _column_reads(sheet) == []
+    assert sheet.tabs["records"][4][1:4] == ["r4", "2024-05-01", "追加（訂正）"]
+    assert db._idx.sheet_rows["r4"] == 5
+
+
+def test_renamed_record_keeps_its_row(db, sheet):
+    db.update_record_by_id("r1", _record("r9", "付け替え"))
+    assert db._idx.sheet_rows.get("r1") is None
+    assert db._idx.sheet_rows["r9"] == 2
+    db.delete_record_by_id("r9")
+    assert _column_reads(sheet) == []
+    assert not any(sheet.tabs["records"][1])
+
+
+def test_record_missing_from_sheets_is_not_found(db, sheet):
+    sheet.tabs["records"][2] = [""] * 13
+    with pytest.raises(database.HTTPException) as e:
+        db.update_record_by_id("r2", _record("r2", "訂正"))
+    assert e.value.status_code == 404
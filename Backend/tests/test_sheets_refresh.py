@@ -0,0 +1,110 @@
+import pytest
+
+import database
+from database import InMemoryDB, _animal_row, _record_row
+from fake_sheets import FakeSpreadsheet
+from schemas import Animal, Record, SoapNotes
+from sheets_writer import SheetsWriteQueue
+
+ANIMALS_HEADER = ["microchip_number", "farm_id", "name", "age", "sex", "breed", "thumbnail"]
+RECORDS_HEADER = ["animalId", "id", "visit_date", "s", "o", "a", "p", "meds", "next", "time", "images", "audio", "doctor"]
+
+
+def _animal(animal_id, name):
+    return Animal(id=animal_id, microchip_number=animal_id, name=name, farm_id="F-01")
+
+
+def _record(record_id, s, animal_id="a1"):
+    return Record(id=record_id, animalId=animal_id, visit_date="2024-05-01", soap=SoapNotes(s=s))
+
+
+@pytest.fixture
+def sheet(monkeypatch):
+    sheet = FakeSpreadsheet(
+        animals=[ANIMALS_HEADER, _animal_row(_animal("a1", "はなこ")), _animal_row(_animal("a2", "たろう"))],
+        records=[RECORDS_HEADER, _record_row(_record("r1", "初診")), _record_row(_record("r2", "再診"))],
+    )
+    monkeypatch.setenv("SPREADSHEET_ID", "sheet")
+    monkeypatch.setattr(database, "DEV_MODE", False)
+    monkeypatch.setattr(database, "get_sheets_service", lambda: sheet)
+    monkeypatch.setattr(database, "_SHEETS_WRITER", SheetsWriteQueue(
+        service_factory=database._get_sheets_service, flush_interval=0, max_retries=0
+    ))
+    return sheet
+
+
+@pytest.fixture
+def db(sheet):
+    db = InMemoryDB()
+    db.load_from_sheets()
+    db._dirty = False
+    return db
+
+
+def _soap(db, animal_id="a1"):
+    return [(r.id, r.soap.s) for r in db.get_records_for_animal(animal_id)]
+
+
+def test_unchanged_sheet_applies_nothing(db):
+    records = db.get_records_for_animal("a1")
+    assert db.refresh_from_sheets() == {"animals": 0, "records": 0, "removed": 0}
+    assert db.get_records_for_animal("a1") is records
+    assert db._dirty is False
+
+
+def test_only_changed_rows_are_applied(db, sheet):
+    untouched = db.find_record("r2")[1]
+    sheet.tabs["records"][1] = _record_row(_record("r1", "初診（訂正）"))
+    sheet.tabs["records"].append(_record_row(_record("r3", "経過観察", animal_id="a2")))
+    sheet.tabs["animals"][1] = _animal_row(_animal("a1", "はなこ2"))
+    assert db.refresh_from_sheets() == {"animals": 1, "records": 2, "removed": 0}
+    assert _soap(db) == [("r1", "初診（訂正）"), ("r2", "再診")]
+    assert _soap(db, "a2") == [("r3", "経過観察")]
+    assert db.find_record("r2")[1] is untouched
+    assert db.get_animal("a1").name == "はなこ2"
+    # 名前の変更は検索インデックスにも反映される
+    assert [a.id for a in db.search_animals("はなこ2")] == ["a1"]
+    assert db._idx.sheet_rows["r3"] == 4
+    assert db._dirty is True
+
+
+def test_removed_rows_are_dropped(db, sheet):
+    sheet.tabs["records"][2] = [""] * 13
+    del sheet.tabs["animals"][2]
+    assert db.refresh_from_sheets() == {"animals": 0, "records": 0, "removed": 2}
+    assert _soap(db) == [("r1", "初診")]
+    assert db.get_animal("a2") is None
+    assert "r2" not in db._idx.sheet_rows
+
+
+def test_fields_not_in_sheets_are_kept(db, sheet):
+    medicated = db.find_record("r1")[1].model_copy(update={"medications": [Record.MedicationEntry(name="ペニシリン")]})
+    db.update_record_by_id("r1", medicated)
+    sheet.tabs["records"][1][6] = "抗生剤"
+    db.refresh_from_sheets()
+    record = db.find_record("r1")[1]
+    assert (record.soap.p, record.medications[0].name) == ("抗生剤", "ペニシリン")
+
+
+def test_own_writes_are_not_reapplied(db):
+    mine = _record("r1", "自分で更新")
+    db.update_record_by_id("r1", mine)
+    assert db.refresh_from_sheets()["records"] == 0
+    assert db.find_record("r1")[1] is mine
+
+
+def test_records_not_yet_written_are_kept(db, monkeypatch):
+    monkeypatch.setattr(database, "_SHEETS_WRITER", SheetsWriteQueue(
+        service_factory=database._get_sheets_service, flush_interval=60
+    ))
+    db.add_record(_record("r4", "書き込み待ち"))
+    assert db.refresh_from_sheets()["removed"] == 0
+    assert _soap(db) == [("r1", "初診"), ("r2", "再診"), ("r4", "書き込み待ち")]
+
+
+def test_record_moved_to_another_animal(db, sheet):
+    sheet.tabs["records"][2] = _record_row(_record("r2", "再診", animal_id="a2"))
+    db.refresh_from_sheets()
+    assert _soap(db) == [("r1", "初診")]
+    assert _soap(db, "a2") == [("r2", "再診")]
+    assert db.find_record("r2")[0::2] == ("a2", 0)
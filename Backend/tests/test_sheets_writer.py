@@ -0,0 +1,105 @@
+import threading
+import time
+
+from sheets_writer import SheetsWriteQueue
+
+
+class _Request:
+    def __init__(self, result=None, error=None):
+        self._result = result
+        self._error = error
+
+    def execute(self):
+        if self._error is not None:
+            raise self._error
+        return self._result
+
+
+class FakeService:
+    """spreadsheets().values().append() だけを記録する Sheets API の代わり。"""
+
+    def __init__(self, errors=()):
+        self.appends = []
+        self._errors = list(errors)
+        self._next_row = {}
+        self._lock = threading.Lock()
+
+    def spreadsheets(self):
+        return self
+
+    def values(self):
+        return self
+
+    def append(self, spreadsheetId, range, valueInputOption, insertDataOption, body):
+        tab = range.split("!")[0]
+        with self._lock:
+            if self._errors:
+                return _Request(error=self._errors.pop(0))
+            rows = body["values"]
+            self.appends.append((tab, rows))
+            first = self._next_row.get(tab, 2)
+            self._next_row[tab] = first + len(rows)
+        return _Request({"updates": {"updatedRange": f"{tab}!A{first}:M{first + len(rows) - 1}"}})
+
+
+class _HttpError(Exception):
+    def __init__(self, status):
+        super().__init__(f"HTTP {status}")
+        self.resp = type("Resp", (), {"status": status})()
+
+
+def _queue(service, **kwargs):
+    kwargs.setdefault("flush_interval", 0.2)
+    kwargs.setdefault("retry_base_delay", 0)
+    return SheetsWriteQueue(service_factory=lambda: service, **kwargs)
+
+
+def test_rows_are_batched_per_tab_and_report_row_numbers():
+    service = FakeService()
+    queue = _queue(service, flush_interval=10)
+    futures = [queue.enqueue("records", [f"r{i}"]) for i in range(3)]
+    animal = queue.enqueue("animals", ["a1"])
+    assert queue.flush(5)
+    assert sorted(service.appends) == [("animals", [["a1"]]), ("records", [["r0"], ["r1"], ["r2"]])]
+    assert [f.result(1) for f in futures] == [2, 3, 4]
+    assert animal.result(1) == 2
+
+
+def test_batch_size_triggers_write_without_waiting():
+    service = FakeService()
+    queue = _queue(service, batch_size=2, flush_interval=10)
+    futures = [queue.enqueue("records", [f"r{i}"]) for i in range(2)]
+    assert [f.result(2) for f in futures] == [2, 3]
+
+
+def test_flush_with_nothing_pending_keeps_batching():
+    service = FakeService()
+    queue = _queue(service, flush_interval=0.5)
+    assert queue.flush(1)
+    queue.enqueue("records", ["r0"])
+    time.sleep(0.1)
+    # 空の flush の後でも、通常の追記は flush_interval まで溜められる
+    assert service.appends == []
+    queue.enqueue("records", ["r1"])
+    assert queue.flush(5)
+    assert service.appends == [("records", [["r0"], ["r1"]])]
+
+
+def test_retryable_errors_are_retried():
+    service = FakeService(errors=[_HttpError(429), _HttpError(503)])
+    queue = _queue(service, max_retries=3)
+    future = queue.enqueue("records", ["r0"], urgent=True)
+    assert future.result(5) == 2
+
+
+def test_non_retryable_error_fails_the_rows():
+    service = FakeService(errors=[_HttpError(400)])
+    queue = _queue(service, max_retries=3)
+    future = queue.enqueue("records", ["r0"], urgent=True)
+    try:
+        future.result(5)
+    except _HttpError as e:
+        assert "400" in str(e)
+    else:
+        raise AssertionError("expected the append to fail")
+    assert service.appends == []
@@ -0,0 +1,166 @@
+import functools
+import gzip
+import json
+import pickle
+import time
+
+import pytest
+
+import database
+import snapshot
+from database import InMemoryDB, _animal_row, _record_row
+from fake_sheets import FakeSpreadsheet
+from schemas import Animal, Record, SoapNotes
+
+
+def _state():
+    animal = Animal(
+        id="a1", microchip_number="a1", name="はなこ", farm_id="F-01",
+        records=[Record(id="r1", animalId="a1", soap=SoapNotes(s="食欲不振"), nosai_points=3)],
+    )
+    return {
+        "animals": {"a1": animal},
+        "sheet_rows": {"r1": 2},
+        "marks": {"animals": 2, "records": 2},
+        "sheet_hashes": {"animals": {"a1": "h1"}, "records": {"r1": "h2"}},
+        "loaded_at": time.time(),
+    }
+
+
+def test_stamp_depends_on_config_and_schema():
+    stamp = snapshot.snapshot_stamp("sheet", "animals", "records")
+    assert stamp == snapshot.snapshot_stamp("sheet", "animals", "records")
+    assert stamp != snapshot.snapshot_stamp("other", "animals", "records")
+    assert stamp != snapshot.snapshot_stamp("sheet", "animals", "records2")
+    assert stamp["format"] == snapshot.SNAPSHOT_FORMAT
+    assert stamp["schema"] == snapshot._schema_hash()
+
+
+def test_round_trip_is_json(tmp_path):
+    path = str(tmp_path / "snap.json.gz")
+    stamp = snapshot.snapshot_stamp("sheet", "animals", "records")
+    assert snapshot.save_snapshot(stamp, _state(), path) > 0
+    payload = json.loads(gzip.decompress(open(path, "rb").read()))
+    assert payload["state"]["animals"]["a1"]["records"][0]["soap"]["s"] == "食欲不振"
+
+    state = snapshot.load_snapshot(stamp, path)
+    animal = state["animals"]["a1"]
+    assert isinstance(animal, Animal)
+    assert isinstance(animal.records[0], Record)
+    assert animal.records[0].nosai_points == 3
+    assert state["sheet_rows"] == {"r1": 2}
+    assert state["marks"] == {"animals": 2, "records": 2}
+    assert state["sheet_hashes"] == {"animals": {"a1": "h1"}, "records": {"r1": "h2"}}
+
+
+def test_mismatched_or_old_snapshot_is_ignored(tmp_path):
+    path = str(tmp_path / "snap.json.gz")
+    stamp = snapshot.snapshot_stamp("sheet", "animals", "records")
+    snapshot.save_snapshot(stamp, _state(), path)
+    assert snapshot.load_snapshot(snapshot.snapshot_stamp("other", "animals", "records"), path) is None
+    assert snapshot.load_snapshot(stamp, path, max_age=-1) is None
+    assert snapshot.load_snapshot(stamp, str(tmp_path / "missing.json.gz")) is None
+
+
+def test_age_is_measured_from_the_last_full_load(tmp_path):
+    path = str(tmp_path / "snap.json.gz")
+    stamp = snapshot.snapshot_stamp("sheet", "animals", "records")
+    state = _state()
+    state["loaded_at"] = time.time() - 3600
+    # 保存したのが今でも、全件読み込みが古ければ使わない
+    snapshot.save_snapshot(stamp, state, path)
+    assert snapshot.load_snapshot(stamp, path, max_age=1800) is None
+    assert snapshot.load_snapshot(stamp, path, max_age=7200)["loaded_at"] == state["loaded_at"]
+
+
+class _Exploit:
+    ran = False
+
+    def __reduce__(self):
+        return (setattr, (_Exploit, "ran", True))
+
+
+def test_pickled_payload_is_never_unpickled(tmp_path):
+    path = tmp_path / "snap.json.gz"
+    stamp = snapshot.snapshot_stamp("sheet", "animals", "records")
+    path.write_bytes(pickle.dumps({"stamp": stamp, "created_at": 0, "state": _Exploit()}))
+    assert snapshot.load_snapshot(stamp, str(path)) is None
+    path.write_bytes(gzip.compress(pickle.dumps(_Exploit())))
+    assert snapshot.load_snapshot(stamp, str(path)) is None
+    assert _Exploit.ran is False
+
+
+def test_invalid_model_data_is_ignored(tmp_path):
+    path = tmp_path / "snap.json.gz"
+    stamp = snapshot.snapshot_stamp("sheet", "animals", "records")
+    payload = {"stamp": stamp, "created_at": time.time(),
+               "state": {"animals": {"a1": {"records": "not a list"}}, "sheet_rows": {}, "marks": {}}}
+    path.write_bytes(gzip.compress(json.dumps(payload).encode("utf-8")))
+    assert snapshot.load_snapshot(stamp, str(path)) is None
+
+
+ANIMALS_HEADER = ["microchip_number", "farm_id", "name", "age", "sex", "breed", "thumbnail"]
+RECORDS_HEADER = ["animalId", "id", "visit_date", "s", "o", "a", "p", "meds", "next", "time", "images", "audio", "doctor"]
+
+
+def _record(record_id, s):
+    return Record(id=record_id, animalId="a1", visit_date="2024-05-01", soap=SoapNotes(s=s))
+
+
+@pytest.fixture
+def sheets(tmp_path, monkeypatch):
+    animal = Animal(id="a1", microchip_number="a1", name="はなこ", farm_id="F-01")
+    sheet = FakeSpreadsheet(
+        animals=[ANIMALS_HEADER, _animal_row(animal)],
+        records=[RECORDS_HEADER, _record_row(_record("r1", "初診")), _record_row(_record("r2", "再診"))],
+    )
+    path = str(tmp_path / "snap.json.gz")
+    monkeypatch.setenv("SPREADSHEET_ID", "sheet")
+    monkeypatch.setattr(database, "DEV_MODE", False)
+    monkeypatch.setattr(database, "get_sheets_service", lambda: sheet)
+    monkeypatch.setattr(database, "save_snapshot", functools.partial(snapshot.save_snapshot, path=path))
+    monkeypatch.setattr(database, "load_snapshot", functools.partial(snapshot.load_snapshot, path=path))
+    return sheet
+
+
+def _boot():
+    db = InMemoryDB()
+    db.load()
+    return db
+
+
+def test_catch_up_applies_rows_changed_after_the_snapshot(sheets):
+    first = _boot()
+    assert first.needs_catch_up is False
+    # スナップショット保存後に r1 を書き換え、r2 を削除し、r3 を追記した（保存前に落ちた場合と同じ）
+    sheets.tabs["records"][1] = _record_row(_record("r1", "初診（訂正）"))
+    sheets.tabs["records"][2] = [""] * 13
+    sheets.tabs["records"].append(_record_row(_record("r3", "経過観察")))
+
+    db = _boot()
+    assert db.needs_catch_up is True
+    assert [r.id for r in db.get_records_for_animal("a1")] == ["r1", "r2"]
+    db.catch_up_from_sheets()
+    assert [(r.id, r.soap.s) for r in db.get_records_for_animal("a1")] == [("r1", "初診（訂正）"), ("r3", "経過観察")]
+    assert db.find_record("r2")[1] is None
+
+    # 取り込んだ結果が保存され、次の起動でも削除した記録は戻らない
+    again = _boot()
+    assert [r.id for r in again.get_records_for_animal("a1")] == ["r1", "r3"]
+
+
+def test_catch_up_without_refresh_keeps_the_old_load_time(sheets, monkeypatch):
+    first = _boot()
+    loaded_at = first._sheets_loaded_at
+    db = _boot()
+
+    def fail():
+        raise RuntimeError("quota exceeded")
+
+    monkeypatch.setattr(db, "refresh_from_sheets", fail)
+    db.catch_up_from_sheets()
+    assert db._sheets_loaded_at == loaded_at
+    state = database.load_snapshot(db._snapshot_stamp())
+    assert state["loaded_at"] == loaded_at
+    # 期限を過ぎれば、差分の取り込みだけで保存し直していても全件読み込みになる
+    assert database.load_snapshot(db._snapshot_stamp(), max_age=time.time() - loaded_at - 1) is None
@@ -0,0 +1,181 @@
+import threading
+
+import pytest
+
+import database
+from database import InMemoryDB
+from fake_sheets import FakeSpreadsheet
+from schemas import Animal, Record, SoapNotes
+from sheets_writer import SheetsReplicator, SheetsWriteQueue
+from sqlite_store import SQLiteStore
+
+
+def _animal(animal_id="a1"):
+    return Animal(id=animal_id, microchip_number=animal_id, name="はなこ", farm_id="F-01", records=[])
+
+
+def test_store_round_trip(tmp_path):
+    path = str(tmp_path / "db.sqlite3")
+    store = SQLiteStore(path)
+    store.save_animal(_animal())
+    record = Record(
+        id="r1", animalId="a1", soap=SoapNotes(s="食欲不振"),
+        medications=[Record.MedicationEntry(name="ペニシリン", dose="5ml")], nosai_points=12,
+    )
+    store.save_record(record)
+    store.save_record(Record(id="r2", animalId="a1", soap=SoapNotes(s="x")))
+    assert store.update_record("r1", record.model_copy(update={"soap": SoapNotes(s="回復")}))
+    assert store.delete_record("r2")
+    assert not store.update_record("missing", record)
+
+    animals = SQLiteStore(path).load_animals()
+    assert list(animals) == ["a1"]
+    records = animals["a1"].records
+    assert [r.id for r in records] == ["r1"]
+    assert records[0].soap.s == "回復"
+    assert records[0].medications[0].name == "ペニシリン"
+    assert records[0].nosai_points == 12
+
+
+def test_replicator_runs_in_submission_order():
+    calls = []
+    gate = threading.Event()
+    replicator = SheetsReplicator(retry_base_delay=0)
+
+    def update(record_id, value):
+        gate.wait(5)
+        calls.append(("update", record_id, value))
+
+    def clear(record_id):
+        calls.append(("clear", record_id))
+
+    replicator.submit(update, "r1", 1)
+    replicator.submit(update, "r1", 2)
+    replicator.submit(clear, "r1")
+    gate.set()
+    assert replicator.flush(5)
+    assert calls == [("update", "r1", 1), ("update", "r1", 2), ("clear", "r1")]
+
+
+def test_replicator_retries_without_reordering():
+    calls = []
+    failures = {"n": 2}
+    replicator = SheetsReplicator(max_retries=5, retry_base_delay=0)
+
+    def flaky(record_id):
+        if failures["n"]:
+            failures["n"] -= 1
+            raise RuntimeError("quota")
+        calls.append(("flaky", record_id))
+
+    replicator.submit(flaky, "r1")
+    replicator.submit(lambda record_id: calls.append(("next", record_id)), "r2")
+    assert replicator.flush(5)
+    assert calls == [("flaky", "r1"), ("next", "r2")]
+
+
+def test_replicator_drops_permanent_failures():
+    attempts = []
+
+    class NotFound(Exception):
+        status_code = 404
+
+    def missing(record_id):
+        attempts.append(record_id)
+        raise NotFound()
+
+    replicator = SheetsReplicator(
+        max_retries=5, retry_base_delay=0, permanent=lambda e: getattr(e, "status_code", None) == 404
+    )
+    replicator.submit(missing, "r1")
+    assert replicator.flush(5)
+    assert attempts == ["r1"]
+    assert replicator.pending_count() == 0
+
+
+def test_outbox_is_written_with_the_change(tmp_path):
+    store = SQLiteStore(str(tmp_path / "db.sqlite3"))
+    store.save_animal(_animal(), outbox_id="o1")
+    store.save_record(Record(id="r1", animalId="a1", soap=SoapNotes(s="x")), outbox_id="o2")
+    store.save_record(Record(id="r2", animalId="a1", soap=SoapNotes(s="y")))
+    assert store.update_record("r1", Record(id="r1", animalId="a1", soap=SoapNotes(s="z")), outbox_id="o3")
+    assert not store.update_record("missing", Record(id="missing", animalId="a1", soap=SoapNotes()), outbox_id="o4")
+    assert store.delete_record("r2", outbox_id="o5")
+    assert not store.delete_record("r2", outbox_id="o6")
+
+    entries = SQLiteStore(store.path).pending_outbox()
+    assert [(i, op, key) for i, op, key, _ in entries] == [
+        ("o1", "save_animal", "a1"), ("o2", "save_record", "r1"), ("o3", "update_record", "r1"), ("o5", "delete_record", "r2"),
+    ]
+    assert Record.model_validate_json(entries[2][3]).soap.s == "z"
+    store.outbox_done("o1")
+    assert [e[0] for e in store.pending_outbox()] == ["o2", "o3", "o5"]
+
+
+RECORDS_HEADER = ["animalId", "id", "visit_date", "s", "o", "a", "p", "meds", "next", "time", "images", "audio", "doctor"]
+
+
+@pytest.fixture
+def replica(monkeypatch):
+    sheet = FakeSpreadsheet(animals=[["microchip_number"]], records=[RECORDS_HEADER])
+    monkeypatch.setenv("SPREADSHEET_ID", "sheet")
+    monkeypatch.setattr(database, "DEV_MODE", False)
+    monkeypatch.setattr(database, "get_sheets_service", lambda: sheet)
+    monkeypatch.setattr(database, "_SHEETS_WRITER", SheetsWriteQueue(
+        service_factory=database._get_sheets_service, flush_interval=0, max_retries=0, retry_base_delay=0
+    ))
+    monkeypatch.setattr(database, "_SHEETS_REPLICATOR", SheetsReplicator(max_retries=0, retry_base_delay=0))
+    return sheet
+
+
+def _records_tab(sheet):
+    return [(row[1], row[3]) for row in sheet.tabs["records"][1:] if any(row)]
+
+
+def test_replicated_writes_leave_no_outbox(tmp_path, replica):
+    db = InMemoryDB(store=SQLiteStore(str(tmp_path / "db.sqlite3")))
+    db.load()
+    db.add_animal(_animal())
+    db.add_record(Record(id="r1", animalId="a1", soap=SoapNotes(s="初診")))
+    db.add_record(Record(id="r2", animalId="a1", soap=SoapNotes(s="再診")))
+    assert db.flush_pending_writes(5)
+    db.update_record_by_id("r1", Record(id="r1", animalId="a1", soap=SoapNotes(s="初診（訂正）")))
+    db.delete_record_by_id("r2")
+    assert db.flush_pending_writes(5)
+    assert _records_tab(replica) == [("r1", "初診（訂正）")]
+    assert db.store.pending_outbox() == []
+
+
+def test_unreplicated_writes_are_replayed_on_startup(tmp_path, replica, monkeypatch):
+    path = str(tmp_path / "db.sqlite3")
+    db = InMemoryDB(store=SQLiteStore(path))
+    db.load()
+    monkeypatch.setattr(database, "get_sheets_service", lambda: (_ for _ in ()).throw(RuntimeError("offline")))
+    db.add_animal(_animal())
+    db.add_record(Record(id="r1", animalId="a1", soap=SoapNotes(s="初診")))
+    db.add_record(Record(id="r2", animalId="a1", soap=SoapNotes(s="再診")))
+    db.flush_pending_writes(5)
+    db.update_record_by_id("r1", Record(id="r1", animalId="a1", soap=SoapNotes(s="初診（訂正）")))
+    db.delete_record_by_id("r2")
+    db.flush_pending_writes(5)
+    # SQLite には書けたが Sheets には1件も届いていない
+    assert _records_tab(replica) == []
+    assert len(db.store.pending_outbox()) == 5
+
+    monkeypatch.setattr(database, "get_sheets_service", lambda: replica)
+    restarted = InMemoryDB(store=SQLiteStore(path))
+    restarted.load()
+    assert restarted.flush_pending_writes(5)
+    assert _records_tab(replica) == [("r1", "初診（訂正）")]
+    assert replica.tabs["animals"][1][0] == "a1"
+    assert restarted.store.pending_outbox() == []
+
+
+def test_outbox_is_not_used_without_sheets(tmp_path):
+    assert database.DEV_MODE
+    db = InMemoryDB(store=SQLiteStore(str(tmp_path / "db.sqlite3")))
+    db.load()
+    db.add_animal(_animal())
+    db.add_record(Record(id="r1", animalId="a1", soap=SoapNotes(s="初診")))
+    db.delete_record_by_id("r1")
+    assert db.store.pending_outbox() == []
@@ -0,0 +1,148 @@
+import threading
+import time
+
+import pytest
+from fastapi.testclient import TestClient
+
+import main
+from audio_service import Recognition
+from transcription_jobs import TranscriptionJobs
+
+
+class FakeAudioService:
+    def __init__(self, segments=None, error=None, truncated=False):
+        self.segments = segments if segments is not None else [("右前肢の跛行", 12.5), ("腫脹あり", 48.0)]
+        self.error = error
+        self.truncated = truncated
+        self.release = threading.Event()
+        self.release.set()
+        self.calls = []
+
+    def long_running_recognize(self, audio_data, filename, language_code=None, on_progress=None, on_segment=None):
+        self.calls.append((audio_data, filename, language_code))
+        # 先頭の区間だけ認識できた状態で止まる
+        for text, end in self.segments[:1]:
+            on_segment(text, end)
+        on_progress(50)
+        self.release.wait(5)
+        if self.error is not None:
+            raise self.error
+        for text, end in self.segments[1:]:
+            on_segment(text, end)
+        return Recognition(self.segments, True, self.truncated)
+
+    def recognize_audio_data(self, audio_data, filename, language_code=None):
+        return Recognition(self.segments, True, self.truncated)
+
+
+def _wait(jobs, job_id, statuses=("done", "error"), timeout=5.0):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        job = jobs.get(job_id)
+        if job["status"] in statuses:
+            return job
+        time.sleep(0.01)
+    raise AssertionError(f"job {job_id} did not reach {statuses}: {jobs.get(job_id)}")
+
+
+def test_job_runs_in_background_and_reports_progress():
+    jobs = TranscriptionJobs()
+    service = FakeAudioService()
+    service.release.clear()
+    job = jobs.submit(service, b"audio", "long.webm", language_code="ja-JP")
+    assert job["status"] == "pending"
+    assert job["file_size"] == 5
+    running = _wait(jobs, job["job_id"], statuses=("running",))
+    deadline = time.time() + 5
+    while jobs.get(job["job_id"])["progress"] != 50 and time.time() < deadline:
+        time.sleep(0.01)
+    assert jobs.get(job["job_id"])["progress"] == 50
+    assert running["transcription"] is None
+    service.release.set()
+    done = _wait(jobs, job["job_id"])
+    assert done["status"] == "done"
+    assert done["progress"] == 100
+    assert done["transcription"] == "右前肢の跛行 腫脹あり"
+    assert done["truncated"] is False
+    assert done["segments"] == [
+        {"text": "右前肢の跛行", "end_seconds": 12.5},
+        {"text": "腫脹あり", "end_seconds": 48.0},
+    ]
+    assert service.calls == [(b"audio", "long.webm", "ja-JP")]
+
+
+def test_segments_are_visible_before_the_job_finishes():
+    jobs = TranscriptionJobs()
+    service = FakeAudioService()
+    service.release.clear()
+    job_id = jobs.submit(service, b"audio", "long.webm")["job_id"]
+    deadline = time.time() + 5
+    while not jobs.get(job_id)["segments"] and time.time() < deadline:
+        time.sleep(0.01)
+    partial = jobs.get(job_id)
+    assert partial["status"] == "running"
+    assert partial["segments"] == [{"text": "右前肢の跛行", "end_seconds": 12.5}]
+    service.release.set()
+    assert len(_wait(jobs, job_id)["segments"]) == 2
+
+
+def test_truncated_audio_is_reported():
+    jobs = TranscriptionJobs()
+    job_id = jobs.submit(FakeAudioService(truncated=True), b"audio", "long.webm")["job_id"]
+    assert _wait(jobs, job_id)["truncated"] is True
+
+
+def test_failed_job_reports_error():
+    jobs = TranscriptionJobs()
+    job = jobs.submit(FakeAudioService(error=RuntimeError("quota exceeded")), b"audio", "long.webm")
+    failed = _wait(jobs, job["job_id"])
+    assert failed["status"] == "error"
+    assert failed["error"] == "quota exceeded"
+    assert failed["transcription"] is None
+
+
+def test_get_returns_a_copy():
+    jobs = TranscriptionJobs()
+    job_id = jobs.submit(FakeAudioService(), b"audio", "long.webm")["job_id"]
+    done = _wait(jobs, job_id)
+    done["segments"].clear()
+    assert len(jobs.get(job_id)["segments"]) == 2
+    assert jobs.get("missing") is None
+
+
+def test_finished_jobs_are_purged_after_ttl():
+    jobs = TranscriptionJobs(ttl_seconds=0)
+    first = jobs.submit(FakeAudioService(), b"audio", "a.webm")["job_id"]
+    _wait(jobs, first)
+    time.sleep(0.01)
+    second = jobs.submit(FakeAudioService(), b"audio", "b.webm")["job_id"]
+    assert jobs.get(first) is None
+    assert jobs.get(second) is not None
+
+
+@pytest.fixture
+def client(monkeypatch):
+    service = FakeAudioService()
+    monkeypatch.setattr(main, "google_audio_service", service)
+    monkeypatch.setattr(main, "TRANSCRIPTION_JOBS", TranscriptionJobs())
+    return TestClient(main.app), service
+
+
+def test_job_endpoints(client):
+    client, service = client
+    r = client.post("/api/transcribe/jobs", files={"audio": ("long.webm", b"audio", "audio/webm")}, data={"lang": "en-US"})
+    assert r.status_code == 202
+    job_id = r.json()["job_id"]
+    _wait(main.TRANSCRIPTION_JOBS, job_id)
+    body = client.get(f"/api/transcribe/jobs/{job_id}").json()
+    assert (body["status"], body["transcription"]) == ("done", "右前肢の跛行 腫脹あり")
+    assert service.calls[0][2] == "en-US"
+    assert client.get("/api/transcribe/jobs/missing").status_code == 404
+
+
+def test_transcribe_reports_truncation(client):
+    client, service = client
+    r = client.post("/api/transcribe", files={"audio": ("memo.webm", b"audio", "audio/webm")})
+    assert (r.json()["transcription"], r.json()["truncated"]) == ("右前肢の跛行 腫脹あり", False)
+    service.truncated = True
+    assert client.post("/api/transcribe", files={"audio": ("memo.webm", b"audio", "audio/webm")}).json()["truncated"] is True
@@ -0,0 +1,109 @@
+import asyncio
+import json
+
+import pytest
+
+import main
+from ai_cache import ResponseCache
+from ai_service import GoogleAIService
+from schemas import SoapNotes
+
+SOAP = SoapNotes(s="食欲なし", o="体温 39.8", a="肺炎疑い", p="抗生剤投与")
+
+
+class Response:
+    def __init__(self, text):
+        self.text = text
+
+
+class FakeModel:
+    """プロンプトの種類ごとに応答を返す Gemini の代わり。"""
+
+    def __init__(self):
+        self.structured = lambda fields: {k: f"EN:{v}" for k, v in fields.items()}
+        self.failing_texts = set()
+        self.calls = []
+
+    def generate_content(self, prompt):
+        if prompt.startswith("You are a professional veterinary translator"):
+            self.calls.append("soap")
+            fields = json.loads(prompt[prompt.index("{"):])
+            result = self.structured(fields)
+            return Response(result if isinstance(result, str) else json.dumps(result, ensure_ascii=False))
+        text = prompt.split("TEXT:\n", 1)[1]
+        self.calls.append(text)
+        if text in self.failing_texts:
+            raise RuntimeError("quota exceeded")
+        return Response(f"en:{text}")
+
+
+@pytest.fixture
+def model(monkeypatch):
+    monkeypatch.setenv("GEMINI_API_KEY", "test")
+    service = GoogleAIService()
+    service.cache = ResponseCache(disk_path=None)
+    service._model = FakeModel()
+    monkeypatch.setattr(main, "google_ai_service", service)
+    return service._model
+
+
+def _translate(soap=SOAP):
+    return asyncio.run(main._translate_soap_notes(soap, "en"))
+
+
+def test_structured_translation_uses_one_call(model):
+    soap, info = _translate()
+    assert soap.model_dump() == {k: f"EN:{v}" for k, v in SOAP.model_dump().items()}
+    assert info == {"target_lang": "en", "status": "complete", "failed_fields": []}
+    assert model.calls == ["soap"]
+
+
+def test_invalid_json_falls_back_per_field(model):
+    model.structured = lambda fields: "not json"
+    soap, info = _translate()
+    assert soap.model_dump() == {k: f"en:{v}" for k, v in SOAP.model_dump().items()}
+    assert info["status"] == "complete"
+    assert model.calls[0] == "soap"
+    assert sorted(model.calls[1:]) == sorted(SOAP.model_dump().values())
+
+
+def test_only_missing_fields_are_retried(model):
+    model.structured = lambda fields: {"s": f"EN:{fields['s']}", "o": f"EN:{fields['o']}", "a": "", "p": 1}
+    soap, info = _translate()
+    assert (soap.s, soap.o, soap.a, soap.p) == ("EN:食欲なし", "EN:体温 39.8", "en:肺炎疑い", "en:抗生剤投与")
+    assert info["status"] == "complete"
+    assert sorted(model.calls[1:]) == sorted([SOAP.a, SOAP.p])
+
+
+def test_failed_fields_keep_original_text(model):
+    model.structured = lambda fields: "not json"
+    model.failing_texts = {SOAP.p}
+    soap, info = _translate()
+    assert soap.p == SOAP.p
+    assert soap.s == f"en:{SOAP.s}"
+    assert info == {"target_lang": "en", "status": "partial", "failed_fields": ["p"]}
+
+
+def test_all_fields_failed(model):
+    model.structured = lambda fields: "not json"
+    model.failing_texts = set(SOAP.model_dump().values())
+    soap, info = _translate()
+    assert soap == SOAP
+    assert info["status"] == "failed"
+    assert info["failed_fields"] == ["s", "o", "a", "p"]
+
+
+def test_empty_fields_are_not_sent(model):
+    soap, info = _translate(SoapNotes(s="食欲なし", o="", a="", p=""))
+    assert soap.model_dump() == {"s": "EN:食欲なし", "o": "", "a": "", "p": ""}
+    assert info["status"] == "complete"
+    assert _translate(SoapNotes(s="", o="", a="", p=""))[1]["status"] == "complete"
+    assert model.calls == ["soap"]
+
+
+def test_translate_text_returns_original_on_error(model):
+    service = main.google_ai_service
+    model.failing_texts = {"こんにちは"}
+    assert service.translate_text("こんにちは", "en") == "こんにちは"
+    with pytest.raises(RuntimeError):
+        service.translate_text("こんにちは", "en", raise_on_error=True)
@@ -0,0 +1,100 @@
+import pytest
+from fastapi import FastAPI, Request
+from fastapi.testclient import TestClient
+
+import main
+import storage
+from request_limits import RequestSizeLimitMiddleware
+
+
+@pytest.fixture
+def limited():
+    app = FastAPI()
+    app.add_middleware(RequestSizeLimitMiddleware, max_bytes=100)
+    calls = []
+
+    @app.post("/echo")
+    async def echo(request: Request):
+        body = await request.body()
+        calls.append(len(body))
+        return {"size": len(body)}
+
+    return TestClient(app), calls
+
+
+def test_content_length_over_limit_returns_413_without_reading(limited):
+    client, calls = limited
+    r = client.post("/echo", content=b"x" * 101)
+    assert r.status_code == 413
+    assert r.json() == {"detail": "リクエストが大きすぎます"}
+    assert calls == []
+
+
+def test_streamed_body_over_limit_returns_413(limited):
+    client, calls = limited
+
+    def chunks():
+        for _ in range(5):
+            yield b"x" * 30
+
+    # ジェネレータで送ると Content-Length が付かず、受信しながら数える
+    r = client.post("/echo", content=chunks())
+    assert r.status_code == 413
+    assert calls == []
+
+
+def test_body_within_limit_passes(limited):
+    client, calls = limited
+    r = client.post("/echo", content=b"x" * 100)
+    assert r.status_code == 200
+    assert calls == [100]
+
+
+def test_zero_disables_limit():
+    app = FastAPI()
+    app.add_middleware(RequestSizeLimitMiddleware, max_bytes=0)
+
+    @app.post("/echo")
+    async def echo(request: Request):
+        return {"size": len(await request.body())}
+
+    assert TestClient(app).post("/echo", content=b"x" * 1000).json() == {"size": 1000}
+
+
+@pytest.fixture
+def uploads(tmp_path, monkeypatch):
+    monkeypatch.setattr(storage, "UPLOAD_DIR", str(tmp_path))
+    monkeypatch.setattr(storage, "GCS_BUCKET_NAME", None)
+    monkeypatch.setattr(main, "MAX_IMAGE_UPLOAD_BYTES", 100)
+    monkeypatch.setattr(main, "MAX_AUDIO_UPLOAD_BYTES", 100)
+    return TestClient(main.app), tmp_path
+
+
+def test_oversize_image_upload_returns_400_and_leaves_no_file(uploads):
+    client, upload_dir = uploads
+    r = client.post("/api/uploads/images", files={"file": ("big.jpg", b"x" * 101, "image/jpeg")})
+    assert r.status_code == 400
+    assert "MB以下" in r.json()["detail"]
+    assert list(upload_dir.iterdir()) == []
+
+
+def test_image_upload_at_limit_is_saved(uploads):
+    client, upload_dir = uploads
+    # 画像として読めないので元ファイルのまま内容ハッシュ名で保存される
+    r = client.post("/api/uploads/images", files={"file": ("note.bin", b"x" * 100, "application/octet-stream")})
+    assert r.status_code == 200
+    key = r.json()["key"]
+    assert (upload_dir / key).read_bytes() == b"x" * 100
+
+
+def test_oversize_audio_returns_400(uploads, monkeypatch):
+    client, _ = uploads
+
+    class NeverCalled:
+        def transcribe_audio_data(self, *args, **kwargs):
+            raise AssertionError("oversize audio must not be transcribed")
+
+    monkeypatch.setattr(main, "google_audio_service", NeverCalled())
+    r = client.post("/api/transcribe", files={"audio": ("memo.webm", b"x" * 101, "audio/webm")})
+    assert r.status_code == 400
+    assert "MB以下" in r.json()["detail"]
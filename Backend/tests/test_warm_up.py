@@ -0,0 +1,28 @@
+import asyncio
+
+import main
+
+
+class _FailingService:
+    def __init__(self):
+        self.calls = 0
+
+    def warm_up(self):
+        self.calls += 1
+        raise RuntimeError("transient credentials error")
+
+
+class _Service:
+    def warm_up(self):
+        pass
+
+
+def test_failed_warm_up_keeps_services(monkeypatch):
+    speech, gemini = _FailingService(), _Service()
+    monkeypatch.setattr(main, "google_audio_service", speech)
+    monkeypatch.setattr(main, "google_ai_service", gemini)
+    monkeypatch.setattr(main, "STARTUP_WARMUP_DELAY", 0)
+    asyncio.run(main._warm_up())
+    assert speech.calls == 1
+    assert main.google_audio_service is speech
+    assert main.google_ai_service is gemini
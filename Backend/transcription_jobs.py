@@ -0,0 +1,101 @@
+import threading
+import time
+import uuid
+from typing import Dict, Optional
+
+from executors import get_executor
+
+# 完了したジョブを保持する時間（秒）
+JOB_TTL_SECONDS = 60 * 60
+
+
+class TranscriptionJobs:
+    """長時間音声の書き起こしジョブ（プロセス内・メモリ保持）。
+
+    submit したジョブは speech_long プールで long_running_recognize を実行し、
+    進捗と区間ごとの書き起こし結果を get() でポーリングできる。区間の結果は
+    認識できたものから segments に追加されるので、完了前でも途中まで読める。
+    """
+
+    def __init__(self, ttl_seconds: float = JOB_TTL_SECONDS):
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        self._jobs: Dict[str, dict] = {}
+
+    def submit(self, audio_service, audio_data: bytes, filename: str, language_code: Optional[str] = None) -> dict:
+        self._purge()
+        job_id = uuid.uuid4().hex
+        job = {
+            "job_id": job_id,
+            "status": "pending",
+            "progress": 0,
+            "filename": filename,
+            "file_size": len(audio_data),
+            "segments": [],
+            "transcription": None,
+            # 音声が AUDIO_MAX_SECONDS を超え、後ろの部分を書き起こしていない
+            "truncated": False,
+            "error": None,
+            "created_at": time.time(),
+            "updated_at": time.time(),
+        }
+        with self._lock:
+            self._jobs[job_id] = job
+            # 実行が始まる前の状態を返す（ワーカーが先に job を更新することがある）
+            snapshot = dict(job)
+        get_executor("speech_long").submit(self._run, job_id, audio_service, audio_data, filename, language_code)
+        return snapshot
+
+    def get(self, job_id: str) -> Optional[dict]:
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return None
+            snapshot = dict(job)
+            snapshot["segments"] = list(job["segments"])
+            return snapshot
+
+    def _update(self, job_id: str, **fields) -> None:
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is not None:
+                job.update(fields)
+                job["updated_at"] = time.time()
+
+    def _add_segment(self, job_id: str, text: str, end_seconds: float) -> None:
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is not None:
+                job["segments"].append({"text": text, "end_seconds": end_seconds})
+                job["updated_at"] = time.time()
+
+    def _run(self, job_id: str, audio_service, audio_data: bytes, filename: str, language_code: Optional[str]) -> None:
+        self._update(job_id, status="running")
+        try:
+            recognition = audio_service.long_running_recognize(
+                audio_data,
+                filename,
+                language_code=language_code,
+                on_progress=lambda pct: self._update(job_id, progress=pct),
+                on_segment=lambda text, end: self._add_segment(job_id, text, end),
+            )
+            self._update(
+                job_id,
+                status="done",
+                progress=100,
+                segments=[{"text": t, "end_seconds": end} for t, end in recognition.segments],
+                transcription=recognition.text,
+                truncated=recognition.truncated,
+            )
+        except Exception as e:
+            print(f"[stt-job] {job_id} failed: {e}")
+            self._update(job_id, status="error", error=str(e))
+
+    def _purge(self) -> None:
+        cutoff = time.time() - self.ttl_seconds
+        with self._lock:
+            for job_id in [k for k, j in self._jobs.items() if j["status"] in ("done", "error") and j["updated_at"] < cutoff]:
+                del self._jobs[job_id]
+
+
+TRANSCRIPTION_JOBS = TranscriptionJobs()
@@ -2,12 +2,16 @@
 
 import React, { useEffect, useState } from "react";
 import { useParams, useRouter } from "next/navigation";
-import type { AnimalDetailData, Appointment, Record } from "@/types";
+import type { AnimalDetailData, Appointment, Record, RecordCreationResponse, RecordJob } from "@/types";
 import { api } from "@/lib/api";
 import { updateAppointments } from "@/lib/dataService";
 import AnimalDetail from "@/components/animal/AnimalDetail";
 import { Loader2 } from "lucide-react";
 
+// 自動書き起こしジョブの確認間隔と打ち切りまでの回数（約10分）
+const RECORD_JOB_POLL_MS = 3000;
+const RECORD_JOB_MAX_POLLS = 200;
+
 export default function AnimalDetailPage() {
   const params = useParams<{ id: string }>();
   const router = useRouter();
@@ -40,6 +44,45 @@ export default function AnimalDetailPage() {
     // eslint-disable-next-line react-hooks/exhaustive-deps
   }, [animalId]);
 
+  // 表示中の画面から離れたらジョブの確認をやめる
+  const pollingRef = React.useRef(true);
+  useEffect(() => {
+    pollingRef.current = true;
+    return () => {
+      pollingRef.current = false;
+    };
+  }, [animalId]);
+
+  // 記録作成時の自動書き起こしジョブが終わるまで待ち、終わったら記録を差し替える
+  const watchRecordJob = async (job: RecordJob, microchip_number: string) => {
+    if (!api.getRecordJob) return;
+    for (let i = 0; i < RECORD_JOB_MAX_POLLS && pollingRef.current; i++) {
+      await new Promise((resolve) => setTimeout(resolve, RECORD_JOB_POLL_MS));
+      let current: RecordJob;
+      try {
+        current = await api.getRecordJob(job.job_id);
+      } catch (e) {
+        continue;
+      }
+      if (current.status !== "done" && current.status !== "error") continue;
+      if (!pollingRef.current) return;
+      const finished = current.record;
+      if (finished) {
+        setData((prev) =>
+          prev
+            ? { ...prev, records: prev.records.map((r: Record) => (r.id === finished.id ? finished : r)) }
+            : prev
+        );
+      } else {
+        setData(await api.fetchAnimalDetail(microchip_number));
+      }
+      if (current.status === "error") {
+        setError(`自動書き起こしに失敗しました${current.error ? `: ${current.error}` : ""}`);
+      }
+      return;
+    }
+  };
+
   const handleSaveRecord = async (
     microchip_number: string,
     recordData: Omit<Record, "id" | "visit_date">
@@ -47,14 +90,21 @@ export default function AnimalDetailPage() {
     setLoading(true);
     setError("");
     try {
-      await api.createRecord({
+      const anyData: any = recordData;
+      const created: RecordCreationResponse | undefined = await api.createRecord({
         animalId: microchip_number,
         // @ts-ignore 既存型の差異はサーバ側で受付
         soap: recordData.soap,
+        audio: anyData.audio,
+        autoTranscribe: anyData.autoTranscribe,
       });
       const refreshed = await api.fetchAnimalDetail(microchip_number);
       setData(refreshed);
       setAppointments(await updateAppointments());
+      // 書き起こしはバックグラウンドで続くので、保存処理の完了は待たせない
+      if (created?.job && created.job.status !== "done") {
+        watchRecordJob(created.job, microchip_number);
+      }
     } catch (e) {
       setError("記録の保存に失敗しました");
     } finally {
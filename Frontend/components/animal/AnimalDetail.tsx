@@ -19,7 +19,7 @@ import {
 } from "lucide-react";
 import NewRecordForm from "../record/NewRecordForm";
 import Translatable from "@/components/shared/Translatable";
-import { TIME_OPTIONS } from "@/lib/utils";
+import { TIME_OPTIONS, imageVariantUrl } from "@/lib/utils";
 
 interface AnimalDetailProps {
   data: any;
@@ -262,7 +262,7 @@ const AnimalDetail: React.FC<AnimalDetailProps> = ({
                 <img
                   src={imageUrl.includes('placeholder') 
                     ? 'data:image/svg+xml;base64,PHN2ZyB3aWR0aD0iNjAwIiBoZWlnaHQ9IjQwMCIgdmlld0JveD0iMCAwIDYwMCA0MDAiIGZpbGw9Im5vbmUiIHhtbG5zPSJodHRwOi8vd3d3LnczLm9yZy8yMDAwL3N2ZyI+CjxyZWN0IHdpZHRoPSI2MDAiIGhlaWdodD0iNDAwIiBmaWxsPSIjRTVFN0VCIi8+CjxwYXRoIGQ9Ik0yNDAgMjAwSDM2MFYzMjBIMjQwVjIwMFoiIGZpbGw9IiM5Q0E2QUYiLz4KPHBhdGggZD0iTTI2MCAyMDBIMzQwVjI2MEgyNjBWMjAwWiIgZmlsbD0iIzZCNzI4MCIvPgo8Y2lyY2xlIGN4PSIyODAiIGN5PSIyMjAiIHI9IjEwIiBmaWxsPSIjOUM5OTk5Ii8+CjwvcmVnPgo8dGV4dCB4PSIzMDAiIHk9IjIxMCIgZm9udC1mYW1pbHk9IkFyaWFsLCBzYW5zLXNlcmlmIiBmb250LXNpemU9IjE0IiBmaWxsPSIjNkI3MjgwIiB0ZXh0LWFuY2hvcj0ibWlkZGxlIj7nlLvlg4g8L3RleHQ+CjwvcGc+' 
-                    : imageUrl
+                    : imageVariantUrl(imageUrl, 'thumb')
                   }
                   alt={`診療画像 ${index + 1}`}
                   className="w-full h-24 object-cover rounded-md border-2 border-gray-200 hover:border-blue-400 transition-colors cursor-pointer"
@@ -274,7 +274,7 @@ const AnimalDetail: React.FC<AnimalDetailProps> = ({
                   }}
                   onClick={() => {
                     if (!imageUrl.includes('placeholder')) {
-                      window.open(imageUrl, '_blank');
+                      window.open(imageVariantUrl(imageUrl, 'full'), '_blank');
                     }
                   }}
                 />
@@ -319,11 +319,11 @@ const AnimalDetail: React.FC<AnimalDetailProps> = ({
           {urls.map((u, i) => (
             <div key={i} className="relative group">
               <img
-                src={u}
+                src={imageVariantUrl(u, 'thumb')}
                 alt={`診療画像 ${i + 1}`}
                 className="w-full h-24 object-cover rounded-md border-2 border-gray-200 hover:border-blue-400 transition-colors cursor-pointer"
                 onError={(e) => { (e.target as HTMLImageElement).style.opacity = '0.3'; }}
-                onClick={() => window.open(u, '_blank')}
+                onClick={() => window.open(imageVariantUrl(u, 'full'), '_blank')}
               />
               <div className="absolute inset-0 bg-black bg-opacity-0 group-hover:bg-opacity-20 transition-all rounded-md flex items-center justify-center">
                 <span className="text-white opacity-0 group-hover:opacity-100 text-sm font-medium">拡大表示</span>
@@ -468,8 +468,14 @@ const AnimalDetail: React.FC<AnimalDetailProps> = ({
                 >
                   {/* 記録ヘッダー */}
                   <div className="flex justify-between items-center mb-3">
-                    <p className="font-bold text-lg text-gray-800">
+                    <p className="font-bold text-lg text-gray-800 flex items-center">
                       {rec.visit_date}
+                      {rec.processing_status === "pending" && (
+                        <span className="ml-3 inline-flex items-center text-xs font-medium text-blue-700 bg-blue-50 px-2 py-1 rounded-full">
+                          <Loader2 className="h-3 w-3 animate-spin mr-1" />
+                          書き起こし中
+                        </span>
+                      )}
                     </p>
                     {editingRecordId === rec.id ? (
                       <div className="flex space-x-2">
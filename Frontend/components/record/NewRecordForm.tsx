@@ -1,12 +1,13 @@
 ﻿"use client";
 import React, { useEffect, useMemo, useRef, useState } from "react";
 import type { SoapNotes, Appointment } from "@/types";
-import { Mic, MicOff, Upload, Loader2, Calendar as CalendarIcon, Save, Camera, X, Sparkles } from "lucide-react";
+import { Mic, MicOff, Upload, Loader2, Calendar as CalendarIcon, Save, Camera, X, Sparkles, Radio } from "lucide-react";
 import MiniCalendar from "@/components/calendar/MiniCalendar";
 import VetCalendar from "@/components/calendar/VetCalendar";
 import { TIME_OPTIONS } from "@/lib/utils";
 import { api } from "@/lib/api";
 import { useAudioRecording } from "@/hooks/useAudioRecording";
+import { useLiveDictation } from "@/hooks/useLiveDictation";
 
 interface NewRecordFormProps {
   onSave: (recordData: {
@@ -59,6 +60,28 @@ const NewRecordForm: React.FC<NewRecordFormProps> = (
     setTranscribedText,
   } = useAudioRecording(setErrors);
 
+  // ライブ書き起こし（サーバの Speech ストリーミング。途中経過を表示し、確定した文を転写テキストに追記）
+  const {
+    isStreaming,
+    interimText,
+    finalText,
+    startStreaming,
+    stopStreaming,
+    resetDictation,
+  } = useLiveDictation(setErrors);
+  const appendedFinalRef = useRef("");
+  useEffect(() => {
+    if (!finalText) {
+      appendedFinalRef.current = "";
+      return;
+    }
+    const added = finalText.slice(appendedFinalRef.current.length).replace(/^\n/, "");
+    appendedFinalRef.current = finalText;
+    if (added) {
+      setTranscribedText((prev) => prev + (prev.trim() ? "\n" : "") + added);
+    }
+  }, [finalText, setTranscribedText]);
+
   // 画像アップロード/撮影
   const [images, setImages] = useState<File[]>([]);
   const [medications, setMedications] = useState<{ name: string; dose?: string; route?: string }[]>([]);
@@ -171,7 +194,12 @@ const NewRecordForm: React.FC<NewRecordFormProps> = (
     }
     setErrors([]);
     try {
-      const result = await api.generateSoapFromText(transcribedText.trim());
+      // ストリーミング対応APIなら、生成できた項目から順に反映する
+      const result = api.generateSoapStream
+        ? await api.generateSoapStream(transcribedText.trim(), (field: keyof SoapNotes, value: string) =>
+            setSoap((prev) => ({ ...prev, [field]: value }))
+          )
+        : await api.generateSoapFromText(transcribedText.trim());
       const s: SoapNotes = (result as any).soap_notes || (result as any);
       setSoap(s);
     } catch (e: any) {
@@ -210,6 +238,8 @@ const NewRecordForm: React.FC<NewRecordFormProps> = (
       setNextVisitTime("");
       stopCamera();
       stopSpeechRecognition();
+      stopStreaming();
+      resetDictation();
     } catch (err: any) {
       setErrors([`保存に失敗しました: ${err.message ?? err}`]);
     } finally {
@@ -248,6 +278,12 @@ const NewRecordForm: React.FC<NewRecordFormProps> = (
               {isTranscribing ? <MicOff className="mr-2 h-4 w-4" /> : <Mic className="mr-2 h-4 w-4" />}
               {isTranscribing ? "認識停止" : "リアルタイム認識"}
             </button>
+            <button type="button" onClick={isStreaming ? stopStreaming : startStreaming}
+              className={`flex items-center px-4 py-2 rounded-md transition ${isStreaming ? "bg-red-600 text-white hover:bg-red-700" : "bg-teal-600 text-white hover:bg-teal-700"}`}
+              data-testid="btn-live-dictation">
+              {isStreaming ? <MicOff className="mr-2 h-4 w-4" /> : <Radio className="mr-2 h-4 w-4" />}
+              {isStreaming ? "ライブ書き起こし停止" : "ライブ書き起こし"}
+            </button>
             <button type="button" onClick={isRecording ? stopRecording : startRecording}
               className={`flex items-center px-4 py-2 rounded-md transition ${isRecording ? "bg-red-600 text-white hover:bg-red-700" : "bg-blue-600 text-white hover:bg-blue-700"}`}>
               {isRecording ? <MicOff className="mr-2 h-4 w-4" /> : <Mic className="mr-2 h-4 w-4" />}
@@ -264,6 +300,12 @@ const NewRecordForm: React.FC<NewRecordFormProps> = (
               <Loader2 className="mr-2 h-4 w-4 inline animate-spin" /> 音声認識中... 話してください
             </div>
           )}
+          {isStreaming && (
+            <div className="p-3 bg-teal-50 border border-teal-200 rounded-md text-teal-800">
+              <Loader2 className="mr-2 h-4 w-4 inline animate-spin" />
+              {interimText ? <span className="italic">{interimText}</span> : "ライブ書き起こし中... 話してください"}
+            </div>
+          )}
           {isProcessingAudio && (
             <div className="p-3 bg-blue-50 border border-blue-200 rounded-md text-blue-800">
               <Loader2 className="mr-2 h-4 w-4 inline animate-spin" /> 音声ファイルを処理中...
@@ -508,7 +550,7 @@ const NewRecordForm: React.FC<NewRecordFormProps> = (
 
         {/* 送信ボタン */}
         <div className="flex justify-end space-x-3">
-          <button type="button" onClick={() => { setSoap({ s: "", o: "", a: "", p: "" }); setImages([]); setTranscribedText(""); setNextVisitDate(""); setNextVisitTime(""); stopCamera(); stopSpeechRecognition(); setErrors([]); }}
+          <button type="button" onClick={() => { setSoap({ s: "", o: "", a: "", p: "" }); setImages([]); setTranscribedText(""); setNextVisitDate(""); setNextVisitTime(""); stopCamera(); stopSpeechRecognition(); stopStreaming(); resetDictation(); setErrors([]); }}
             className="px-4 py-2 text-gray-600 border border-gray-300 rounded-md hover:bg-gray-50 transition">
             リセット
           </button>
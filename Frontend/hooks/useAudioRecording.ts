@@ -3,7 +3,7 @@ import { useState, useCallback } from 'react';
 import type { AudioRecordingState, AudioRecordingActions } from '@/types/hooks';
 
 // API URL 決定関数（NewRecordFormから移動）
-const getApiUrl = (): string => {
+export const getApiUrl = (): string => {
   if (typeof window !== 'undefined' && window.location.hostname.includes('github.dev')) {
     const hostname = window.location.hostname;
     const backendHostname = hostname.replace('-3000.app.github.dev', '-8000.app.github.dev');
@@ -0,0 +1,99 @@
+// hooks/useLiveDictation.ts
+import { useState, useCallback, useRef } from 'react';
+import type { LiveDictationState, LiveDictationActions } from '@/types/hooks';
+import { getApiUrl } from '@/hooks/useAudioRecording';
+
+// 録音チャンクを送る間隔（ms）。短いほど最初の文字が早く出る
+const CHUNK_INTERVAL_MS = 250;
+
+const getStreamUrl = (lang: string): string => {
+  const wsBase = getApiUrl().replace(/^http/, 'ws');
+  return `${wsBase}/api/transcribe/stream?format=webm&lang=${encodeURIComponent(lang)}`;
+};
+
+// 録音しながら WebSocket で Opus チャンクを送り、途中経過と確定テキストを受け取る
+export const useLiveDictation = (
+  onError: (errors: string[]) => void
+): LiveDictationState & LiveDictationActions => {
+  const [isStreaming, setIsStreaming] = useState(false);
+  const [interimText, setInterimText] = useState("");
+  const [finalText, setFinalText] = useState("");
+  const socketRef = useRef<WebSocket | null>(null);
+  const recorderRef = useRef<MediaRecorder | null>(null);
+
+  const startStreaming = useCallback(async () => {
+    try {
+      const stream = await navigator.mediaDevices.getUserMedia({
+        audio: {
+          echoCancellation: true,
+          noiseSuppression: true,
+          autoGainControl: true
+        }
+      });
+      const ui = (navigator.language || '').toLowerCase();
+      const socket = new WebSocket(getStreamUrl(ui.startsWith('en') ? 'en-US' : 'ja-JP'));
+      socket.binaryType = 'arraybuffer';
+
+      socket.onmessage = (event) => {
+        const msg = JSON.parse(event.data);
+        if (msg.type === 'interim') {
+          setInterimText(msg.text);
+        } else if (msg.type === 'final') {
+          setInterimText("");
+          setFinalText(prev => prev + (prev ? "\n" : "") + msg.text);
+        } else if (msg.type === 'error') {
+          onError([`音声認識エラー: ${msg.detail}`]);
+        }
+      };
+      socket.onclose = () => {
+        stream.getTracks().forEach(track => track.stop());
+        setIsStreaming(false);
+      };
+
+      const recorder = new MediaRecorder(stream, { mimeType: 'audio/webm;codecs=opus' });
+      recorder.ondataavailable = (event) => {
+        if (event.data.size > 0 && socket.readyState === WebSocket.OPEN) {
+          socket.send(event.data);
+        }
+      };
+      recorder.onstop = () => {
+        if (socket.readyState === WebSocket.OPEN) {
+          socket.send('stop');
+        }
+      };
+      socket.onopen = () => recorder.start(CHUNK_INTERVAL_MS);
+
+      socketRef.current = socket;
+      recorderRef.current = recorder;
+      setIsStreaming(true);
+      onError([]); // エラーをクリア
+    } catch (error) {
+      console.error("ライブ書き起こし開始エラー:", error);
+      onError(["マイクへのアクセスが許可されていません。ブラウザの設定を確認してください。"]);
+    }
+  }, [onError]);
+
+  const stopStreaming = useCallback(() => {
+    // サーバは残りの結果と done を送ってから接続を閉じる
+    if (recorderRef.current && recorderRef.current.state !== 'inactive') {
+      recorderRef.current.stop();
+    }
+    recorderRef.current = null;
+  }, []);
+
+  const resetDictation = useCallback(() => {
+    setInterimText("");
+    setFinalText("");
+  }, []);
+
+  return {
+    // State
+    isStreaming,
+    interimText,
+    finalText,
+    // Actions
+    startStreaming,
+    stopStreaming,
+    resetDictation,
+  };
+};
@@ -15,6 +15,7 @@ export const createRecord = (...args: any[]) => api.createRecord?.(...args);
 export const updateRecord = (...args: any[]) => api.updateRecord?.(...args);
 export const transcribeAudio = (...args: any[]) => api.transcribeAudio?.(...args);
 export const generateSoapFromText = (...args: any[]) => api.generateSoapFromText?.(...args);
+export const generateSoapStream = (...args: any[]) => api.generateSoapStream?.(...args);
 export const generateSoapFromAudio = (...args: any[]) => api.generateSoapFromAudio?.(...args);
 export const generateSoapFromInput = (...args: any[]) => api.generateSoapFromInput?.(...args);
 export const uploadImage = (...args: any[]) => api.uploadImage?.(...args);
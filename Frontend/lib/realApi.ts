@@ -13,7 +13,8 @@ import type {
   NewAnimalFormData,
   NewRecordFormData,
   Appointment,
-  AppointmentFormData
+  AppointmentFormData,
+  RecordJob
 } from "@/types";
 
 // APIベースURL（未設定時はローカル想定）
@@ -214,6 +215,62 @@ class ApiClient {
     });
   }
 
+  // SOAP生成（テキストから・ストリーミング）
+  // 項目（s/o/a/p）が生成され次第 onField を呼び、最後に全体の結果を返す
+  async generateSoapStream(
+    text: string,
+    onField: (field: keyof SoapNotes, value: string) => void
+  ): Promise<SoapGenerationResponse> {
+    const formData = new FormData();
+    formData.append("text", text);
+
+    let response: Response;
+    try {
+      response = await fetch(`${API_BASE_URL}/api/generateSoap/stream`, {
+        method: "POST",
+        body: formData,
+        headers: { Accept: "text/event-stream" },
+      });
+    } catch (error) {
+      throw new ApiClientError(
+        `Network error: ${error instanceof Error ? error.message : 'Unknown error'}`
+      );
+    }
+    if (!response.ok || !response.body) {
+      throw new ApiClientError(`API Error: ${response.status} - ${await response.text()}`, response.status);
+    }
+
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = "";
+    for (;;) {
+      const { done, value } = await reader.read();
+      if (done) break;
+      buffer += decoder.decode(value, { stream: true });
+      let sep: number;
+      while ((sep = buffer.indexOf("\n\n")) >= 0) {
+        const block = buffer.slice(0, sep);
+        buffer = buffer.slice(sep + 2);
+        let event = "message";
+        let data = "";
+        for (const line of block.split("\n")) {
+          if (line.startsWith("event:")) event = line.slice(6).trim();
+          else if (line.startsWith("data:")) data += line.slice(5).trim();
+        }
+        if (!data) continue;
+        const payload = JSON.parse(data);
+        if (event === "field") {
+          onField(payload.field, payload.value);
+        } else if (event === "done") {
+          return payload as SoapGenerationResponse;
+        } else if (event === "error") {
+          throw new ApiClientError(`SOAP生成エラー: ${payload.detail}`);
+        }
+      }
+    }
+    throw new ApiClientError("SOAP生成のストリームが途中で終了しました");
+  }
+
   // SOAP生成（複合入力から）
   async generateSoapFromInput(data: {
     audio?: File;
@@ -307,6 +364,11 @@ class ApiClient {
     });
   }
 
+  // 自動書き起こしジョブの状態（完了後は更新済みの記録を含む）
+  async getRecordJob(jobId: string): Promise<RecordJob> {
+    return this.request<RecordJob>(`/api/records/jobs/${encodeURIComponent(jobId)}`);
+  }
+
   // 診療記録更新
   async updateRecord(
     recordId: string, 
@@ -30,3 +30,8 @@ export const WEEKDAYS_FULL = ["日曜日", "月曜日", "火曜日", "水曜日"
 // カスタム時間オプション生成関数をエクスポート（必要に応じて使用）
 export { generateTimeOptions };
 
+// バックエンドが保存した派生画像（<stem>.thumb|medium|full.webp）の別サイズの URL を返す
+// 派生画像でない URL（以前の元ファイルや外部 URL）はそのまま返す
+export type ImageVariant = "thumb" | "medium" | "full";
+export const imageVariantUrl = (url: string, variant: ImageVariant): string =>
+  url.replace(/\.(thumb|medium|full)\.webp(?=$|\?)/, `.${variant}.webp`);
@@ -20,6 +20,18 @@ export interface AudioRecordingActions {
   setTranscribedText: React.Dispatch<React.SetStateAction<string>>;
 }
 
+export interface LiveDictationState {
+  isStreaming: boolean;
+  interimText: string;   // 確定前の認識途中テキスト
+  finalText: string;     // 確定済みテキスト
+}
+
+export interface LiveDictationActions {
+  startStreaming: () => Promise<void>;
+  stopStreaming: () => void;
+  resetDictation: () => void;
+}
+
 export interface ImageCaptureState {
   images: File[];
   isCameraOpen: boolean;
@@ -28,6 +28,7 @@ export interface Record {
   audioUrl?: string; // 音声ファイルのURL
   next_visit_date?: string | null; // バックエンドの実装に合わせて追加
   next_visit_time?: string | null; // バックエンドの実装に合わせて追加
+  processing_status?: "pending" | "error" | null; // 自動書き起こし・SOAP生成の状態
   createdAt?: string; // サーバーで生成されるタイムスタンプ
   updatedAt?: string;
 }
@@ -54,6 +55,8 @@ export interface Animal {
   thumbnailUrl?: string; // 動物の写真URL
   owner?: string;
   records?: Record[]; // 詳細表示時に含まれる場合があるためオプショナルに変更
+  record_count?: number; // 一覧・検索結果（/api/animals）でのみ返る
+  last_visit?: string; // 一覧・検索結果（/api/animals）でのみ返る
   createdAt?: string;
   updatedAt?: string;
 }
@@ -119,6 +122,7 @@ export interface TranscribeResponse {
   transcribed_text: string; // 互換性のために維持
   filename: string;
   file_size: number; // バックエンドのレスポンスに合わせて追加
+  truncated?: boolean; // 長すぎる音声の後半を書き起こしていない場合 true
   status: 'success' | 'error';
   service: string; // 例: "google_speech_to_text"
 }
@@ -140,8 +144,29 @@ export interface SoapGenerationResponse {
  */
 export interface ProcessedImageInfo {
   name: string;
-  data: string; // Base64 data URL
-  size: number;
+  size: number | null;
+  status: 'success' | 'error';
+  url?: string; // 保存に成功した場合
+  key?: string;
+  variants?: { [variant: string]: string }; // 派生サイズ（thumb / medium / full）の URL。元ファイルのまま保存した場合は空
+  error?: string; // 保存に失敗した場合（他の画像と記録は保存される）
+}
+
+/**
+ * 記録作成後の自動書き起こしジョブ (`/api/records/jobs/{job_id}`)。
+ */
+export interface RecordJob {
+  job_id: string;
+  record_id: string;
+  filename: string;
+  language_code?: string | null;
+  status: 'pending' | 'running' | 'done' | 'error';
+  attempts: number;
+  transcription?: string | null;
+  error?: string | null;
+  created_at: number;
+  updated_at: number;
+  record?: Record | null; // 状態取得時のみ
 }
 
 /**
@@ -151,8 +176,8 @@ export interface RecordCreationResponse {
   record: Record;
   record_id: string; // バックエンドのレスポンスに合わせて追加
   message: string; // バックエンドのレスポンスに合わせて追加
-  transcribed_text?: string;
   auto_transcribe: boolean;
+  job?: RecordJob | null; // auto_transcribe 時のバックグラウンドジョブ
   processed_images: ProcessedImageInfo[]; // バックエンドのレスポンスに合わせて追加
   status: 'success' | 'error';
   api_used: string; // 例: "google_cloud_apis"